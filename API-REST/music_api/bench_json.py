@@ -0,0 +1,40 @@
+import sys
+import time
+
+from fastapi.responses import JSONResponse
+
+from responses import ORJSONResponse
+
+
+# Benchmark de serialización de las respuestas JSON
+# Uso: python bench_json.py [num_filas]
+# Compara JSONResponse (json estándar) con ORJSONResponse en un listado de
+# preferencias como el que devuelve GET /users/{id}/preferences.
+
+
+def main(num_rows: int, repeat: int = 5):
+    rows = [
+        {
+            "id": i,
+            "user_id": i // 10,
+            "spotify_id": f"4uLU6hMCjMI75M1A2tKU{i:06d}",
+            "name": f"Canción número {i}",
+            "type": "song" if i % 3 else "artist",
+        }
+        for i in range(num_rows)
+    ]
+
+    results = {}
+    for name, response_class in (("json", JSONResponse), ("orjson", ORJSONResponse)):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            body = response_class(content=rows).body
+            timings.append(time.perf_counter() - start)
+        results[name] = min(timings)
+        print(f"{name:<8} {min(timings) * 1000:8.1f} ms  {len(body) / 1e6:6.1f} MB")
+    print(f"orjson es {results['json'] / results['orjson']:.1f}x más rápido con {num_rows} filas")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
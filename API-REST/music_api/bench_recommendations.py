@@ -0,0 +1,51 @@
+import random
+import sys
+import time
+
+from recommendations import RecommendationIndex
+
+
+# Benchmark del índice de recomendaciones
+# Uso: python bench_recommendations.py [num_preferencias] [num_usuarios] [num_items]
+# Las preferencias siguen una distribución de Zipf, como la popularidad real de canciones.
+
+
+def main(num_preferences: int, num_users: int, num_items: int, queries: int = 200):
+    rng = random.Random(42)
+    weights = [1 / (rank + 1) for rank in range(num_items)]
+    items = rng.choices(range(num_items), weights=weights, k=num_preferences)
+
+    index = RecommendationIndex()
+    start = time.perf_counter()
+    for n, item in enumerate(items):
+        index.add(n % num_users, "song", f"track{item}")
+    elapsed = time.perf_counter() - start
+    print(f"{num_preferences} preferencias, {num_users} usuarios, {num_items} items")
+    print(f"  construcción     {elapsed:8.2f} s   ({num_preferences / elapsed:,.0f} altas/s)")
+
+    users = [rng.randrange(num_users) for _ in range(queries)]
+    for name, query in (
+        ("similar_users", lambda user: index.similar_users(user, 10)),
+        ("recommend", lambda user: index.recommend(user, 10)),
+    ):
+        timings = []
+        for user in users:
+            start = time.perf_counter()
+            query(user)
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        p50 = timings[len(timings) // 2] * 1000
+        p99 = timings[int(len(timings) * 0.99)] * 1000
+        print(f"  {name:<16} p50 {p50:7.2f} ms   p99 {p99:7.2f} ms")
+
+    start = time.perf_counter()
+    for n in range(10000):
+        index.add(rng.randrange(num_users), "song", f"track{rng.randrange(num_items)}")
+    print(f"  alta incremental {(time.perf_counter() - start) / 10000 * 1e6:8.2f} µs")
+
+
+if __name__ == "__main__":
+    num_preferences = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    num_users = int(sys.argv[2]) if len(sys.argv) > 2 else 50_000
+    num_items = int(sys.argv[3]) if len(sys.argv) > 3 else 200_000
+    main(num_preferences, num_users, num_items)
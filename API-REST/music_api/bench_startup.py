@@ -0,0 +1,131 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+# Arranque en frío: cuánto tarda un proceso nuevo en importar main, arrancar la app y
+# responder la primera petición (importa con autoescalado, cada pod nuevo pasa por aquí)
+# Uso: python bench_startup.py [repeticiones] [ruta ...]
+# Cada repetición es un proceso nuevo con almacenamiento, cola y caché en un directorio
+# temporal. Las peticiones (GET /users por defecto) van por el transporte ASGI de
+# httpx, sin red, y cada ruta se pide dos veces para ver lo que cuesta solo la primera.
+# Al final se listan los módulos que más tarda en importar main (python -X importtime,
+# en un proceso más que no cuenta para los tiempos).
+
+CHILD = """
+import time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+import asyncio, httpx, json, sys
+
+async def lifespan(app, queue_in, queue_out, message):
+    await queue_in.put({"type": message})
+    return await queue_out.get()
+
+async def run():
+    queue_in, queue_out = asyncio.Queue(), asyncio.Queue()
+    scope = {"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}}
+    task = asyncio.create_task(main.app(scope, queue_in.get, queue_out.put))
+    t = time.perf_counter()
+    await lifespan(main.app, queue_in, queue_out, "lifespan.startup")
+    result = {"import": imported - start, "startup": time.perf_counter() - t, "requests": []}
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for path in sys.argv[1:]:
+            times = []
+            for _ in range(2):
+                t = time.perf_counter()
+                response = await client.get(path)
+                times.append(time.perf_counter() - t)
+            result["requests"].append([path, response.status_code, times[0], times[1]])
+
+    await lifespan(main.app, queue_in, queue_out, "lifespan.shutdown")
+    await task
+    print(json.dumps(result))
+
+asyncio.run(run())
+"""
+
+
+def import_tree(stderr: str, module: str = "main"):
+    """Imports directos de `module` con su tiempo acumulado, de la salida de -X importtime"""
+    children = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line[13:]:
+            continue
+        _, cumulative, name = line[12:].split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        name = name.strip()
+        if depth == 0:
+            if name == module:
+                return int(cumulative) / 1e6, children
+            children = []
+        elif depth == 1:
+            children.append((int(cumulative) / 1e6, name))
+    return None, []
+
+
+def run_once(paths, tmp: str, importtime: bool = False):
+    env = dict(
+        os.environ,
+        MUSIC_API_DB_PATH=os.path.join(tmp, "music_api.sqlite3"),
+        MUSIC_API_JOBS_PATH=os.path.join(tmp, "jobs.sqlite3"),
+        SPOTIFY_CACHE_PATH=os.path.join(tmp, "spotify_cache.sqlite3"),
+    )
+    here = os.path.dirname(os.path.abspath(__file__))
+    t = time.perf_counter()
+    flags = ["-X", "importtime"] if importtime else []
+    process = subprocess.run(
+        [sys.executable, *flags, "-c", CHILD, *paths],
+        cwd=here, env=env, capture_output=True, text=True, check=True,
+    )
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    result["process"] = time.perf_counter() - t
+    result["tree"] = import_tree(process.stderr)
+    return result
+
+
+def main(repeat: int, paths):
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in range(repeat):
+            run_dir = os.path.join(tmp, str(n))
+            os.mkdir(run_dir)
+            results.append(run_once(paths, run_dir))
+        # -X importtime hace más lento el import, el árbol se saca de un proceso aparte
+        os.mkdir(os.path.join(tmp, "importtime"))
+        tree = run_once(paths, os.path.join(tmp, "importtime"), importtime=True)["tree"]
+
+    def median_ms(values):
+        return statistics.median(values) * 1000
+
+    print(f"Mediana de {repeat} procesos")
+    print(f"  proceso completo    {median_ms([r['process'] for r in results]):8.1f} ms")
+    print(f"  import main         {median_ms([r['import'] for r in results]):8.1f} ms")
+    print(f"  startup             {median_ms([r['startup'] for r in results]):8.1f} ms")
+    for i, (path, status, _, _) in enumerate(results[0]["requests"]):
+        first = median_ms([r["requests"][i][2] for r in results])
+        second = median_ms([r["requests"][i][3] for r in results])
+        print(f"  GET {path:<16} {first:8.1f} ms la primera, {second:.1f} ms la segunda ({status})")
+
+    _, children = tree
+    print("Imports de main que más tardan (acumulado):")
+    for seconds, name in sorted(children, reverse=True)[:10]:
+        print(f"  {name:<28} {seconds * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    arguments = sys.argv[1:]
+    main(
+        int(arguments[0]) if arguments else 5,
+        arguments[1:] or ["/users"],
+    )
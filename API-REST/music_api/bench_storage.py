@@ -0,0 +1,49 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+from storage import MemoryStorage, SQLiteStorage
+
+
+# Comparación de rendimiento entre backends de almacenamiento
+# Uso: python bench_storage.py [num_usuarios] [concurrencia]
+
+
+async def run_workload(storage, num_users: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_user(i):
+        async with semaphore:
+            user = await storage.create_user(f"user{i}", f"user{i}@example.com", 20 + i % 50)
+            await storage.add_preference(user["id"], f"spotify{i}", f"Track {i}", "song")
+            await storage.get_user(user["id"])
+            await storage.list_preferences(user["id"])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_user(i) for i in range(num_users)))
+    return time.perf_counter() - start
+
+
+async def main(num_users: int, concurrency: int):
+    results = {}
+
+    results["memory"] = await run_workload(MemoryStorage(), num_users, concurrency)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        storage = SQLiteStorage(os.path.join(tmp, "bench.sqlite3"))
+        results["sqlite (WAL)"] = await run_workload(storage, num_users, concurrency)
+        storage.close()
+
+    # 4 operaciones por usuario: alta, preferencia, lectura y listado
+    print(f"{num_users} usuarios, concurrencia {concurrency}")
+    for backend, elapsed in results.items():
+        ops = num_users * 4 / elapsed
+        print(f"  {backend:<14} {elapsed:8.3f} s  {ops:10.0f} ops/s")
+
+
+if __name__ == "__main__":
+    num_users = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 32
+    asyncio.run(main(num_users, concurrency))
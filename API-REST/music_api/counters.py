@@ -0,0 +1,78 @@
+import bisect
+
+
+# Contadores de preferencias por canción/artista para el ranking (GET /leaderboard)
+# Cada tipo ("song", "artist") guarda sus spotify_id agrupados en cubos por número
+# de usuarios que los tienen guardados. Sumar o restar uno solo mueve el id al cubo
+# de al lado, y el top-N recorre los cubos de mayor a menor, así que cuesta O(N)
+# y no depende del total de preferencias.
+
+
+class TypeLeaderboard:
+    def __init__(self):
+        self.counts = {}   # spotify_id -> número de preferencias
+        self.names = {}    # spotify_id -> nombre
+        self.buckets = {}  # número -> {spotify_id: None}, en orden de llegada
+        self.levels = []   # números con algún spotify_id, ordenados
+
+    def _move(self, spotify_id, old, new):
+        if old:
+            bucket = self.buckets[old]
+            del bucket[spotify_id]
+            if not bucket:
+                del self.buckets[old]
+                del self.levels[bisect.bisect_left(self.levels, old)]
+        if new:
+            if new not in self.buckets:
+                self.buckets[new] = {}
+                bisect.insort(self.levels, new)
+            self.buckets[new][spotify_id] = None
+            self.counts[spotify_id] = new
+        else:
+            del self.counts[spotify_id]
+            del self.names[spotify_id]
+
+    def increment(self, spotify_id, name):
+        self.names[spotify_id] = name
+        count = self.counts.get(spotify_id, 0)
+        self._move(spotify_id, count, count + 1)
+
+    def decrement(self, spotify_id):
+        """Restar uno y devolver cuántas preferencias quedan"""
+        count = self.counts.get(spotify_id, 0)
+        if count:
+            self._move(spotify_id, count, count - 1)
+            return count - 1
+        return 0
+
+    def top(self, limit):
+        result = []
+        for count in reversed(self.levels):
+            for spotify_id in self.buckets[count]:
+                result.append((spotify_id, self.names[spotify_id], count))
+                if len(result) == limit:
+                    return result
+        return result
+
+
+class PreferenceCounters:
+    def __init__(self):
+        self.boards = {}
+
+    def increment(self, type, spotify_id, name):
+        self.boards.setdefault(type, TypeLeaderboard()).increment(spotify_id, name)
+
+    def decrement(self, type, spotify_id):
+        board = self.boards.get(type)
+        if board is None:
+            return 0
+        return board.decrement(spotify_id)
+
+    def top(self, type, limit):
+        board = self.boards.get(type)
+        if board is None:
+            return []
+        return [
+            {"spotify_id": spotify_id, "name": name, "type": type, "count": count}
+            for spotify_id, name, count in board.top(limit)
+        ]
@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+
+
+# Cabecera Idempotency-Key para las altas (POST /users)
+# Un cliente que reintenta una petición (por ejemplo tras un timeout) manda la misma
+# Idempotency-Key y recibe la respuesta original sin que el endpoint se ejecute otra
+# vez. Si la original todavía está en curso, el reintento espera a que termine y
+# recibe esa misma respuesta, así dos peticiones iguales a la vez solo ejecutan una.
+#
+# - Las respuestas se guardan en memoria (por proceso) durante `ttl` segundos y como
+#   mucho `max_entries`; al pasarse se descartan las más antiguas que ya han terminado.
+# - Las respuestas 5xx no se guardan, así un reintento puede salir bien.
+# - La misma clave con otro cuerpo da 422; las respuestas repetidas llevan la cabecera
+#   Idempotent-Replayed: true.
+# Es un middleware ASGI: las peticiones sin la cabecera o a otras rutas pasan sin coste.
+
+MAX_KEY_LENGTH = 255
+
+
+class Entry:
+    def __init__(self, expires_at: float, fingerprint: str):
+        self.expires_at = expires_at
+        self.fingerprint = fingerprint
+        # (status, headers, body) cuando termina, o None si no se ha guardado
+        self.response = asyncio.get_running_loop().create_future()
+
+
+async def read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise asyncio.CancelledError()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def send_response(send, status: int, headers, body: bytes):
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_error(send, status: int, detail: str):
+    body = json.dumps({"detail": detail}).encode()
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    await send_response(send, status, headers, body)
+
+
+class IdempotencyMiddleware:
+    def __init__(self, app, routes, ttl: float = 86400, max_entries: int = 10000):
+        self.app = app
+        self.routes = set(routes)  # {("POST", "/users"), ...}
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (método, ruta, clave) -> Entry, de la más antigua a la más nueva
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (scope["method"], scope["path"]) not in self.routes:
+            return await self.app(scope, receive, send)
+        key = next((value for name, value in scope["headers"] if name == b"idempotency-key"), None)
+        if key is None:
+            return await self.app(scope, receive, send)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return await send_error(send, 400, f"Idempotency-Key debe tener entre 1 y {MAX_KEY_LENGTH} caracteres")
+
+        body = await read_body(receive)
+        fingerprint = hashlib.sha256(body).hexdigest()
+        entry_key = (scope["method"], scope["path"], key)
+
+        while True:
+            self.evict()
+            entry = self.entries.get(entry_key)
+            if entry is None:
+                break
+            if entry.fingerprint != fingerprint:
+                return await send_error(send, 422, "Idempotency-Key ya usada con otro cuerpo")
+            stored = await asyncio.shield(entry.response)
+            if stored is not None:
+                status, headers, response_body = stored
+                return await send_response(send, status, headers + [(b"idempotent-replayed", b"true")], response_body)
+            # La original no se guardó (5xx o error): se vuelve a intentar
+
+        entry = Entry(time.monotonic() + self.ttl, fingerprint)
+        self.entries[entry_key] = entry
+        stored = None
+        try:
+            stored = await self.run(scope, receive, send, body)
+        finally:
+            if stored is None and self.entries.get(entry_key) is entry:
+                del self.entries[entry_key]
+            entry.response.set_result(stored)
+
+    async def run(self, scope, receive, send, body: bytes):
+        """Ejecutar la petición y devolver la respuesta para guardarla, o None si es 5xx"""
+        pending = [{"type": "http.request", "body": body, "more_body": False}]
+        response = {"status": 500, "headers": [], "body": []}
+
+        async def replay_receive():
+            if pending:
+                return pending.pop()
+            return await receive()
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                response["headers"] = list(message.get("headers", []))
+            elif message["type"] == "http.response.body":
+                response["body"].append(message.get("body", b""))
+            await send(message)
+
+        await self.app(scope, replay_receive, capture_send)
+        if response["status"] >= 500:
+            return None
+        return response["status"], response["headers"], b"".join(response["body"])
+
+    def evict(self):
+        now = time.monotonic()
+        for _ in range(len(self.entries)):
+            entry_key, oldest = next(iter(self.entries.items()))
+            if oldest.expires_at > now and len(self.entries) <= self.max_entries:
+                return
+            if oldest.response.done():
+                del self.entries[entry_key]
+            else:
+                # En curso: sus reintentos tienen que esperarla. Pasa al final y se
+                # descarta cuando toque después de terminar
+                self.entries.move_to_end(entry_key)
+
+
+def idempotency_settings():
+    """ttl y max_entries desde MUSIC_API_IDEMPOTENCY_TTL y MUSIC_API_IDEMPOTENCY_MAX_KEYS"""
+    return {
+        "ttl": float(os.getenv("MUSIC_API_IDEMPOTENCY_TTL", "86400")),
+        "max_entries": int(os.getenv("MUSIC_API_IDEMPOTENCY_MAX_KEYS", "10000")),
+    }
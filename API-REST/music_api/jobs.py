@@ -0,0 +1,252 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from storage import DEFAULT_DB_PATH
+
+
+# Cola de trabajos en segundo plano, guardada en SQLite
+# Los endpoints encolan y responden enseguida; unos pocos workers (tareas asyncio del
+# propio proceso) van sacando trabajos y ejecutan su handler. La concurrencia está
+# limitada por el número de workers, y lo bloqueante (peticiones a Spotify) se
+# ejecuta en el pool de hilos con asyncio.to_thread.
+#
+# - Dedupe: hay un único trabajo por (kind, key), encolar otra vez lo mismo devuelve
+#   el existente. Solo se vuelve a poner en cola si había fallado.
+# - Reintentos: si el handler lanza una excepción se reintenta con espera exponencial
+#   hasta max_attempts; JobFailed lo da por fallido sin reintentar, igual que un kind
+#   sin handler registrado.
+# - Persistencia: al coger un trabajo se marca "running" con run_after = ahora + lease.
+#   Si el proceso muere, pasado el lease cualquier worker (de este proceso o de otro
+#   que use el mismo fichero) lo vuelve a coger, así no se pierde nada al reiniciar.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    last_error TEXT,
+    result TEXT,
+    run_after REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_kind_key ON jobs(kind, key);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_run_after ON jobs(status, run_after);
+"""
+
+JOB_COLUMNS = ("id", "kind", "key", "payload", "status", "attempts", "last_error",
+               "result", "run_after", "created_at", "updated_at")
+STATUSES = ("pending", "running", "done", "failed")
+MAX_IDLE_DELAY = 30.0  # espera máxima de un worker cuando la base de datos falla
+
+logger = logging.getLogger(__name__)
+
+
+class JobFailed(Exception):
+    """Error definitivo: el trabajo se marca como fallido sin más reintentos"""
+
+
+def job_to_dict(row):
+    job = dict(zip(JOB_COLUMNS, row))
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = json.loads(job["result"]) if job["result"] is not None else None
+    del job["run_after"]
+    return job
+
+
+class JobQueue:
+    def __init__(self, path: str, workers: int = 4, max_attempts: int = 5,
+                 base_delay: float = 1.0, lease: float = 300.0, poll_interval: float = 1.0):
+        self.path = path
+        self.num_workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.handlers = {}
+        self.local = threading.local()
+        self.tasks = []
+        self.wakeup = None
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def handler(self, kind: str):
+        """Decorador para registrar la función async que procesa un tipo de trabajo"""
+        def register(func):
+            self.handlers[kind] = func
+            return func
+        return register
+
+    # Operaciones sobre la tabla, síncronas (se llaman con asyncio.to_thread)
+
+    def _enqueue(self, kind, key, payload):
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            "INSERT INTO jobs (kind, key, payload, status, run_after, created_at, updated_at) "
+            "VALUES (?, ?, ?, 'pending', ?, ?, ?) "
+            "ON CONFLICT (kind, key) DO UPDATE SET status = 'pending', attempts = 0, last_error = NULL, "
+            "payload = excluded.payload, run_after = excluded.run_after, updated_at = excluded.updated_at "
+            "WHERE status = 'failed'",
+            (kind, key, json.dumps(payload), now, now, now),
+        )
+        row = conn.execute(
+            f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE kind = ? AND key = ?", (kind, key)
+        ).fetchone()
+        return job_to_dict(row)
+
+    def _claim(self):
+        now = time.time()
+        return self._connection().execute(
+            "UPDATE jobs SET status = 'running', attempts = attempts + 1, run_after = ?, updated_at = ? "
+            "WHERE id = ("
+            "  SELECT id FROM jobs WHERE status IN ('pending', 'running') AND run_after <= ?"
+            "  ORDER BY run_after, id LIMIT 1"
+            ") RETURNING id, kind, payload, attempts",
+            (now + self.lease, now, now),
+        ).fetchone()
+
+    def _finish(self, job_id, status, result=None, error=None, run_after=0.0):
+        self._connection().execute(
+            "UPDATE jobs SET status = ?, result = ?, last_error = ?, run_after = ?, updated_at = ? "
+            "WHERE id = ?",
+            (status, json.dumps(result) if result is not None else None, error,
+             run_after, time.time(), job_id),
+        )
+
+    def _get(self, job_id):
+        row = self._connection().execute(
+            f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        return job_to_dict(row) if row else None
+
+    def _get_by_key(self, kind, key):
+        row = self._connection().execute(
+            f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE kind = ? AND key = ?", (kind, key)
+        ).fetchone()
+        return job_to_dict(row) if row else None
+
+    def _list(self, status, after_id, limit):
+        if status is not None and status not in STATUSES:
+            raise ValueError(f"Estado desconocido: {status}")
+        sql = f"SELECT {', '.join(JOB_COLUMNS)} FROM jobs WHERE id > ?"
+        params = [after_id]
+        if status is not None:
+            sql += " AND status = ?"
+            params.append(status)
+        sql += " ORDER BY id LIMIT ?"
+        params.append(limit)
+        return [job_to_dict(row) for row in self._connection().execute(sql, params)]
+
+    def _counts(self):
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update(self._connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status"))
+        return counts
+
+    # API async para los endpoints
+
+    async def enqueue(self, kind: str, key: str, payload: dict) -> dict:
+        job = await asyncio.to_thread(self._enqueue, kind, key, payload)
+        if self.wakeup is not None and job["status"] == "pending":
+            self.wakeup.set()
+        return job
+
+    async def get(self, job_id: int):
+        return await asyncio.to_thread(self._get, job_id)
+
+    async def get_by_key(self, kind: str, key: str):
+        return await asyncio.to_thread(self._get_by_key, kind, key)
+
+    async def list(self, status=None, after_id: int = 0, limit: int = 100) -> list:
+        return await asyncio.to_thread(self._list, status, after_id, limit)
+
+    async def counts(self) -> dict:
+        return await asyncio.to_thread(self._counts)
+
+    # Workers
+
+    async def start(self):
+        self.wakeup = asyncio.Event()
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.num_workers)]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def _worker(self):
+        delay = self.poll_interval
+        while True:
+            try:
+                claimed = await asyncio.to_thread(self._claim)
+            except Exception:
+                # Base de datos bloqueada o fichero inaccesible: el worker no se muere,
+                # espera cada vez más (hasta MAX_IDLE_DELAY) y lo vuelve a intentar
+                logger.exception("No se pudo sacar un trabajo de la cola, reintento en %.1fs", delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_IDLE_DELAY)
+                continue
+            delay = self.poll_interval
+            if claimed is None:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self.wakeup.clear()
+                continue
+            try:
+                await self._process(*claimed)
+            except Exception:
+                # No se pudo guardar el resultado: el trabajo sigue "running" y se
+                # vuelve a coger cuando venza el lease
+                logger.exception("No se pudo terminar el trabajo %s", claimed[0])
+
+    async def _process(self, job_id, kind, payload, attempts):
+        handler = self.handlers.get(kind)
+        if handler is None:
+            await asyncio.to_thread(self._finish, job_id, "failed", error=f"Tipo de trabajo desconocido: {kind}")
+            return
+        try:
+            result = await asyncio.wait_for(handler(json.loads(payload)), self.lease)
+        except asyncio.CancelledError:
+            # Parada del proceso: el trabajo vuelve a la cola para el siguiente arranque
+            await asyncio.to_thread(self._finish, job_id, "pending", error="Interrumpido")
+            raise
+        except JobFailed as e:
+            await asyncio.to_thread(self._finish, job_id, "failed", error=str(e))
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if attempts >= self.max_attempts:
+                await asyncio.to_thread(self._finish, job_id, "failed", error=error)
+            else:
+                retry_at = time.time() + self.base_delay * 2 ** (attempts - 1)
+                await asyncio.to_thread(self._finish, job_id, "pending", error=error, run_after=retry_at)
+        else:
+            await asyncio.to_thread(self._finish, job_id, "done", result=result)
+
+
+def create_job_queue() -> JobQueue:
+    """Cola según las variables de entorno MUSIC_API_JOBS_PATH y MUSIC_API_JOB_WORKERS.
+    Por defecto jobs.sqlite3 va en el directorio de la base de datos (MUSIC_API_DB_PATH)"""
+    db_dir = os.path.dirname(os.getenv("MUSIC_API_DB_PATH", DEFAULT_DB_PATH))
+    return JobQueue(
+        os.getenv("MUSIC_API_JOBS_PATH") or os.path.join(db_dir, "jobs.sqlite3"),
+        workers=int(os.getenv("MUSIC_API_JOB_WORKERS", "4")),
+    )
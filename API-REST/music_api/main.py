@@ -1,24 +1,44 @@
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, EmailStr
-from typing import Optional, List
+from pydantic import BaseModel, EmailStr, Field
+from typing import Annotated, Optional, List
 from datetime import datetime
 
-import requests
+import asyncio
 import os
 from dotenv import load_dotenv
 import base64
 
+from responses import DefaultResponse
+from storage import MAX_INT, MIN_INT, create_storage
+from recommendations import RecommendationIndex
+from search_index import SearchIndex
+from spotify_cache import create_spotify_cache, search_key
+from jobs import JobFailed, create_job_queue
+from idempotency import IdempotencyMiddleware, idempotency_settings
+from profiler import MAX_SECONDS, SamplingProfiler, check_token, collapsed
+
 load_dotenv()
 
 
 # Configuración FastAPI y CORS
 
+# Respuestas con orjson si está instalado, si no json estándar (ver responses.py)
+
 app = FastAPI(
     title="Spotify API",
     description="API para gestionar usuarios y sus preferencias musicales con Spotify",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=DefaultResponse
+)
+
+# Reintentos de POST /users con Idempotency-Key (ver idempotency.py). Se añade antes
+# que CORS para quedar por dentro: las respuestas repetidas también llevan sus cabeceras
+app.add_middleware(
+    IdempotencyMiddleware,
+    routes=[("POST", "/users")],
+    **idempotency_settings(),
 )
 
 app.add_middleware(
@@ -31,12 +51,16 @@ app.add_middleware(
 
 
 
+# Enteros que caben en SQLite (ver storage.py): fuera de rango dan 422 con cualquier backend
+Int64 = Annotated[int, Field(ge=MIN_INT, le=MAX_INT)]
+
+
 # Modelos Pydantic Usuarios
 
 class UserCreate(BaseModel):
     name: str
     email: str
-    age: int
+    age: Int64
 
 class User(BaseModel):
     id: int
@@ -47,7 +71,7 @@ class User(BaseModel):
 class UserUpdate(BaseModel):
     name: Optional[str] = None
     email: Optional[str] = None
-    age: Optional[int] = None
+    age: Optional[Int64] = None
     
 
 
@@ -68,13 +92,57 @@ class MusicPreference(BaseModel):
 
 
 
-# Guardar Usuarios y Preferencias musicales en listas y darles id
+# Guardar Usuarios y Preferencias musicales en el backend configurado (memoria o SQLite, ver storage.py)
+
+storage = create_storage()
+
+# Índice en memoria para recomendaciones, se construye al arrancar y se actualiza con cada cambio.
+# Es por proceso: con varios workers cada uno solo ve sus propias altas desde que arrancó.
+recommender = RecommendationIndex()
+
+# Índice local de búsqueda con los nombres de las preferencias y los resultados ya pedidos a Spotify
+search_index = SearchIndex()
+
+# Trabajos en segundo plano (enriquecer preferencias con datos de Spotify), ver jobs.py
+jobs = create_job_queue()
+
 
-users_db = []  
-next_user_id = 1 
+@app.on_event("startup")
+async def load_indexes():
+    for pref in await storage.all_preferences():
+        recommender.add(pref["user_id"], pref["type"], pref["spotify_id"], pref["name"])
+        search_index.add(pref["type"], pref["spotify_id"], pref["name"])
+    await jobs.start()
 
-music_preferences_db = []  
-next_preference_id = 1     
+
+@app.on_event("shutdown")
+async def close_storage():
+    await jobs.stop()
+    storage.close()
+
+
+
+# Paginación por cursor para los listados
+# El cursor es el id del último elemento recibido; el siguiente va en la cabecera X-Next-Cursor.
+# Con ?fields=name,email solo se leen y devuelven esas columnas (más el id).
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def paginated_response(rows: list, limit: int):
+    # Las filas vienen del almacenamiento y ya son válidas, se devuelven tal cual
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = str(rows[-1]["id"])
+    return DefaultResponse(content=rows, headers=headers)
+
+
+def parse_fields(fields: Optional[str]):
+    if not fields:
+        return None
+    return [field.strip() for field in fields.split(",") if field.strip()]
 
 
 
@@ -82,9 +150,15 @@ next_preference_id = 1
 
 SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
 SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
+# Se pueden cambiar para apuntar a un Spotify falso (ver Pruebas-Carga)
+SPOTIFY_ACCOUNTS_URL = os.getenv("SPOTIFY_ACCOUNTS_URL", "https://accounts.spotify.com")
+SPOTIFY_API_URL = os.getenv("SPOTIFY_API_URL", "https://api.spotify.com")
 
 spotify_access_token = None
 
+# Caché en disco de las búsquedas, compartida entre workers (ver spotify_cache.py)
+spotify_cache = create_spotify_cache()
+
 
 
 # Funciones de autenticación de Spotify
@@ -110,9 +184,13 @@ def get_spotify_token():
         "grant_type": "client_credentials"
     }
     
+    # requests se importa la primera vez que se llama a Spotify, no al arrancar
+    # (son ~80 ms en cada proceso nuevo, ver bench_startup.py)
+    import requests
+    
     try:
         response = requests.post(
-            "https://accounts.spotify.com/api/token",
+            f"{SPOTIFY_ACCOUNTS_URL}/api/token",
             headers=headers,
             data=data
         )
@@ -135,7 +213,14 @@ def get_spotify_token():
 
 
 def search_spotify(query: str, search_type: str = "track", limit: int = 10):
+    key = search_key(query, search_type, limit)
+    if spotify_cache is not None:
+        cached = spotify_cache.get(key)
+        if cached is not None:
+            return cached
+
     token = get_spotify_token()
+    import requests
     
     headers = {
         "Authorization": f"Bearer {token}"
@@ -149,13 +234,16 @@ def search_spotify(query: str, search_type: str = "track", limit: int = 10):
     
     try:
         response = requests.get(
-            "https://api.spotify.com/v1/search",
+            f"{SPOTIFY_API_URL}/v1/search",
             headers=headers,
             params=params
         )
         
         if response.status_code == 200:
-            return response.json()
+            results = response.json()
+            if spotify_cache is not None:
+                spotify_cache.set(key, results)
+            return results
         else:
             raise HTTPException(
                 status_code=response.status_code,
@@ -170,6 +258,108 @@ def search_spotify(query: str, search_type: str = "track", limit: int = 10):
 
 
 
+def get_spotify_item(item_type: str, spotify_id: str):
+    """Datos completos de una canción o artista, con la misma caché en disco que las búsquedas"""
+    key = f"item:{item_type}:{spotify_id}"
+    if spotify_cache is not None:
+        cached = spotify_cache.get(key)
+        if cached is not None:
+            return cached
+    
+    if not SPOTIFY_CLIENT_ID or not SPOTIFY_CLIENT_SECRET:
+        # Error de configuración: reintentar el trabajo no lo arregla
+        raise JobFailed("Credenciales de Spotify no configuradas")
+    token = get_spotify_token()
+    import requests
+    endpoint = "tracks" if item_type == "song" else "artists"
+    response = requests.get(
+        f"{SPOTIFY_API_URL}/v1/{endpoint}/{spotify_id}",
+        headers={"Authorization": f"Bearer {token}"},
+        timeout=10
+    )
+    
+    if response.status_code in (400, 404):
+        raise JobFailed(f"Spotify no encuentra {item_type} {spotify_id}")
+    response.raise_for_status()
+    item = response.json()
+    if spotify_cache is not None:
+        spotify_cache.set(key, item)
+    return item
+
+
+
+# Enriquecimiento de preferencias en segundo plano
+# Al guardar una preferencia se encola un trabajo por (type, spotify_id); si ya existe
+# no se repite. El resultado queda en la cola y en el índice de búsqueda local.
+
+async def enqueue_enrichment(item_type: str, spotify_id: str, name: str):
+    return await jobs.enqueue(
+        "enrich", f"{item_type}:{spotify_id}",
+        {"type": item_type, "spotify_id": spotify_id, "name": name}
+    )
+
+
+@jobs.handler("enrich")
+async def enrich_preference(payload: dict):
+    item = await asyncio.to_thread(get_spotify_item, payload["type"], payload["spotify_id"])
+    
+    if payload["type"] == "song":
+        enrichment = {
+            "artists": [artist["name"] for artist in item["artists"]],
+            "album": item["album"]["name"],
+            "popularity": item["popularity"],
+        }
+    else:
+        enrichment = {
+            "genres": item["genres"],
+            "followers": item["followers"]["total"],
+            "popularity": item["popularity"],
+        }
+    search_index.add(payload["type"], payload["spotify_id"], payload["name"], **enrichment)
+    return enrichment
+
+
+@app.get("/jobs")
+async def list_jobs(
+    status: Optional[str] = None,
+    cursor: Int64 = 0,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+):
+    try:
+        rows = await jobs.list(status, cursor, limit + 1)
+    except ValueError as e:
+        raise HTTPException(status_code= 400, detail=str(e))
+    return paginated_response(rows, limit)
+
+
+@app.get("/jobs/stats")
+async def job_stats():
+    return await jobs.counts()
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: Int64):
+    job = await jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code= 404, detail="Trabajo no existe")
+    return job
+
+
+@app.get("/enrichment/{item_type}/{spotify_id}")
+async def get_enrichment(item_type: str, spotify_id: str):
+    job = await jobs.get_by_key("enrich", f"{item_type}:{spotify_id}")
+    if job is None:
+        raise HTTPException(status_code= 404, detail="No hay datos de enriquecimiento")
+    return {
+        "type": item_type,
+        "spotify_id": spotify_id,
+        "status": job["status"],
+        "data": job["result"],
+        "job_id": job["id"],
+    }
+
+
+
 # Endpoints de Diagnóstico
 
 @app.get("/")
@@ -182,81 +372,93 @@ async def root():
 async def health_check():
     return {"status": "OK", "message": "API funcionando correctamente"}
 
+# Perfil por muestreo del proceso (ver profiler.py). Solo existe si se configura
+# MUSIC_API_ADMIN_TOKEN y hay que mandarlo en la cabecera X-Admin-Token. Devuelve
+# pilas colapsadas en texto, para flamegraph.pl o speedscope:
+#   curl -H "X-Admin-Token: ..." "localhost:8000/debug/profile?seconds=10" > perfil.txt
+profiler = SamplingProfiler()
+
+@app.get("/debug/profile", include_in_schema=False)
+async def debug_profile(
+    seconds: float = Query(5, gt=0, le=MAX_SECONDS),
+    interval: float = Query(0.005, ge=0.001, le=1),
+    idle: bool = False,
+    x_admin_token: Optional[str] = Header(None),
+):
+    admin_token = os.getenv("MUSIC_API_ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code= 404, detail="Not Found")
+    if not check_token(admin_token, x_admin_token):
+        raise HTTPException(status_code= 403, detail="Token de administración incorrecto")
+    try:
+        # En un hilo aparte para que el event loop siga atendiendo (y salga en el perfil)
+        stacks, samples = await asyncio.to_thread(profiler.sample, seconds, interval, idle)
+    except RuntimeError as e:
+        raise HTTPException(status_code= 409, detail=str(e))
+    return Response(
+        content=collapsed(stacks),
+        media_type="text/plain",
+        headers={"X-Profile-Samples": str(samples)},
+    )
+
 
 
 # CRUD de Usuarios
 
 @app.post("/users", response_model= User)
 async def create_user(user_data: UserCreate):
-    global next_user_id
-    
-    for existing_user in users_db:
-        if existing_user["email"] == user_data.email:
-            raise HTTPException(status_code= 400, detail="El email ya existe")
-    
-    new_user = {
-        "id": next_user_id,
-        "name": user_data.name,
-        "email": user_data.email,
-        "age": user_data.age,
-    }
-    
-    users_db.append(new_user)
-    next_user_id += 1
-    
-    return new_user
+    try:
+        return await storage.create_user(user_data.name, user_data.email, user_data.age)
+    except ValueError as e:
+        raise HTTPException(status_code= 400, detail=str(e))
 
 
 @app.get("/users", response_model= List[User])
-async def get_all_users():
-    return users_db
+async def get_all_users(
+    cursor: Int64 = 0,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+):
+    try:
+        # Se pide uno de más para saber si hay página siguiente
+        rows = await storage.list_users(cursor, limit + 1, parse_fields(fields))
+    except ValueError as e:
+        raise HTTPException(status_code= 400, detail=str(e))
+    return paginated_response(rows, limit)
 
 
 @app.get("/users/{user_id}", response_model= User)
-async def get_user_by_id(user_id: int):
-    for user in users_db:
-        if user["id"] == user_id:
-            return user
-    
-    raise HTTPException(status_code= 404, detail="Usuario no encontrado")
+async def get_user_by_id(user_id: Int64):
+    user = await storage.get_user(user_id)
+    if user is None:
+        raise HTTPException(status_code= 404, detail="Usuario no encontrado")
+    return user
 
 
 @app.put("/users/{user_id}", response_model= User)
-async def update_user(user_id: int, user_update: UserUpdate):
-    user_index = None
-    
-    for i, user in enumerate(users_db):
-        if user["id"] == user_id:
-            user_index = i
-            break
-    
-    if user_index is None:
+async def update_user(user_id: Int64, user_update: UserUpdate):
+    try:
+        user_data = await storage.update_user(
+            user_id,
+            name=user_update.name,
+            email=user_update.email,
+            age=user_update.age,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code= 400, detail=str(e))
+
+    if user_data is None:
         raise HTTPException(status_code= 404, detail="Usuario no existe")
-    
-    if user_update.email:
-        for user in users_db:
-            if user["email"] == user_update.email and user["id"] != user_id:
-                raise HTTPException(status_code= 400, detail="El email ya existe")
-    
-    user_data = users_db[user_index]
-    if user_update.name is not None:
-        user_data["name"] = user_update.name
-    if user_update.email is not None:
-        user_data["email"] = user_update.email
-    if user_update.age is not None:
-        user_data["age"] = user_update.age
-    
     return user_data
 
 
 @app.delete("/users/{user_id}")
-async def delete_user(user_id: int):
-    for i, user in enumerate(users_db):
-        if user["id"] == user_id:
-            deleted_user = users_db.pop(i)
-            return {"message": f"Usuario {deleted_user['name']} eliminado correctamente"}
-    
-    raise HTTPException(status_code= 404, detail="Usuario no existe")
+async def delete_user(user_id: Int64):
+    deleted_user = await storage.delete_user(user_id)
+    if deleted_user is None:
+        raise HTTPException(status_code= 404, detail="Usuario no existe")
+    forget_preferences(deleted_user["preferences"])
+    return {"message": f"Usuario {deleted_user['name']} eliminado correctamente"}
 
 
 
@@ -264,62 +466,107 @@ async def delete_user(user_id: int):
 # CRUD de Preferencias Musicales
 
 @app.post("/users/{user_id}/preferences", response_model= MusicPreference)
-async def add_music_preference(user_id: int, preference_data: MusicPreferenceCreate):
-    global next_preference_id
-    
-    user_exists = False
-    for user in users_db:
-        if user["id"] == user_id:
-            user_exists = True
-            break
-    
-    if not user_exists:
+async def add_music_preference(user_id: Int64, preference_data: MusicPreferenceCreate, response: Response):
+    if await storage.get_user(user_id) is None:
         raise HTTPException(status_code= 404, detail="Usuario no existe")
     
-    for pref in music_preferences_db:
-        if pref["user_id"] == user_id and pref["spotify_id"] == preference_data.spotify_id:
-            raise HTTPException(status_code= 400, detail="Esta preferencia ya existe")
-    
-    new_preference = {
-        "id": next_preference_id,
-        "user_id": user_id,
-        "spotify_id": preference_data.spotify_id,
-        "name": preference_data.name,
-        "type": preference_data.type,
-    }
+    try:
+        new_preference = await storage.add_preference(
+            user_id,
+            preference_data.spotify_id,
+            preference_data.name,
+            preference_data.type,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code= 400, detail=str(e))
     
-    music_preferences_db.append(new_preference)
-    next_preference_id += 1
+    recommender.add(user_id, new_preference["type"], new_preference["spotify_id"], new_preference["name"])
+    search_index.add(new_preference["type"], new_preference["spotify_id"], new_preference["name"])
     
+    # Géneros y popularidad se piden a Spotify en segundo plano, la respuesta no espera
+    job = await enqueue_enrichment(new_preference["type"], new_preference["spotify_id"], new_preference["name"])
+    response.headers["X-Enrichment-Job"] = str(job["id"])
     return new_preference
 
 @app.get("/users/{user_id}/preferences", response_model= List[MusicPreference])
-async def get_user_preferences(user_id: int):
-    user_exists = False
-    
-    for user in users_db:
-        if user["id"] == user_id:
-            user_exists = True
-            break
+async def get_user_preferences(
+    user_id: Int64,
+    cursor: Int64 = 0,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    fields: Optional[str] = None,
+):
+    if await storage.get_user(user_id) is None:
+        raise HTTPException(status_code= 404, detail="Usuario no existe")
     
-    if not user_exists:
+    try:
+        rows = await storage.list_preferences(user_id, cursor, limit + 1, parse_fields(fields))
+    except ValueError as e:
+        raise HTTPException(status_code= 400, detail=str(e))
+    return paginated_response(rows, limit)
+
+@app.delete("/preferences/{preference_id}")
+async def delete_music_preference(preference_id: Int64):
+    deleted_pref = await storage.delete_preference(preference_id)
+    if deleted_pref is None:
+        raise HTTPException(status_code= 404, detail="Preferencia no existe")
+    forget_preferences([deleted_pref])
+    return {"message": f"Preferencia '{deleted_pref['name']}' eliminada"}
+
+def forget_preferences(preferences: list):
+    """Quitar de los índices en memoria las preferencias ya borradas del almacenamiento
+    (los contadores del ranking los ajusta el propio almacenamiento)"""
+    for pref in preferences:
+        recommender.remove(pref["user_id"], pref["type"], pref["spotify_id"])
+        # Si ya nadie la guarda sale también de la búsqueda local; si viene de una
+        # búsqueda en Spotify vuelve a entrar la próxima vez que aparezca
+        if not pref["remaining"]:
+            search_index.remove(pref["type"], pref["spotify_id"])
+
+
+
+# Recomendaciones: usuarios con gustos parecidos y canciones/artistas que podrían gustar
+
+@app.get("/users/{user_id}/similar")
+async def get_similar_users(user_id: Int64, limit: int = Query(10, ge=1, le=100)):
+    if await storage.get_user(user_id) is None:
         raise HTTPException(status_code= 404, detail="Usuario no existe")
     
-    user_preferences = []
-    for pref in music_preferences_db:
-        if pref["user_id"] == user_id:
-            user_preferences.append(pref)
+    return {
+        "user_id": user_id,
+        "similar_users": [
+            {"user_id": other_id, "similarity": round(similarity, 4)}
+            for other_id, similarity in recommender.similar_users(user_id, limit)
+        ]
+    }
+
+
+@app.get("/users/{user_id}/recommendations")
+async def get_recommendations(user_id: Int64, limit: int = Query(10, ge=1, le=100)):
+    if await storage.get_user(user_id) is None:
+        raise HTTPException(status_code= 404, detail="Usuario no existe")
     
-    return user_preferences
+    return {
+        "user_id": user_id,
+        "recommendations": [
+            {"spotify_id": spotify_id, "name": name, "type": type, "score": round(score, 4)}
+            for type, spotify_id, name, score in recommender.recommend(user_id, limit)
+        ]
+    }
 
-@app.delete("/preferences/{preference_id}")
-async def delete_music_preference(preference_id: int):
-    for i, pref in enumerate(music_preferences_db):
-        if pref["id"] == preference_id:
-            deleted_pref = music_preferences_db.pop(i)
-            return {"message": f"Preferencia '{deleted_pref['name']}' eliminada"}
+
+
+# Ranking de canciones y artistas más guardados, a partir de contadores que se
+# actualizan con cada preferencia (ver counters.py)
+
+@app.get("/leaderboard")
+async def get_leaderboard(type: str = "song", limit: int = Query(10, ge=1, le=100)):
+    if type not in ("song", "artist"):
+        raise HTTPException(status_code= 400, detail="type debe ser 'song' o 'artist'")
     
-    raise HTTPException(status_code= 404, detail="Preferencia no existe")
+    return {
+        "type": type,
+        "items": await storage.top_preferences(type, limit)
+    }
 
 
 
@@ -358,6 +605,7 @@ async def search_tracks(q: str, limit: int = 10):
             "album": track["album"]["name"],
         }
         simplified_tracks.append(simplified_track)
+        search_index.add("song", **simplified_track)
     
     return {
         "query": q,
@@ -384,6 +632,7 @@ async def search_artists(q: str, limit: int = 10):
             "popularity": artist["popularity"],
         }
         simplified_artists.append(simplified_artist)
+        search_index.add("artist", **simplified_artist)
     
     return {
         "query": q,
@@ -392,6 +641,30 @@ async def search_artists(q: str, limit: int = 10):
     }
 
 
+
+# Búsqueda local: primero en el índice, y solo si no hay resultados se pregunta a Spotify
+
+@app.get("/search")
+async def local_search(q: str, type: str = "song", limit: int = Query(10, ge=1, le=50)):
+    if not q or len(q.strip()) < 2:
+        raise HTTPException(status_code= 400, detail="La búsqueda debe tener al menos 2 caracteres")
+    if type not in ("song", "artist"):
+        raise HTTPException(status_code= 400, detail="type debe ser 'song' o 'artist'")
+    
+    results = [item for item, score in search_index.search(q, type, limit)]
+    if results:
+        return {"query": q, "source": "local", "total": len(results), "results": results}
+    
+    if type == "song":
+        response = await search_tracks(q, limit)
+        results = response["tracks"]
+    else:
+        response = await search_artists(q, limit)
+        results = response["artists"]
+    
+    return {"query": q, "source": "spotify", "total": len(results), "results": results}
+
+
 # Para ejecutar con: uvicorn main:app --reload
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,32 @@
+import os
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# Clase de respuesta JSON por defecto de la API
+# Con orjson (si está instalado) serializar un listado grande es unas diez veces más
+# rápido que con el json estándar. MUSIC_API_JSON=json fuerza el estándar.
+# orjson no serializa enteros de más de 64 bits. Las entradas de la API no los admiten
+# (ver Int64 en main.py), pero si alguna respuesta los lleva se genera con el json estándar.
+
+
+class ORJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        try:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:  # orjson.JSONEncodeError
+            return super().render(content)
+
+
+def get_response_class():
+    if orjson is not None and os.getenv("MUSIC_API_JSON", "orjson") == "orjson":
+        return ORJSONResponse
+    return JSONResponse
+
+
+DefaultResponse = get_response_class()
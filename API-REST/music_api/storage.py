@@ -0,0 +1,501 @@
+import asyncio
+import bisect
+import os
+import queue
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+
+from counters import PreferenceCounters
+
+
+# Backends de almacenamiento para usuarios y preferencias musicales.
+# MemoryStorage guarda todo en diccionarios (útil para tests), SQLiteStorage
+# persiste en disco y permite arrancar uvicorn con varios workers.
+# Los errores de duplicados se señalan con ValueError, igual que en el resto del proyecto.
+#
+# Los listados se paginan por cursor (keyset): se devuelven los registros con
+# id > after_id, ordenados por id, como mucho `limit`. `fields` limita las
+# columnas devueltas; "id" siempre se incluye porque es el cursor.
+#
+# Borrar un usuario borra también sus preferencias. delete_user y delete_preference
+# devuelven las preferencias borradas con "remaining": cuántos usuarios siguen
+# guardando esa canción/artista, para que la API ajuste sus índices en memoria.
+
+USER_FIELDS = ("id", "name", "email", "age")
+PREFERENCE_FIELDS = ("id", "user_id", "spotify_id", "name", "type")
+
+# SQLite guarda los enteros en 64 bits con signo. main.py valida ids, cursores y
+# edades con este rango, así los dos backends aceptan lo mismo
+MIN_INT, MAX_INT = -2**63, 2**63 - 1
+
+DEFAULT_DB_PATH = "music_api.sqlite3"
+
+
+def project_fields(fields, allowed):
+    if not fields:
+        return allowed
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f"Campos desconocidos: {', '.join(unknown)}")
+    return ("id",) + tuple(field for field in allowed if field in fields and field != "id")
+
+
+class Storage(ABC):
+    @abstractmethod
+    async def create_user(self, name: str, email: str, age: int) -> dict:
+        ...
+
+    @abstractmethod
+    async def list_users(self, after_id: int = 0, limit=None, fields=None) -> list:
+        ...
+
+    @abstractmethod
+    async def get_user(self, user_id: int):
+        ...
+
+    @abstractmethod
+    async def update_user(self, user_id: int, name=None, email=None, age=None):
+        ...
+
+    @abstractmethod
+    async def delete_user(self, user_id: int):
+        ...
+
+    @abstractmethod
+    async def add_preference(self, user_id: int, spotify_id: str, name: str, type: str) -> dict:
+        ...
+
+    @abstractmethod
+    async def list_preferences(self, user_id: int, after_id: int = 0, limit=None, fields=None) -> list:
+        ...
+
+    @abstractmethod
+    async def delete_preference(self, preference_id: int):
+        ...
+
+    @abstractmethod
+    async def top_preferences(self, type: str, limit: int) -> list:
+        ...
+
+    @abstractmethod
+    async def all_preferences(self) -> list:
+        ...
+
+    def close(self):
+        pass
+
+
+
+# Backend en memoria, con índices por id y por email para no recorrer listas
+
+class MemoryStorage(Storage):
+    def __init__(self):
+        self.users = {}
+        self.user_ids = []  # ordenados, para paginar con bisect
+        self.users_by_email = {}
+        self.next_user_id = 1
+
+        self.preferences = {}
+        self.preference_ids_by_user = {}  # user_id -> ids ordenados
+        self.preference_keys = set()  # (user_id, spotify_id)
+        self.next_preference_id = 1
+
+        self.counters = PreferenceCounters()
+
+    @staticmethod
+    def _page(ids, rows, after_id, limit, fields):
+        start = bisect.bisect_right(ids, after_id)
+        end = len(ids) if limit is None else start + limit
+        return [{field: rows[row_id][field] for field in fields} for row_id in ids[start:end]]
+
+    @staticmethod
+    def _remove_id(ids, row_id):
+        index = bisect.bisect_left(ids, row_id)
+        if index < len(ids) and ids[index] == row_id:
+            del ids[index]
+
+    async def create_user(self, name, email, age):
+        if email in self.users_by_email:
+            raise ValueError("El email ya existe")
+
+        new_user = {"id": self.next_user_id, "name": name, "email": email, "age": age}
+        self.users[new_user["id"]] = new_user
+        self.user_ids.append(new_user["id"])
+        self.users_by_email[email] = new_user["id"]
+        self.next_user_id += 1
+        return new_user
+
+    async def list_users(self, after_id=0, limit=None, fields=None):
+        fields = project_fields(fields, USER_FIELDS)
+        return self._page(self.user_ids, self.users, after_id, limit, fields)
+
+    async def get_user(self, user_id):
+        return self.users.get(user_id)
+
+    async def update_user(self, user_id, name=None, email=None, age=None):
+        user = self.users.get(user_id)
+        if user is None:
+            return None
+
+        if email is not None and self.users_by_email.get(email, user_id) != user_id:
+            raise ValueError("El email ya existe")
+
+        if name is not None:
+            user["name"] = name
+        if email is not None:
+            del self.users_by_email[user["email"]]
+            self.users_by_email[email] = user_id
+            user["email"] = email
+        if age is not None:
+            user["age"] = age
+        return user
+
+    async def delete_user(self, user_id):
+        """Usuario borrado con sus preferencias en "preferences", o None"""
+        user = self.users.pop(user_id, None)
+        if user is None:
+            return None
+        del self.users_by_email[user["email"]]
+        self._remove_id(self.user_ids, user_id)
+        preferences = [
+            self._delete_preference(preference_id)
+            for preference_id in list(self.preference_ids_by_user.get(user_id, []))
+        ]
+        self.preference_ids_by_user.pop(user_id, None)
+        return {**user, "preferences": preferences}
+
+    async def add_preference(self, user_id, spotify_id, name, type):
+        if (user_id, spotify_id) in self.preference_keys:
+            raise ValueError("Esta preferencia ya existe")
+
+        new_preference = {
+            "id": self.next_preference_id,
+            "user_id": user_id,
+            "spotify_id": spotify_id,
+            "name": name,
+            "type": type,
+        }
+        self.preferences[new_preference["id"]] = new_preference
+        self.preference_ids_by_user.setdefault(user_id, []).append(new_preference["id"])
+        self.preference_keys.add((user_id, spotify_id))
+        self.next_preference_id += 1
+        self.counters.increment(type, spotify_id, name)
+        return new_preference
+
+    async def list_preferences(self, user_id, after_id=0, limit=None, fields=None):
+        fields = project_fields(fields, PREFERENCE_FIELDS)
+        ids = self.preference_ids_by_user.get(user_id, [])
+        return self._page(ids, self.preferences, after_id, limit, fields)
+
+    async def delete_preference(self, preference_id):
+        if preference_id not in self.preferences:
+            return None
+        return self._delete_preference(preference_id)
+
+    def _delete_preference(self, preference_id):
+        pref = self.preferences.pop(preference_id)
+        self.preference_keys.discard((pref["user_id"], pref["spotify_id"]))
+        self._remove_id(self.preference_ids_by_user[pref["user_id"]], preference_id)
+        remaining = self.counters.decrement(pref["type"], pref["spotify_id"])
+        return {**pref, "remaining": remaining}
+
+    async def top_preferences(self, type, limit):
+        return self.counters.top(type, limit)
+
+    async def all_preferences(self):
+        return list(self.preferences.values())
+
+
+
+# Backend SQLite en modo WAL
+# Las consultas son constantes con parámetros "?", así sqlite3 reutiliza la
+# sentencia preparada de su caché por conexión en vez de compilarla cada vez.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    age INTEGER NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email ON users(email);
+
+CREATE TABLE IF NOT EXISTS music_preferences (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    spotify_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    type TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_preferences_user_spotify
+    ON music_preferences(user_id, spotify_id);
+CREATE INDEX IF NOT EXISTS idx_preferences_user_id
+    ON music_preferences(user_id, id);
+
+-- Contadores para el ranking, se mantienen en la misma transacción que cada preferencia
+CREATE TABLE IF NOT EXISTS preference_counts (
+    type TEXT NOT NULL,
+    spotify_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (type, spotify_id)
+);
+CREATE INDEX IF NOT EXISTS idx_preference_counts_rank
+    ON preference_counts(type, count DESC);
+"""
+
+# Rellena los contadores si la base de datos es anterior a preference_counts
+BACKFILL_COUNTS = """
+INSERT INTO preference_counts (type, spotify_id, name, count)
+SELECT type, spotify_id, MAX(name), COUNT(*) FROM music_preferences
+WHERE NOT EXISTS (SELECT 1 FROM preference_counts)
+GROUP BY type, spotify_id
+"""
+
+USER_COLUMNS = ", ".join(USER_FIELDS)
+PREFERENCE_COLUMNS = ", ".join(PREFERENCE_FIELDS)
+
+
+class ConnectionPool:
+    def __init__(self, path: str, size: int = 8):
+        self.path = path
+        self.size = size
+        self.free = queue.LifoQueue()
+        self.created = 0
+        self.lock = threading.Lock()
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.path,
+            timeout=5.0,
+            check_same_thread=False,
+            cached_statements=128,
+            isolation_level=None,  # autocommit: cada sentencia es su propia transacción
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA busy_timeout=5000")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        try:
+            conn = self.free.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                can_open = self.created < self.size
+                if can_open:
+                    self.created += 1
+            conn = self._open() if can_open else self.free.get()
+        try:
+            yield conn
+        finally:
+            self.free.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self.free.get_nowait().close()
+            except queue.Empty:
+                break
+        self.created = 0
+
+
+@contextmanager
+def transaction(conn):
+    # IMMEDIATE pide el bloqueo de escritura al empezar, así varios workers esperan
+    # su turno (busy_timeout) en vez de fallar al intentar escribir a mitad
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+class SQLiteStorage(Storage):
+    def __init__(self, path: str, pool_size: int = 8):
+        self.pool = ConnectionPool(path, pool_size)
+        with self.pool.connection() as conn:
+            conn.executescript(SCHEMA)
+            with transaction(conn):
+                conn.execute(BACKFILL_COUNTS)
+
+    async def _run(self, func, *args):
+        # sqlite3 es bloqueante, se ejecuta en el pool de hilos para no parar el event loop
+        return await asyncio.to_thread(self._with_connection, func, *args)
+
+    def _with_connection(self, func, *args):
+        with self.pool.connection() as conn:
+            return func(conn, *args)
+
+    async def create_user(self, name, email, age):
+        return await self._run(self._create_user, name, email, age)
+
+    def _create_user(self, conn, name, email, age):
+        try:
+            cursor = conn.execute(
+                "INSERT INTO users (name, email, age) VALUES (?, ?, ?)",
+                (name, email, age),
+            )
+        except sqlite3.IntegrityError:
+            raise ValueError("El email ya existe")
+        return {"id": cursor.lastrowid, "name": name, "email": email, "age": age}
+
+    async def list_users(self, after_id=0, limit=None, fields=None):
+        columns = ", ".join(project_fields(fields, USER_FIELDS))
+        return await self._run(self._list_users, after_id, limit, columns)
+
+    def _list_users(self, conn, after_id, limit, columns):
+        # LIMIT -1 en SQLite significa sin límite
+        rows = conn.execute(
+            f"SELECT {columns} FROM users WHERE id > ? ORDER BY id LIMIT ?",
+            (after_id, -1 if limit is None else limit),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    async def get_user(self, user_id):
+        return await self._run(self._get_user, user_id)
+
+    def _get_user(self, conn, user_id):
+        row = conn.execute(f"SELECT {USER_COLUMNS} FROM users WHERE id = ?", (user_id,)).fetchone()
+        return dict(row) if row else None
+
+    async def update_user(self, user_id, name=None, email=None, age=None):
+        return await self._run(self._update_user, user_id, name, email, age)
+
+    def _update_user(self, conn, user_id, name, email, age):
+        try:
+            cursor = conn.execute(
+                "UPDATE users SET name = COALESCE(?, name), email = COALESCE(?, email), "
+                "age = COALESCE(?, age) WHERE id = ?",
+                (name, email, age, user_id),
+            )
+        except sqlite3.IntegrityError:
+            raise ValueError("El email ya existe")
+        if cursor.rowcount == 0:
+            return None
+        return self._get_user(conn, user_id)
+
+    async def delete_user(self, user_id):
+        return await self._run(self._delete_user, user_id)
+
+    def _delete_user(self, conn, user_id):
+        with transaction(conn):
+            row = conn.execute(
+                f"DELETE FROM users WHERE id = ? RETURNING {USER_COLUMNS}", (user_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            rows = conn.execute(
+                f"DELETE FROM music_preferences WHERE user_id = ? RETURNING {PREFERENCE_COLUMNS}",
+                (user_id,),
+            ).fetchall()
+            preferences = [self._decrement_count(conn, pref) for pref in rows]
+        return {**dict(row), "preferences": preferences}
+
+    async def add_preference(self, user_id, spotify_id, name, type):
+        return await self._run(self._add_preference, user_id, spotify_id, name, type)
+
+    def _add_preference(self, conn, user_id, spotify_id, name, type):
+        try:
+            with transaction(conn):
+                cursor = conn.execute(
+                    "INSERT INTO music_preferences (user_id, spotify_id, name, type) VALUES (?, ?, ?, ?)",
+                    (user_id, spotify_id, name, type),
+                )
+                conn.execute(
+                    "INSERT INTO preference_counts (type, spotify_id, name, count) VALUES (?, ?, ?, 1) "
+                    "ON CONFLICT (type, spotify_id) DO UPDATE SET count = count + 1, name = excluded.name",
+                    (type, spotify_id, name),
+                )
+        except sqlite3.IntegrityError:
+            raise ValueError("Esta preferencia ya existe")
+        return {
+            "id": cursor.lastrowid,
+            "user_id": user_id,
+            "spotify_id": spotify_id,
+            "name": name,
+            "type": type,
+        }
+
+    async def list_preferences(self, user_id, after_id=0, limit=None, fields=None):
+        columns = ", ".join(project_fields(fields, PREFERENCE_FIELDS))
+        return await self._run(self._list_preferences, user_id, after_id, limit, columns)
+
+    def _list_preferences(self, conn, user_id, after_id, limit, columns):
+        rows = conn.execute(
+            f"SELECT {columns} FROM music_preferences WHERE user_id = ? AND id > ? ORDER BY id LIMIT ?",
+            (user_id, after_id, -1 if limit is None else limit),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    async def delete_preference(self, preference_id):
+        return await self._run(self._delete_preference, preference_id)
+
+    def _delete_preference(self, conn, preference_id):
+        with transaction(conn):
+            row = conn.execute(
+                f"DELETE FROM music_preferences WHERE id = ? RETURNING {PREFERENCE_COLUMNS}",
+                (preference_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            return self._decrement_count(conn, row)
+
+    @staticmethod
+    def _decrement_count(conn, pref):
+        # Dentro de la transacción del borrado de la preferencia
+        counted = conn.execute(
+            "UPDATE preference_counts SET count = count - 1 WHERE type = ? AND spotify_id = ? "
+            "RETURNING count",
+            (pref["type"], pref["spotify_id"]),
+        ).fetchone()
+        remaining = max(counted["count"], 0) if counted else 0
+        if not remaining:
+            conn.execute(
+                "DELETE FROM preference_counts WHERE type = ? AND spotify_id = ?",
+                (pref["type"], pref["spotify_id"]),
+            )
+        return {**dict(pref), "remaining": remaining}
+
+    async def top_preferences(self, type, limit):
+        return await self._run(self._top_preferences, type, limit)
+
+    def _top_preferences(self, conn, type, limit):
+        rows = conn.execute(
+            "SELECT spotify_id, name, type, count FROM preference_counts "
+            "WHERE type = ? ORDER BY count DESC LIMIT ?",
+            (type, limit),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    async def all_preferences(self):
+        return await self._run(self._all_preferences)
+
+    def _all_preferences(self, conn):
+        rows = conn.execute(f"SELECT {PREFERENCE_COLUMNS} FROM music_preferences").fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self):
+        self.pool.close()
+
+
+
+# Selección del backend con variables de entorno (ver README)
+
+def create_storage() -> Storage:
+    backend = os.getenv("MUSIC_API_STORAGE", "memory").lower()
+
+    if backend == "memory":
+        return MemoryStorage()
+    if backend == "sqlite":
+        path = os.getenv("MUSIC_API_DB_PATH", DEFAULT_DB_PATH)
+        pool_size = int(os.getenv("MUSIC_API_DB_POOL_SIZE", "8"))
+        return SQLiteStorage(path, pool_size)
+
+    raise ValueError(f"Backend de almacenamiento desconocido: {backend}")
@@ -0,0 +1,374 @@
+import asyncio
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+# La cola de trabajos y la caché de Spotify van a un directorio temporal, y sin
+# credenciales de Spotify ninguna prueba sale a la red (ni aunque haya un .env)
+TMP = tempfile.TemporaryDirectory()
+os.environ["MUSIC_API_STORAGE"] = "memory"
+os.environ["MUSIC_API_JOBS_PATH"] = os.path.join(TMP.name, "jobs.sqlite3")
+os.environ["SPOTIFY_CACHE_PATH"] = ""
+os.environ["SPOTIFY_CLIENT_ID"] = ""
+os.environ["SPOTIFY_CLIENT_SECRET"] = ""
+
+from fastapi.testclient import TestClient
+
+import main
+from idempotency import IdempotencyMiddleware
+from jobs import JobFailed, JobQueue
+from responses import DefaultResponse
+from storage import SQLiteStorage
+
+# Pruebas: cd API-REST/music_api && python -m unittest tests
+
+
+def usuario(n, **cambios):
+    return {"name": f"user{n}", "email": f"user{n}@example.com", "age": 20 + n, **cambios}
+
+
+class ApiTestCase(unittest.TestCase):
+    """Cliente con la app arrancada (startup/shutdown) y el almacenamiento vacío"""
+
+    def setUp(self):
+        main.storage = main.create_storage()
+        main.recommender = main.RecommendationIndex()
+        main.search_index = main.SearchIndex()
+        self.client = TestClient(main.app)
+        self.client.__enter__()
+        self.addCleanup(self.client.__exit__, None, None, None)
+
+
+class IdempotenciaTests(ApiTestCase):
+    def alta(self, datos, clave=None):
+        # Las claves viven en el middleware de la app durante todo el proceso: una por test
+        clave = clave or self.id()
+        return self.client.post("/users", json=datos, headers={"Idempotency-Key": clave})
+
+    def test_reintento_devuelve_la_respuesta_original(self):
+        primera = self.alta(usuario(1))
+        segunda = self.alta(usuario(1))
+        self.assertEqual(primera.status_code, 200)
+        self.assertEqual(segunda.json(), primera.json())
+        self.assertEqual(segunda.headers["idempotent-replayed"], "true")
+        self.assertEqual(len(self.client.get("/users").json()), 1)
+
+    def test_misma_clave_con_otro_cuerpo(self):
+        self.alta(usuario(1))
+        self.assertEqual(self.alta(usuario(2)).status_code, 422)
+        self.assertEqual(len(self.client.get("/users").json()), 1)
+
+    def test_sin_clave_no_cambia_nada(self):
+        self.assertEqual(self.client.post("/users", json=usuario(1)).status_code, 200)
+        self.assertEqual(self.client.post("/users", json=usuario(1)).status_code, 400)
+
+    def test_clave_demasiado_larga(self):
+        self.assertEqual(self.alta(usuario(1), clave="x" * 256).status_code, 400)
+
+
+class RespuestasTests(unittest.TestCase):
+    def test_enteros_de_mas_de_64_bits(self):
+        # orjson no los serializa, la respuesta sale con el json estándar
+        self.assertEqual(json.loads(DefaultResponse(content={"n": 2 ** 64}).body), {"n": 2 ** 64})
+
+
+class EnSQLite:
+    """Mezcla para repetir las pruebas de la API con SQLiteStorage"""
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        main.storage = SQLiteStorage(os.path.join(tmp.name, "music.sqlite3"))
+        self.addCleanup(main.storage.close)
+
+
+class EnterosTests(ApiTestCase):
+    """Ids, cursores y edades que no caben en 64 bits dan 422 con cualquier backend"""
+
+    def test_fuera_de_rango(self):
+        grande = 2 ** 70
+        self.assertEqual(self.client.post("/users", json=usuario(1, age=grande)).status_code, 422)
+        user_id = self.client.post("/users", json=usuario(1, age=2 ** 63 - 1)).json()["id"]
+        self.assertEqual(self.client.get(f"/users/{user_id}").json()["age"], 2 ** 63 - 1)
+        self.assertEqual(self.client.put(f"/users/{user_id}", json={"age": -grande}).status_code, 422)
+        for ruta in (f"/users/{grande}", f"/users?cursor={grande}", f"/users/{user_id}/preferences?cursor=-{grande}",
+                     f"/jobs/{grande}"):
+            self.assertEqual(self.client.get(ruta).status_code, 422, ruta)
+        self.assertEqual(self.client.delete(f"/preferences/{grande}").status_code, 422)
+
+
+class EnterosSQLiteTests(EnSQLite, EnterosTests):
+    pass
+
+
+class BorradoTests(ApiTestCase):
+    """Al borrar, el ranking, las recomendaciones y la búsqueda local quedan al día"""
+
+    def crear(self, n, *canciones):
+        user_id = self.client.post("/users", json=usuario(n)).json()["id"]
+        ids = []
+        for spotify_id in canciones:
+            respuesta = self.client.post(
+                f"/users/{user_id}/preferences",
+                json={"spotify_id": spotify_id, "name": f"Cancion {spotify_id}", "type": "song"}
+            )
+            ids.append(respuesta.json()["id"])
+        return user_id, ids
+
+    def ranking(self):
+        items = self.client.get("/leaderboard", params={"type": "song"}).json()["items"]
+        return {item["spotify_id"]: item["count"] for item in items}
+
+    def buscables(self):
+        return {item["spotify_id"] for item, _ in main.search_index.search("cancion", "song", 50)}
+
+    def test_borrar_usuario(self):
+        ana, _ = self.crear(1, "a", "b")
+        luis, _ = self.crear(2, "b", "c")
+        self.assertEqual(self.client.delete(f"/users/{ana}").status_code, 200)
+
+        self.assertEqual(self.ranking(), {"b": 1, "c": 1})
+        self.assertEqual(self.buscables(), {"b", "c"})
+        self.assertNotIn(ana, main.recommender.user_items)
+        self.assertEqual(main.recommender.item_users[("song", "b")], {luis})
+        self.assertEqual(self.client.get(f"/users/{luis}/similar").json()["similar_users"], [])
+
+    def test_borrar_preferencia(self):
+        ana, (a, b) = self.crear(1, "a", "b")
+        self.crear(2, "b")
+        for preference_id in (a, b):
+            self.assertEqual(self.client.delete(f"/preferences/{preference_id}").status_code, 200)
+
+        self.assertEqual(self.ranking(), {"b": 1})
+        self.assertEqual(self.buscables(), {"b"})
+        self.assertNotIn(ana, main.recommender.user_items)
+        self.assertEqual(self.client.delete(f"/preferences/{a}").status_code, 404)
+
+
+class BorradoSQLiteTests(EnSQLite, BorradoTests):
+    pass
+
+
+async def llamar(app, body=b"{}", clave=b"k"):
+    """Petición POST /users directa al ASGI; devuelve (status, cabeceras)"""
+    mensajes = []
+    scope = {
+        "type": "http", "method": "POST", "path": "/users",
+        "headers": [(b"idempotency-key", clave)],
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(mensaje):
+        mensajes.append(mensaje)
+
+    await app(scope, receive, send)
+    return mensajes[0]["status"], dict(mensajes[0]["headers"])
+
+
+class IdempotenciaConcurrenteTests(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.ejecuciones = 0
+
+    async def app_lenta(self, scope, receive, send):
+        self.ejecuciones += 1
+        await receive()
+        await asyncio.sleep(0.05)
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"x-n", b"%d" % self.ejecuciones)]})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def test_peticiones_iguales_a_la_vez_se_ejecutan_una_vez(self):
+        middleware = IdempotencyMiddleware(self.app_lenta, routes=[("POST", "/users")])
+        respuestas = await asyncio.gather(*(llamar(middleware) for _ in range(5)))
+        self.assertEqual(self.ejecuciones, 1)
+        self.assertEqual([status for status, _ in respuestas], [200] * 5)
+        self.assertEqual(sum(b"idempotent-replayed" in cabeceras for _, cabeceras in respuestas), 4)
+
+
+class IdempotenciaDescarteTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.ejecuciones = []
+        self.soltar = asyncio.Event()
+
+    async def app(self, scope, receive, send):
+        body = (await receive())["body"]
+        self.ejecuciones.append(body)
+        if body == b"lenta":
+            await self.soltar.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": body})
+
+    async def test_no_descarta_las_que_estan_en_curso(self):
+        middleware = IdempotencyMiddleware(self.app, routes=[("POST", "/users")], max_entries=1)
+        lenta = asyncio.create_task(llamar(middleware, b"lenta", b"a"))
+        await asyncio.sleep(0.01)
+        # Con max_entries=1 esta obliga a descartar, pero la primera sigue en curso
+        await llamar(middleware, b"otra", b"b")
+        reintento = asyncio.create_task(llamar(middleware, b"lenta", b"a"))
+        await asyncio.sleep(0.01)
+        self.soltar.set()
+        await lenta
+        _, cabeceras = await reintento
+        self.assertEqual(self.ejecuciones, [b"lenta", b"otra"])
+        self.assertIn(b"idempotent-replayed", cabeceras)
+        self.assertEqual(len(middleware.entries), 1)
+
+class PerfilTests(ApiTestCase):
+    def test_sin_token_configurado_no_existe(self):
+        with patch.dict(os.environ, {"MUSIC_API_ADMIN_TOKEN": ""}):
+            self.assertEqual(self.client.get("/debug/profile", params={"seconds": 0.01}).status_code, 404)
+
+    @patch.dict(os.environ, {"MUSIC_API_ADMIN_TOKEN": "secreto"})
+    def test_token_incorrecto(self):
+        respuesta = self.client.get("/debug/profile", params={"seconds": 0.01}, headers={"X-Admin-Token": "otro"})
+        self.assertEqual(respuesta.status_code, 403)
+
+    @patch.dict(os.environ, {"MUSIC_API_ADMIN_TOKEN": "secreto"})
+    def test_pilas_colapsadas(self):
+        parar = threading.Event()
+        hilo = threading.Thread(target=ocupado, args=(parar,))
+        hilo.start()
+        try:
+            respuesta = self.client.get("/debug/profile", params={"seconds": 0.2}, headers={"X-Admin-Token": "secreto"})
+        finally:
+            parar.set()
+            hilo.join()
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertGreater(int(respuesta.headers["X-Profile-Samples"]), 0)
+        self.assertIn("tests.py:ocupado", respuesta.text)
+
+
+def ocupado(parar):
+    while not parar.is_set():
+        time.sleep(0)
+
+class EnriquecimientoTests(ApiTestCase):
+    def test_sin_credenciales_falla_sin_reintentar(self):
+        user_id = self.client.post("/users", json=usuario(1)).json()["id"]
+        respuesta = self.client.post(
+            f"/users/{user_id}/preferences", json={"spotify_id": "a", "name": "Cancion a", "type": "song"}
+        )
+        job_id = respuesta.headers["X-Enrichment-Job"]
+        for _ in range(500):
+            job = self.client.get(f"/jobs/{job_id}").json()
+            if job["status"] == "failed":
+                break
+            time.sleep(0.01)
+        self.assertEqual((job["status"], job["attempts"]), ("failed", 1))
+
+    def test_cola_junto_a_la_base_de_datos(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        entorno = {"MUSIC_API_DB_PATH": os.path.join(tmp.name, "music.sqlite3"), "MUSIC_API_JOBS_PATH": ""}
+        with patch.dict(os.environ, entorno):
+            self.assertEqual(main.create_job_queue().path, os.path.join(tmp.name, "jobs.sqlite3"))
+
+class ColaTrabajosTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cola = JobQueue(os.path.join(tmp.name, "jobs.sqlite3"), workers=2, base_delay=0.01, poll_interval=0.01)
+        self.llamadas = []
+
+        @self.cola.handler("eco")
+        async def eco(payload):
+            self.llamadas.append(payload)
+            if payload.get("fallos", 0) >= len(self.llamadas):
+                raise RuntimeError("fallo temporal")
+            if payload.get("definitivo"):
+                raise JobFailed("no existe")
+            return {"eco": payload["n"]}
+
+        @self.cola.handler("sin_clave")
+        async def sin_clave(payload):
+            self.llamadas.append(payload)
+            if len(self.llamadas) == 1:
+                return {}["falta"]
+            return {}
+
+        await self.cola.start()
+        self.addAsyncCleanup(self.cola.stop)
+
+    async def esperar(self, job_id):
+        for _ in range(500):
+            job = await self.cola.get(job_id)
+            if job["status"] in ("done", "failed"):
+                return job
+            await asyncio.sleep(0.01)
+        self.fail(f"El trabajo {job_id} no termina")
+
+    async def test_se_ejecuta_y_guarda_el_resultado(self):
+        job = await self.cola.enqueue("eco", "a", {"n": 1})
+        job = await self.esperar(job["id"])
+        self.assertEqual((job["status"], job["result"], job["attempts"]), ("done", {"eco": 1}, 1))
+
+    async def test_misma_clave_no_se_repite(self):
+        primero = await self.cola.enqueue("eco", "a", {"n": 1})
+        await self.esperar(primero["id"])
+        segundo = await self.cola.enqueue("eco", "a", {"n": 2})
+        self.assertEqual(segundo["id"], primero["id"])
+        self.assertEqual(segundo["status"], "done")
+        self.assertEqual(len(self.llamadas), 1)
+
+    async def test_reintenta_los_errores_temporales(self):
+        job = await self.cola.enqueue("eco", "a", {"n": 1, "fallos": 2})
+        job = await self.esperar(job["id"])
+        self.assertEqual((job["status"], job["attempts"]), ("done", 3))
+
+    async def test_job_failed_no_se_reintenta(self):
+        job = await self.cola.enqueue("eco", "a", {"n": 1, "definitivo": True})
+        job = await self.esperar(job["id"])
+        self.assertEqual((job["status"], job["attempts"], job["last_error"]), ("failed", 1, "no existe"))
+
+    async def test_fallido_se_puede_volver_a_encolar(self):
+        job = await self.cola.enqueue("eco", "a", {"n": 1, "definitivo": True})
+        await self.esperar(job["id"])
+        job = await self.cola.enqueue("eco", "a", {"n": 1})
+        self.assertEqual(job["status"], "pending")
+        self.assertEqual((await self.esperar(job["id"]))["status"], "done")
+
+    async def test_tipo_desconocido_falla_sin_reintentos(self):
+        job = await self.cola.enqueue("otro", "a", {})
+        job = await self.esperar(job["id"])
+        self.assertEqual((job["status"], job["attempts"]), ("failed", 1))
+        self.assertIn("otro", job["last_error"])
+
+    async def test_key_error_del_handler_se_reintenta(self):
+        job = await self.cola.enqueue("sin_clave", "a", {})
+        job = await self.esperar(job["id"])
+        self.assertEqual((job["status"], job["attempts"]), ("done", 2))
+
+    async def test_worker_sigue_si_falla_la_base_de_datos(self):
+        claim = self.cola._claim
+        fallos = [sqlite3.OperationalError("database is locked")] * 2
+
+        def claim_con_fallos():
+            if fallos:
+                raise fallos.pop()
+            return claim()
+
+        with patch.object(self.cola, "_claim", claim_con_fallos), self.assertLogs("jobs", "ERROR"):
+            job = await self.cola.enqueue("eco", "a", {"n": 1})
+            job = await self.esperar(job["id"])
+        self.assertEqual(job["status"], "done")
+        self.assertTrue(all(not task.done() for task in self.cola.tasks))
+
+
+class ArranqueTests(unittest.TestCase):
+    def test_requests_no_se_importa_al_arrancar(self):
+        # En un proceso nuevo: en este ya lo pueden haber importado otras pruebas
+        codigo = "import sys, main; print('requests' in sys.modules)"
+        salida = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True, check=True)
+        self.assertEqual(salida.stdout.strip(), "False")
+
+if __name__ == "__main__":
+    unittest.main()
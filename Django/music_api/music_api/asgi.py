@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Las búsquedas de Spotify son views async, para aprovecharlas ejecutar con:
+    uvicorn music_api.asgi:application --workers N
 """
 
 import os
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import importlib.util
 from pathlib import Path
 from dotenv import load_dotenv
 import os
@@ -81,10 +82,57 @@ WSGI_APPLICATION = "music_api.wsgi.application"
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "NAME": os.getenv("DJANGO_DB_PATH", BASE_DIR / "db.sqlite3"),
     }
 }
 
+# Perfil de producción para SQLite (DJANGO_DB_PROFILE=production):
+#   - WAL: los lectores no bloquean al escritor ni al revés
+#   - synchronous=NORMAL: seguro con WAL y sin fsync en cada commit
+#   - caché de páginas de 64 MB, mmap de 256 MB y tablas temporales en memoria
+#   - transacciones IMMEDIATE: el bloqueo de escritura se pide al empezar, así
+#     el busy timeout funciona en vez de fallar con "database is locked"
+#   - conexiones persistentes (CONN_MAX_AGE) con comprobación de salud
+# Para comparar con el perfil por defecto: python manage.py bench_sqlite
+
+SQLITE_PRODUCTION_OPTIONS = {
+    "init_command": (
+        "PRAGMA journal_mode=WAL;"
+        "PRAGMA synchronous=NORMAL;"
+        "PRAGMA cache_size=-65536;"
+        "PRAGMA mmap_size=268435456;"
+        "PRAGMA temp_store=MEMORY"
+    ),
+    "transaction_mode": "IMMEDIATE",
+    "timeout": 20,  # busy timeout en segundos
+}
+
+DB_PROFILE = os.getenv("DJANGO_DB_PROFILE", "development")
+
+if DB_PROFILE == "production":
+    DATABASES["default"].update({
+        "OPTIONS": SQLITE_PRODUCTION_OPTIONS,
+        "CONN_MAX_AGE": 600,
+        "CONN_HEALTH_CHECKS": True,
+    })
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Los listados de users guardan aquí sus respuestas serializadas (ver users/cache.py).
+# Con varios procesos se puede cambiar por un backend compartido (Redis, Memcached).
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "music-api",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+}
+
+USERS_CACHE_ALIAS = "default"
+USERS_CACHE_TIMEOUT = 300  # segundos
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -129,4 +177,39 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # Variables de Spotify
 SPOTIFY_CLIENT_ID = os.getenv("SPOTIFY_CLIENT_ID")
-SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
\ No newline at end of file
+SPOTIFY_CLIENT_SECRET = os.getenv("SPOTIFY_CLIENT_SECRET")
+SPOTIFY_TIMEOUT = 10  # segundos
+# Se pueden cambiar para apuntar a un Spotify falso (ver Pruebas-Carga)
+SPOTIFY_ACCOUNTS_URL = os.getenv("SPOTIFY_ACCOUNTS_URL", "https://accounts.spotify.com")
+SPOTIFY_API_URL = os.getenv("SPOTIFY_API_URL", "https://api.spotify.com")
+SPOTIFY_MAX_CONNECTIONS = 100  # por proceso, en el cliente async
+
+# Caché en disco de las búsquedas en Spotify, compartida entre procesos (vacío = sin caché)
+SPOTIFY_CACHE_PATH = os.getenv("SPOTIFY_CACHE_PATH", str(BASE_DIR / "spotify_cache.sqlite3"))
+SPOTIFY_CACHE_MAX_MB = int(os.getenv("SPOTIFY_CACHE_MAX_MB", "100"))
+SPOTIFY_CACHE_TTL = int(os.getenv("SPOTIFY_CACHE_TTL", "86400"))  # segundos
+
+# Idempotency-Key en las altas (ver users/idempotency.py)
+IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "86400"))  # segundos
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+IDEMPOTENCY_WAIT = 30  # segundos que espera un reintento a que termine la petición original
+
+# Token para los endpoints de diagnóstico (/api/debug/profile/). Vacío = desactivados
+ADMIN_TOKEN = os.getenv("DJANGO_ADMIN_TOKEN", "")
+
+# Renderer JSON: orjson si está instalado, si no el de DRF.
+# DJANGO_JSON_RENDERER=json fuerza el de DRF aunque orjson esté disponible.
+if os.getenv("DJANGO_JSON_RENDERER", "orjson") == "orjson" and importlib.util.find_spec("orjson"):
+    JSON_RENDERER = "users.renderers.ORJSONRenderer"
+else:
+    JSON_RENDERER = "rest_framework.renderers.JSONRenderer"
+
+REST_FRAMEWORK = {
+    "DEFAULT_RENDERER_CLASSES": [
+        JSON_RENDERER,
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+}
+
+# Tamaño de lote por defecto para las altas masivas (se puede cambiar con ?chunk_size=)
+BULK_CHUNK_SIZE = 1000
\ No newline at end of file
@@ -0,0 +1,34 @@
+"""
+Perfil solo API, para los pods que solo sirven /api/:
+
+    DJANGO_SETTINGS_MODULE=music_api.settings_api
+
+Igual que settings.py pero sin admin, sesiones, mensajes, ficheros estáticos ni
+plantillas: se importan menos módulos al arrancar y cada petición pasa por menos
+middleware (python manage.py bench_startup compara los dos perfiles). Sin plantillas
+no hay API navegable de DRF, todo se responde en JSON, y como ninguna view usa
+usuarios de Django tampoco se cargan auth ni la autenticación de DRF.
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import JSON_RENDERER, REST_FRAMEWORK
+
+INSTALLED_APPS = [
+    "rest_framework",
+    "users",
+]
+
+MIDDLEWARE = [
+    "django.middleware.security.SecurityMiddleware",
+    "django.middleware.common.CommonMiddleware",
+]
+
+TEMPLATES = []
+
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    "DEFAULT_RENDERER_CLASSES": [JSON_RENDERER],
+    "DEFAULT_AUTHENTICATION_CLASSES": [],
+    "DEFAULT_PERMISSION_CLASSES": [],
+    "UNAUTHENTICATED_USER": None,
+}
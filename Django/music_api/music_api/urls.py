@@ -16,10 +16,15 @@ Including another URLconf
 """
 
 
-from django.contrib import admin
+from django.conf import settings
 from django.urls import path, include
 
 urlpatterns = [
-    path('admin/', admin.site.urls),
     path('api/', include('users.urls')),
-]
\ No newline at end of file
+]
+
+# El perfil solo API (settings_api.py) no tiene admin
+if 'django.contrib.admin' in settings.INSTALLED_APPS:
+    from django.contrib import admin
+
+    urlpatterns.append(path('admin/', admin.site.urls))
\ No newline at end of file
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Usuario, MusicPreference
+from .models import Usuario, MusicPreference, PreferenceCounter
 
 @admin.register(Usuario)
 class UsuarioAdmin(admin.ModelAdmin):
@@ -7,4 +7,9 @@ class UsuarioAdmin(admin.ModelAdmin):
 
 @admin.register(MusicPreference)
 class MusicPreferenceAdmin(admin.ModelAdmin):
-    list_display = ['user', 'name', 'type', 'added_at']
\ No newline at end of file
+    list_display = ['user', 'name', 'type', 'added_at']
+    list_select_related = ['user']
+
+@admin.register(PreferenceCounter)
+class PreferenceCounterAdmin(admin.ModelAdmin):
+    list_display = ['name', 'type', 'spotify_id', 'count']
\ No newline at end of file
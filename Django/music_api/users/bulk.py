@@ -0,0 +1,202 @@
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from . import counters, recommendations, search_index
+from .cache import invalidate_on_commit
+from .models import Usuario, MusicPreference
+
+# Altas masivas de usuarios y preferencias
+# Las filas se leen de un array JSON o de un stream NDJSON (un objeto por línea),
+# se validan por lotes (una consulta por lote para detectar duplicados) y se
+# guardan con bulk_create, un lote por transacción. Los errores se devuelven por fila.
+
+MAX_CHUNK_SIZE = 10000
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/jsonl', 'application/ndjson')
+PREFERENCE_TYPES = {choice for choice, _ in MusicPreference._meta.get_field('type').choices}
+
+
+class InvalidRow:
+    """Línea NDJSON que no se ha podido decodificar"""
+
+    def __init__(self, error):
+        self.error = error
+
+
+def iter_rows(request):
+    """Devolver las filas del cuerpo de la petición sin cargar el NDJSON entero en memoria"""
+    if request.content_type in NDJSON_CONTENT_TYPES:
+        return _iter_ndjson(request._request)
+
+    rows = request.data
+    if not isinstance(rows, list):
+        raise ValueError("El cuerpo debe ser un array JSON o NDJSON")
+    return iter(rows)
+
+
+def _iter_ndjson(http_request):
+    for line in http_request:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            yield InvalidRow(f"JSON no válido: {e}")
+
+
+def get_chunk_size(request):
+    default = getattr(settings, 'BULK_CHUNK_SIZE', 1000)
+    try:
+        chunk_size = int(request.GET.get('chunk_size', default))
+    except ValueError:
+        raise ValueError("chunk_size debe ser un número entero")
+    if chunk_size < 1 or chunk_size > MAX_CHUNK_SIZE:
+        raise ValueError(f"chunk_size debe estar entre 1 y {MAX_CHUNK_SIZE}")
+    return chunk_size
+
+
+def check_row(row, fields):
+    if isinstance(row, InvalidRow):
+        raise ValueError(row.error)
+    if not isinstance(row, dict):
+        raise ValueError("La fila debe ser un objeto JSON")
+    missing = [field for field in fields if row.get(field) in (None, '')]
+    if missing:
+        raise ValueError(f"Faltan datos: {', '.join(missing)}")
+
+
+def validate_users_chunk(chunk):
+    """Validar un lote de usuarios. Devuelve ([(fila, Usuario)], [errores])"""
+    candidates = []
+    errors = []
+    seen_emails = set()
+
+    for index, row in chunk:
+        try:
+            check_row(row, ('name', 'email', 'age'))
+            email = str(row['email'])
+            validate_email(email)
+            age = int(row['age'])
+        except ValidationError:
+            errors.append({'row': index, 'error': "Email no válido"})
+            continue
+        except (ValueError, TypeError) as e:
+            errors.append({'row': index, 'error': str(e)})
+            continue
+
+        if email in seen_emails:
+            errors.append({'row': index, 'error': "Email repetido en la petición"})
+            continue
+        seen_emails.add(email)
+        candidates.append((index, Usuario(name=str(row['name']), email=email, age=age)))
+
+    existing = set(Usuario.objects.filter(email__in=seen_emails).values_list('email', flat=True))
+    valid = []
+    for index, usuario in candidates:
+        if usuario.email in existing:
+            errors.append({'row': index, 'error': "El email ya existe"})
+        else:
+            valid.append((index, usuario))
+    return valid, errors
+
+
+def validate_preferences_chunk(chunk):
+    """Validar un lote de preferencias. Devuelve ([(fila, MusicPreference)], [errores])"""
+    candidates = []
+    errors = []
+    seen_keys = set()
+
+    for index, row in chunk:
+        try:
+            check_row(row, ('user_id', 'spotify_id', 'name', 'type'))
+            user_id = int(row['user_id'])
+            if row['type'] not in PREFERENCE_TYPES:
+                raise ValueError(f"type debe ser uno de: {', '.join(sorted(PREFERENCE_TYPES))}")
+        except (ValueError, TypeError) as e:
+            errors.append({'row': index, 'error': str(e)})
+            continue
+
+        key = (user_id, str(row['spotify_id']))
+        if key in seen_keys:
+            errors.append({'row': index, 'error': "Preferencia repetida en la petición"})
+            continue
+        seen_keys.add(key)
+        candidates.append((index, MusicPreference(
+            user_id=user_id, spotify_id=key[1], name=str(row['name']), type=row['type']
+        )))
+
+    user_ids = {user_id for user_id, _ in seen_keys}
+    existing_users = set(Usuario.objects.filter(id__in=user_ids).values_list('id', flat=True))
+    existing_keys = set(
+        MusicPreference.objects
+        .filter(user_id__in=user_ids, spotify_id__in={spotify_id for _, spotify_id in seen_keys})
+        .values_list('user_id', 'spotify_id')
+    )
+
+    valid = []
+    for index, pref in candidates:
+        if pref.user_id not in existing_users:
+            errors.append({'row': index, 'error': "Usuario no existe"})
+        elif (pref.user_id, pref.spotify_id) in existing_keys:
+            errors.append({'row': index, 'error': "Esta preferencia ya existe"})
+        else:
+            valid.append((index, pref))
+    return valid, errors
+
+
+def save_chunk(model, valid, errors):
+    """Guardar un lote en una transacción. Si otra petición ha metido un duplicado
+    entre la validación y el insert, se reintenta fila a fila para saber cuál falla."""
+    try:
+        with transaction.atomic():
+            objs = model.objects.bulk_create([obj for _, obj in valid])
+            if model is MusicPreference:
+                counters.increment(objs)
+                recommendations.on_preferences_added(objs)
+                search_index.on_preferences_added(objs)
+        return len(valid)
+    except IntegrityError:
+        pass
+
+    created = 0
+    for index, obj in valid:
+        try:
+            with transaction.atomic():
+                obj.save(force_insert=True)
+            created += 1
+        except IntegrityError:
+            errors.append({'row': index, 'error': "Registro duplicado"})
+    return created
+
+
+def invalidate_chunk(model, valid):
+    # bulk_create no dispara post_save, así que la caché de respuestas se invalida aquí
+    if model is MusicPreference:
+        invalidate_on_commit('preferences', *{f'user:{pref.user_id}' for _, pref in valid})
+    else:
+        invalidate_on_commit('users')
+
+
+def bulk_insert(model, rows, validate_chunk, chunk_size):
+    """Validar y guardar las filas por lotes de chunk_size"""
+    created = 0
+    errors = []
+    numbered = enumerate(rows)
+
+    while True:
+        chunk = list(islice(numbered, chunk_size))
+        if not chunk:
+            break
+        valid, chunk_errors = validate_chunk(chunk)
+        errors.extend(chunk_errors)
+        if valid:
+            created += save_chunk(model, valid, errors)
+            invalidate_chunk(model, valid)
+
+    errors.sort(key=lambda error: error['row'])
+    return {'created': created, 'failed': len(errors), 'errors': errors}
@@ -0,0 +1,104 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+
+# Caché de respuestas para los listados de lectura
+# Se guardan los bytes JSON ya serializados junto con su ETag, en el backend de
+# caché de Django configurado en USERS_CACHE_ALIAS (LocMemCache por defecto; con
+# varios workers conviene uno compartido como Redis o Memcached).
+#
+# La invalidación va por ámbitos: cada ámbito tiene un contador de generación que
+# forma parte de la clave, y al cambiar los datos (señales en signals.py) se
+# incrementa solo el contador afectado. Las entradas viejas quedan huérfanas y
+# caducan solas. Ámbitos:
+#   users         -> users_list
+#   preferences   -> preferences_list (incluye user_name, también cambia con los usuarios)
+#   user:<id>     -> user_preferences de ese usuario
+
+KEY_PREFIX = "users:response"
+
+
+def get_cache():
+    return caches[getattr(settings, 'USERS_CACHE_ALIAS', 'default')]
+
+
+def generation_key(scope):
+    return f"{KEY_PREFIX}:generation:{scope}"
+
+
+def invalidate(*scopes):
+    cache = get_cache()
+    for scope in scopes:
+        key = generation_key(scope)
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def invalidate_on_commit(*scopes):
+    """Invalidar cuando la transacción se confirma (al momento si no hay ninguna abierta).
+    Si se invalida antes, una lectura concurrente aún ve las filas viejas y las guarda
+    con la generación nueva, y esa entrada dura todo USERS_CACHE_TIMEOUT"""
+    transaction.on_commit(lambda: invalidate(*scopes))
+
+
+def response_key(scope, request):
+    generation = get_cache().get(generation_key(scope), 0)
+    return f"{KEY_PREFIX}:{scope}:{generation}:{request.get_full_path()}"
+
+
+def make_etag(body):
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def build_response(entry, request):
+    if entry['etag'] in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(entry['body'], content_type='application/json')
+        for name, value in entry['headers'].items():
+            response[name] = value
+    response['ETag'] = entry['etag']
+    return response
+
+
+def cacheable(request):
+    # El modo streaming no se guarda, y el navegador con la API navegable de DRF pide HTML
+    return (
+        request.method == 'GET'
+        and 'stream' not in request.GET
+        and 'text/html' not in request.headers.get('Accept', '')
+    )
+
+
+def cached_response(scope):
+    """Decorador para views de lectura. scope recibe los kwargs de la URL y devuelve el ámbito"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not cacheable(request):
+                return view(request, *args, **kwargs)
+
+            # La clave se calcula antes de ejecutar la view: si los datos cambian
+            # mientras tanto, la entrada queda en una generación ya invalidada
+            key = response_key(scope(**kwargs), request)
+            cache = get_cache()
+            entry = cache.get(key)
+            if entry is None:
+                response = view(request, *args, **kwargs)
+                if hasattr(response, 'render'):
+                    response.render()
+                if response.status_code != 200 or not response.get('Content-Type', '').startswith('application/json'):
+                    return response
+                body = response.content
+                headers = {}
+                if response.has_header('X-Next-Cursor'):
+                    headers['X-Next-Cursor'] = response['X-Next-Cursor']
+                entry = {'body': body, 'etag': make_etag(body), 'headers': headers}
+                cache.set(key, entry, getattr(settings, 'USERS_CACHE_TIMEOUT', 300))
+            return build_response(entry, request)
+        return wrapper
+    return decorator
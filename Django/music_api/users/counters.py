@@ -0,0 +1,49 @@
+from collections import Counter
+
+from django.db import connection
+from django.db.models import F
+
+from .models import PreferenceCounter
+
+# Mantenimiento incremental de PreferenceCounter
+# Cada alta suma uno al contador de su (type, spotify_id) con un UPSERT y cada
+# baja resta uno, así el ranking se lee directamente de la tabla de contadores
+# con el índice (type, -count) sin agrupar toda la tabla de preferencias.
+
+UPSERT_SQL = (
+    "INSERT INTO {table} (type, spotify_id, name, count) VALUES (%s, %s, %s, %s) "
+    "ON CONFLICT (type, spotify_id) DO UPDATE SET "
+    "count = {table}.count + excluded.count, name = excluded.name"
+)
+
+
+def increment(preferences):
+    """Sumar las preferencias nuevas a sus contadores (una sola sentencia por lote)"""
+    totals = Counter()
+    names = {}
+    for pref in preferences:
+        totals[(pref.type, pref.spotify_id)] += 1
+        names[(pref.type, pref.spotify_id)] = pref.name
+    if not totals:
+        return
+
+    table = connection.ops.quote_name(PreferenceCounter._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            UPSERT_SQL.format(table=table),
+            [(type, spotify_id, names[(type, spotify_id)], count) for (type, spotify_id), count in totals.items()],
+        )
+
+
+def decrement(preference):
+    counters = PreferenceCounter.objects.filter(type=preference.type, spotify_id=preference.spotify_id)
+    counters.filter(count__gt=0).update(count=F('count') - 1)
+    counters.filter(count=0).delete()
+
+
+def top(type, limit):
+    return list(
+        PreferenceCounter.objects.filter(type=type)
+        .order_by('-count')
+        .values('spotify_id', 'name', 'type', 'count')[:limit]
+    )
@@ -0,0 +1,91 @@
+import hashlib
+import time
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+# Cabecera Idempotency-Key para las altas (users_create)
+# Un cliente que reintenta una petición (por ejemplo tras un timeout) manda la misma
+# Idempotency-Key y recibe la respuesta original sin que la view se ejecute otra vez.
+# Las claves se guardan en la base de datos con una restricción única, así que dos
+# peticiones iguales a la vez (aunque lleguen a workers distintos) solo ejecutan una:
+# la segunda espera a que termine la primera y devuelve su respuesta.
+#
+# - Las claves duran IDEMPOTENCY_TTL segundos y se guardan como mucho
+#   IDEMPOTENCY_MAX_KEYS; las viejas se borran al crear claves nuevas.
+# - Las respuestas 5xx no se guardan, así un reintento puede salir bien.
+# - La misma clave con otro cuerpo da 422; si la original sigue en curso pasado
+#   IDEMPOTENCY_WAIT se da por abandonada (el proceso murió) y se vuelve a ejecutar.
+# - Las respuestas repetidas llevan la cabecera Idempotent-Replayed: true.
+
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05  # segundos entre comprobaciones mientras la original está en curso
+
+
+def claim(endpoint, key, fingerprint):
+    """Crear la entrada de la clave. Devuelve (entrada, True) si es nueva, o la que ya había"""
+    try:
+        with transaction.atomic():
+            entry = IdempotencyKey.objects.create(endpoint=endpoint, key=key, fingerprint=fingerprint)
+    except IntegrityError:
+        return IdempotencyKey.objects.filter(endpoint=endpoint, key=key).first(), False
+
+    expired = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_TTL)
+    IdempotencyKey.objects.filter(
+        Q(created_at__lt=expired) | Q(id__lte=entry.id - settings.IDEMPOTENCY_MAX_KEYS)
+    ).exclude(pk=entry.pk).delete()
+    return entry, True
+
+
+def idempotent(view):
+    """Decorador para views de alta, debajo de @api_view"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if key is None:
+            return view(request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response({"error": f"Idempotency-Key debe tener entre 1 y {MAX_KEY_LENGTH} caracteres"}, status=400)
+
+        endpoint = view.__name__
+        fingerprint = hashlib.sha256(request.body).hexdigest()
+        while True:
+            entry, created = claim(endpoint, key, fingerprint)
+            if created:
+                break
+            if entry is None:
+                continue  # se acaba de borrar, se vuelve a intentar
+
+            now = timezone.now()
+            if (
+                entry.created_at < now - timedelta(seconds=settings.IDEMPOTENCY_TTL)
+                or (entry.status_code is None and entry.created_at < now - timedelta(seconds=settings.IDEMPOTENCY_WAIT))
+            ):
+                # Caducada, o la original se quedó a medias: se ejecuta como nueva
+                IdempotencyKey.objects.filter(pk=entry.pk, created_at=entry.created_at).delete()
+                continue
+            if entry.fingerprint != fingerprint:
+                return Response({"error": "Idempotency-Key ya usada con otro cuerpo"}, status=422)
+            if entry.status_code is not None:
+                return Response(entry.data, status=entry.status_code, headers={'Idempotent-Replayed': 'true'})
+            time.sleep(POLL_INTERVAL)
+
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            entry.delete()
+            raise
+        if response.status_code >= 500:
+            entry.delete()
+        else:
+            # update() y no save(): si otra alta ya la ha borrado por el límite no pasa nada
+            IdempotencyKey.objects.filter(pk=entry.pk).update(status_code=response.status_code, data=response.data)
+        return response
+    return wrapper
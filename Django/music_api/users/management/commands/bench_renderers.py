@@ -0,0 +1,45 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from users import renderers
+
+
+class Command(BaseCommand):
+    help = "Comparar el renderer JSON de DRF con el de orjson en un listado grande de preferencias"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        if renderers.orjson is None:
+            raise CommandError("orjson no está instalado")
+
+        # Mismas filas que devuelve GET /api/preferences/ (values() del ORM)
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        rows = [
+            {
+                "id": i,
+                "user_id": i // 10,
+                "user_name": f"user{i // 10}",
+                "spotify_id": f"4uLU6hMCjMI75M1A2tKU{i:06d}",
+                "name": f"Canción número {i}",
+                "type": "song" if i % 3 else "artist",
+                "added_at": start + timedelta(seconds=i),
+            }
+            for i in range(options["rows"])
+        ]
+
+        results = {}
+        for name, renderer in (("DRF (json)", JSONRenderer()), ("orjson", renderers.ORJSONRenderer())):
+            timings = []
+            for _ in range(options["repeat"]):
+                t = time.perf_counter()
+                body = renderer.render(rows)
+                timings.append(time.perf_counter() - t)
+            results[name] = min(timings)
+            self.stdout.write(f"{name:<12} {min(timings) * 1000:8.1f} ms  {len(body) / 1e6:6.1f} MB")
+        self.stdout.write(f"orjson es {results['DRF (json)'] / results['orjson']:.1f}x más rápido")
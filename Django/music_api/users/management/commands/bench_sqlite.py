@@ -0,0 +1,66 @@
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+
+from users.models import Usuario
+
+
+class Command(BaseCommand):
+    help = "Comparar escrituras concurrentes en SQLite con el perfil por defecto y el de producción"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--writes", type=int, default=300, help="Altas por hilo")
+
+    def handle(self, *args, **options):
+        profiles = {
+            "por defecto": {},
+            "producción": settings.SQLITE_PRODUCTION_OPTIONS,
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            for name, db_options in profiles.items():
+                alias = f"bench_{len(connections.settings)}"
+                path = os.path.join(tmp, f"{alias}.sqlite3")
+                self.add_database(alias, path, db_options)
+                elapsed, created, locked = self.run(alias, options["threads"], options["writes"])
+                self.stdout.write(
+                    f"{name:<12} {created / elapsed:8.0f} altas/s  "
+                    f"{created} ok, {locked} 'database is locked'  ({elapsed:.2f} s)"
+                )
+
+    def add_database(self, alias, path, db_options):
+        config = {"ENGINE": "django.db.backends.sqlite3", "NAME": path, "OPTIONS": dict(db_options)}
+        configured = connections.configure_settings({"default": config, alias: config})
+        connections.settings[alias] = configured[alias]
+        with connections[alias].schema_editor() as editor:
+            editor.create_model(Usuario)
+
+    def run(self, alias, num_threads, writes):
+        created = [0] * num_threads
+        locked = [0] * num_threads
+
+        # Cada hilo hace lo mismo que users_create: un INSERT en su propia transacción
+        def worker(n):
+            for i in range(writes):
+                try:
+                    with transaction.atomic(using=alias):
+                        Usuario.objects.using(alias).create(
+                            name=f"user{n}-{i}", email=f"user{n}-{i}@example.com", age=30
+                        )
+                    created[n] += 1
+                except OperationalError:
+                    locked[n] += 1
+            connections[alias].close()
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(num_threads)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start, sum(created), sum(locked)
@@ -0,0 +1,103 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# Cada medida es un proceso nuevo, como un worker recién arrancado: django.setup(),
+# creación del WSGIHandler (carga el middleware) y cada ruta pedida dos veces. La
+# primera petición importa las urls y las views, la segunda ya no.
+CHILD = """
+import json, sys, time
+from wsgiref.util import setup_testing_defaults
+
+start = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+from django.core.handlers.wsgi import WSGIHandler
+handler = WSGIHandler()
+ready = time.perf_counter()
+
+def get(path):
+    environ = {"PATH_INFO": path, "HTTP_ACCEPT": "application/json"}
+    setup_testing_defaults(environ)
+    status = []
+    body = handler(environ, lambda s, headers: status.append(s))
+    b"".join(body)
+    body.close()
+    return int(status[0].split()[0])
+
+result = {"setup": setup - start, "handler": ready - setup, "requests": []}
+for path in sys.argv[1:]:
+    times = []
+    for _ in range(2):
+        t = time.perf_counter()
+        status = get(path)
+        times.append(time.perf_counter() - t)
+    result["requests"].append([path, status, times[0], times[1]])
+print(json.dumps(result))
+"""
+
+
+def top_imports(stderr):
+    """Imports de primer nivel de -X importtime con su tiempo acumulado"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[12:].split("|")
+        if cumulative.strip().isdigit() and name.startswith(" ") and not name.startswith("  "):
+            imports.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(imports, reverse=True)
+
+
+class Command(BaseCommand):
+    help = "Medir el arranque en frío (django.setup y primera petición) con cada perfil de settings"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--profiles", nargs="+", default=["music_api.settings", "music_api.settings_api"],
+        )
+        parser.add_argument("--paths", nargs="+", default=["/api/hello/", "/api/users/"])
+
+    def run_once(self, profile, paths, importtime=False):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=profile)
+        flags = ["-X", "importtime"] if importtime else []
+        t = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, *flags, "-c", CHILD, *paths],
+            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        result["process"] = time.perf_counter() - t
+        result["imports"] = top_imports(process.stderr) if importtime else []
+        return result
+
+    def handle(self, *args, **options):
+        def median_ms(values):
+            return statistics.median(values) * 1000
+
+        for profile in options["profiles"]:
+            results = [self.run_once(profile, options["paths"]) for _ in range(options["repeat"])]
+            # -X importtime hace más lento el import, la lista sale de un proceso aparte
+            imports = self.run_once(profile, options["paths"], importtime=True)["imports"]
+
+            self.stdout.write(f"{profile} (mediana de {options['repeat']} procesos)")
+            self.stdout.write(f"  proceso completo    {median_ms([r['process'] for r in results]):8.1f} ms")
+            self.stdout.write(f"  django.setup()      {median_ms([r['setup'] for r in results]):8.1f} ms")
+            self.stdout.write(f"  WSGIHandler         {median_ms([r['handler'] for r in results]):8.1f} ms")
+            for i, (path, status, _, _) in enumerate(results[0]["requests"]):
+                first = median_ms([r["requests"][i][2] for r in results])
+                second = median_ms([r["requests"][i][3] for r in results])
+                self.stdout.write(
+                    f"  GET {path:<16} {first:8.1f} ms la primera, {second:.1f} ms la segunda ({status})"
+                )
+            self.stdout.write("  Imports que más tardan (acumulado):")
+            for seconds, name in imports[:8]:
+                self.stdout.write(f"    {name:<30} {seconds * 1000:8.1f} ms")
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0002_musicpreference"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="usuario",
+            name="email",
+            field=models.EmailField(max_length=254, unique=True),
+        ),
+        migrations.AddIndex(
+            model_name="musicpreference",
+            index=models.Index(fields=["-added_at"], name="pref_added_at_idx"),
+        ),
+        migrations.AddConstraint(
+            model_name="musicpreference",
+            constraint=models.UniqueConstraint(fields=("user", "spotify_id"), name="unique_user_spotify_id"),
+        ),
+    ]
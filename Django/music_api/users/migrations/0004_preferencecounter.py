@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:37
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+def backfill_counters(apps, schema_editor):
+    MusicPreference = apps.get_model("users", "MusicPreference")
+    PreferenceCounter = apps.get_model("users", "PreferenceCounter")
+    totals = (
+        MusicPreference.objects.values("type", "spotify_id")
+        .annotate(count=Count("id"), name=Max("name"))
+        .order_by()
+    )
+    PreferenceCounter.objects.bulk_create(
+        (PreferenceCounter(**row) for row in totals.iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("users", "0003_indexes_and_constraints"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PreferenceCounter",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("spotify_id", models.CharField(max_length=100)),
+                ("type", models.CharField(choices=[("song", "Song"), ("artist", "Artist")], max_length=10)),
+                ("name", models.CharField(max_length=200)),
+                ("count", models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                "indexes": [models.Index(fields=["type", "-count"], name="counter_ranking_idx")],
+                "constraints": [models.UniqueConstraint(fields=("type", "spotify_id"), name="unique_counter_type_spotify_id")],
+            },
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
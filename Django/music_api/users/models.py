@@ -1,8 +1,9 @@
 from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
 
 class Usuario(models.Model):
     name = models.CharField(max_length=100)
-    email = models.EmailField()
+    email = models.EmailField(unique=True)
     age = models.IntegerField()
     created_at = models.DateTimeField(auto_now_add=True)
     
@@ -16,5 +17,55 @@ class MusicPreference(models.Model):
     type = models.CharField(max_length=10, choices=[('song', 'Song'), ('artist', 'Artist')])
     added_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        constraints = [
+            # Un usuario no puede guardar dos veces la misma canción o artista
+            models.UniqueConstraint(fields=['user', 'spotify_id'], name='unique_user_spotify_id'),
+        ]
+        indexes = [
+            models.Index(fields=['-added_at'], name='pref_added_at_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.name} - {self.name}"
+
+class PreferenceCounter(models.Model):
+    """Número de usuarios que han guardado cada canción o artista, para el ranking.
+    Se mantiene desde signals.py y bulk.py, nunca se escribe desde las views."""
+    spotify_id = models.CharField(max_length=100)
+    type = models.CharField(max_length=10, choices=[('song', 'Song'), ('artist', 'Artist')])
+    name = models.CharField(max_length=200)
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['type', 'spotify_id'], name='unique_counter_type_spotify_id'),
+        ]
+        indexes = [
+            models.Index(fields=['type', '-count'], name='counter_ranking_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} ({self.count})"
+
+
+class IdempotencyKey(models.Model):
+    """Respuesta de un alta hecha con cabecera Idempotency-Key, ver idempotency.py.
+    status_code vacío: la petición original todavía está en curso."""
+    endpoint = models.CharField(max_length=100)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    data = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['endpoint', 'key'], name='unique_idempotency_endpoint_key'),
+        ]
+        indexes = [
+            models.Index(fields=['created_at'], name='idempotency_created_at_idx'),
+        ]
+    
     def __str__(self):
-        return f"{self.user.name} - {self.name}"
\ No newline at end of file
+        return f"{self.endpoint} {self.key}"
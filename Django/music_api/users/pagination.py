@@ -0,0 +1,69 @@
+from rest_framework.response import Response
+
+# Paginación por cursor (keyset) para los listados, igual que en FastAPI:
+#   ?cursor=<id>  devuelve los registros con id mayor que el cursor
+#   ?limit=<n>    tamaño de página (por defecto 100, máximo 1000)
+#   ?fields=a,b   solo se consultan y devuelven esos campos (el id siempre va incluido)
+# El cursor de la siguiente página se devuelve en la cabecera X-Next-Cursor.
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def parse_page_params(request, field_map):
+    """Leer cursor, limit y fields de la query string. Lanza ValueError si no son válidos"""
+    try:
+        cursor = int(request.GET.get('cursor', 0))
+        limit = int(request.GET.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise ValueError("cursor y limit deben ser números enteros")
+
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValueError(f"limit debe estar entre 1 y {MAX_PAGE_SIZE}")
+
+    return cursor, limit, parse_fields(request, field_map)
+
+
+def parse_fields(request, field_map):
+    """Campos pedidos con ?fields=, en el orden de field_map y siempre con el id"""
+    fields = list(field_map)
+    requested = request.GET.get('fields')
+    if requested:
+        requested = [field.strip() for field in requested.split(',') if field.strip()]
+        unknown = [field for field in requested if field not in field_map]
+        if unknown:
+            raise ValueError(f"Campos desconocidos: {', '.join(unknown)}")
+        fields = ['id'] + [field for field in field_map if field in requested and field != 'id']
+    return fields
+
+
+def keyset_rows(request, queryset, field_map):
+    """Obtener una página del queryset ordenada por id, con una sola consulta
+
+    field_map relaciona el nombre del campo en la respuesta con el lookup del ORM
+    (por ejemplo 'user_name' -> 'user__name', que se resuelve con un JOIN). Se usa
+    values_list para que la consulta solo lea las columnas pedidas y no se creen
+    instancias del modelo. Devuelve (filas, cabeceras) y lanza ValueError si los
+    parámetros no son válidos.
+    """
+    cursor, limit, fields = parse_page_params(request, field_map)
+
+    lookups = [field_map[field] for field in fields]
+    # Se pide uno de más para saber si hay página siguiente
+    rows = queryset.filter(id__gt=cursor).order_by('id').values_list(*lookups)[:limit + 1]
+    data = [dict(zip(fields, row)) for row in rows]
+
+    headers = {}
+    if len(data) > limit:
+        data = data[:limit]
+        headers['X-Next-Cursor'] = str(data[-1]['id'])
+    return data, headers
+
+
+def keyset_page(request, queryset, field_map):
+    """Responder con una página del queryset (ver keyset_rows)"""
+    try:
+        data, headers = keyset_rows(request, queryset, field_map)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    return Response(data, headers=headers)
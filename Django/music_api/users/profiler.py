@@ -0,0 +1,82 @@
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+
+# Profiler por muestreo para ver dónde se va el tiempo en producción (bucles de las
+# views, llamadas a Spotify...) sin redesplegar. Mientras dura, un hilo aparte mira cada
+# `interval` segundos qué está ejecutando cada hilo del proceso (sys._current_frames) y
+# cuenta las pilas; cuando no se usa no cuesta nada. Se lanza con GET /api/debug/profile/
+# (ver views.debug_profile) y solo perfila el worker que atiende esa petición.
+#
+# El resultado son pilas "colapsadas", una por línea con su número de muestras:
+#     views.py:users_list;query.py:__iter__;... 42
+# que se pueden abrir con flamegraph.pl o en https://www.speedscope.app.
+# Por defecto se descartan los hilos parados esperando; con idle=True salen también.
+
+MAX_SECONDS = 60
+
+# Funciones donde se queda un hilo que no está haciendo nada
+IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+}
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.labels = {}  # code -> "fichero.py:función"
+
+    def label(self, code):
+        label = self.labels.get(code)
+        if label is None:
+            label = f"{os.path.basename(code.co_filename)}:{code.co_name}"
+            self.labels[code] = label
+        return label
+
+    def collapse(self, frame):
+        labels = []
+        while frame is not None:
+            labels.append(self.label(frame.f_code))
+            frame = frame.f_back
+        labels.reverse()
+        return ";".join(labels)
+
+    def sample(self, seconds: float, interval: float = 0.005, idle: bool = False):
+        """Muestrear durante `seconds` segundos. Devuelve (Counter de pilas, muestras)"""
+        if not self.lock.acquire(blocking=False):
+            raise RuntimeError("Ya hay un perfil en curso")
+        try:
+            stacks = Counter()
+            own = threading.get_ident()
+            samples = 0
+            end = time.monotonic() + seconds
+            while time.monotonic() < end:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id == own:
+                        continue
+                    code = frame.f_code
+                    if not idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                        continue
+                    stacks[self.collapse(frame)] += 1
+                samples += 1
+                time.sleep(interval)
+            return stacks, samples
+        finally:
+            self.lock.release()
+
+
+def collapsed(stacks: Counter) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def check_token(expected, given) -> bool:
+    """El endpoint solo existe si hay token configurado, y hay que mandarlo igual"""
+    return bool(expected) and given is not None and hmac.compare_digest(expected.encode(), given.encode())
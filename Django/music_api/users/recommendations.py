@@ -0,0 +1,136 @@
+import heapq
+import math
+import threading
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import MusicPreference
+
+# Recomendaciones a partir de las preferencias guardadas - igual que en FastAPI
+# Cada usuario es un vector disperso binario: el conjunto de (type, spotify_id) que
+# ha guardado. El índice invertido (item -> usuarios) permite encontrar los usuarios
+# que comparten algún item sin comparar con todos, así que una consulta cuesta lo que
+# suman los usuarios de los items de esa persona y no O(usuarios²).
+# La similitud es el coseno entre vectores binarios: comunes / sqrt(|A| * |B|).
+# Los items guardados por muchísimos usuarios aportan poca información y disparan
+# el coste, por eso se ignoran al buscar vecinos a partir de max_item_users.
+#
+# El índice vive en memoria de cada proceso: se carga de la base de datos la primera
+# vez que se usa y después se actualiza desde signals.py y bulk.py cuando se confirma
+# la transacción, para no indexar preferencias que acaban en rollback.
+
+
+class RecommendationIndex:
+    def __init__(self, max_item_users: int = 1000):
+        self.max_item_users = max_item_users
+        self.user_items = defaultdict(set)  # user_id -> {(type, spotify_id)}
+        self.item_users = defaultdict(set)  # (type, spotify_id) -> {user_id}
+        self.item_names = {}
+
+    def add(self, user_id: int, type: str, spotify_id: str, name: str = None):
+        item = (type, spotify_id)
+        self.user_items[user_id].add(item)
+        self.item_users[item].add(user_id)
+        if name is not None:
+            self.item_names[item] = name
+
+    def remove(self, user_id: int, type: str, spotify_id: str):
+        item = (type, spotify_id)
+        self._discard(self.user_items, user_id, item)
+        self._discard(self.item_users, item, user_id)
+        if item not in self.item_users:
+            self.item_names.pop(item, None)
+
+    def remove_user(self, user_id: int):
+        for type, spotify_id in list(self.user_items.get(user_id, ())):
+            self.remove(user_id, type, spotify_id)
+
+    @staticmethod
+    def _discard(index, key, value):
+        values = index.get(key)
+        if values is not None:
+            values.discard(value)
+            if not values:
+                del index[key]
+
+    def _overlaps(self, user_id):
+        overlaps = defaultdict(int)
+        for item in self.user_items.get(user_id, ()):
+            users = self.item_users[item]
+            if len(users) > self.max_item_users:
+                continue
+            for other in users:
+                overlaps[other] += 1
+        overlaps.pop(user_id, None)
+        return overlaps
+
+    def similar_users(self, user_id: int, limit: int = 10):
+        """Los `limit` usuarios más parecidos, como lista de (user_id, similitud)"""
+        size = len(self.user_items.get(user_id, ()))
+        if not size:
+            return []
+        scores = (
+            (other, common / math.sqrt(size * len(self.user_items[other])))
+            for other, common in self._overlaps(user_id).items()
+        )
+        return heapq.nlargest(limit, scores, key=lambda pair: (pair[1], -pair[0]))
+
+    def recommend(self, user_id: int, limit: int = 10, neighbours: int = 50):
+        """Items que tienen los usuarios parecidos y este usuario aún no,
+        puntuados por la suma de similitudes. Lista de (type, spotify_id, name, score)"""
+        own = self.user_items.get(user_id, set())
+        scores = defaultdict(float)
+        for other, similarity in self.similar_users(user_id, neighbours):
+            for item in self.user_items[other]:
+                if item not in own:
+                    scores[item] += similarity
+
+        # A igual puntuación, orden por item para que el resultado sea estable
+        best = heapq.nsmallest(limit, scores.items(), key=lambda pair: (-pair[1], pair[0]))
+        return [(type, spotify_id, self.item_names.get((type, spotify_id)), score)
+                for (type, spotify_id), score in best]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = RecommendationIndex()
+                rows = MusicPreference.objects.values_list('user_id', 'type', 'spotify_id', 'name')
+                for user_id, type, spotify_id, name in rows.iterator(chunk_size=5000):
+                    index.add(user_id, type, spotify_id, name)
+                _index = index
+    return _index
+
+
+def reset_index():
+    global _index
+    _index = None
+
+
+def on_preferences_added(preferences):
+    items = [(pref.user_id, pref.type, pref.spotify_id, pref.name) for pref in preferences]
+
+    def apply():
+        # Si aún no se ha cargado, ya las leerá de la base de datos al cargarse
+        if _index is not None:
+            for item in items:
+                _index.add(*item)
+
+    transaction.on_commit(apply)
+
+
+def on_preference_removed(preference):
+    item = (preference.user_id, preference.type, preference.spotify_id)
+
+    def apply():
+        if _index is not None:
+            _index.remove(*item)
+
+    transaction.on_commit(apply)
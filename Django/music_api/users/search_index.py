@@ -0,0 +1,159 @@
+import math
+import threading
+import unicodedata
+from collections import defaultdict
+
+from django.db import transaction
+
+from .models import MusicPreference
+
+# Índice local de búsqueda por nombre de canción o artista - igual que en FastAPI
+# Se alimenta con los nombres de las preferencias guardadas y con los resultados
+# que ya se han pedido a Spotify, para responder sin salir del proceso.
+# Cada nombre se normaliza (minúsculas, sin acentos) y se parte en trigramas con
+# un espacio delante y detrás de cada palabra: "bohemia" -> " bo", "boh", ..., "ia ".
+# En la consulta la última palabra no lleva espacio detrás, porque el usuario
+# aún la está escribiendo, así "boh" encuentra "bohemia" (typeahead).
+# La puntuación combina qué parte de la consulta aparece en el nombre (tolera
+# erratas), la similitud de Jaccard (a igualdad, nombres más cortos) y un extra
+# si el nombre empieza por la consulta. Va de 0 a 1.
+#
+# Vive en memoria de cada proceso: se carga de la base de datos la primera vez que
+# se usa y se actualiza desde signals.py y bulk.py al confirmarse cada transacción.
+
+MIN_COVERAGE = 0.5
+
+
+def normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join("".join(char if char.isalnum() else " " for char in text).split())
+
+
+def trigrams(text: str, typeahead: bool = False) -> set:
+    grams = set()
+    words = text.split()
+    for n, word in enumerate(words):
+        last = typeahead and n == len(words) - 1
+        padded = f" {word}" if last else f" {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class SearchIndex:
+    def __init__(self):
+        self.documents = {}             # (type, spotify_id) -> datos del item
+        self.normalized = {}            # (type, spotify_id) -> nombre normalizado
+        self.grams = {}                 # (type, spotify_id) -> trigramas
+        self.postings = defaultdict(set)  # trigrama -> {(type, spotify_id)}
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, type: str, spotify_id: str, name: str, **extra):
+        key = (type, spotify_id)
+        if key in self.documents:
+            self.documents[key].update(extra)
+            if self.documents[key]["name"] == name:
+                return
+            self.remove(type, spotify_id)
+
+        text = normalize(name)
+        grams = trigrams(text)
+        self.documents[key] = {"spotify_id": spotify_id, "name": name, "type": type, **extra}
+        self.normalized[key] = text
+        self.grams[key] = grams
+        for gram in grams:
+            self.postings[gram].add(key)
+
+    def remove(self, type: str, spotify_id: str):
+        key = (type, spotify_id)
+        if self.documents.pop(key, None) is None:
+            return
+        del self.normalized[key]
+        for gram in self.grams.pop(key):
+            keys = self.postings[gram]
+            keys.discard(key)
+            if not keys:
+                del self.postings[gram]
+
+    def search(self, query: str, type: str = None, limit: int = 10):
+        """Lista de (datos del item, puntuación), mejores primero"""
+        text = normalize(query)
+        query_grams = trigrams(text, typeahead=True)
+        if not query_grams:
+            return []
+
+        # Un nombre necesita al menos `needed` trigramas de la consulta, así que tiene
+        # que estar en alguna de las len - needed + 1 listas más cortas: los candidatos
+        # salen solo de esas y el resto se comprueba con búsquedas en conjuntos
+        postings = sorted((self.postings.get(gram, set()) for gram in query_grams), key=len)
+        needed = math.ceil(MIN_COVERAGE * len(postings))
+        candidates = set().union(*postings[:len(postings) - needed + 1])
+
+        results = []
+        for key in candidates:
+            if type is not None and key[0] != type:
+                continue
+            common = sum(1 for keys in postings if key in keys)
+            coverage = common / len(query_grams)
+            if coverage < MIN_COVERAGE:
+                continue
+            jaccard = common / (len(query_grams) + len(self.grams[key]) - common)
+            prefix = 1 if self.normalized[key].startswith(text) else 0
+            score = 0.7 * coverage + 0.2 * jaccard + 0.1 * prefix
+            results.append((self.documents[key], score))
+
+        results.sort(key=lambda pair: (-pair[1], pair[0]["name"]))
+        return results[:limit]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                index = SearchIndex()
+                rows = MusicPreference.objects.values_list('type', 'spotify_id', 'name').distinct()
+                for type, spotify_id, name in rows.iterator(chunk_size=5000):
+                    index.add(type, spotify_id, name)
+                _index = index
+    return _index
+
+
+def reset_index():
+    global _index
+    _index = None
+
+
+def add_results(type, items):
+    """Guardar en el índice resultados ya simplificados de Spotify"""
+    if _index is not None:
+        for item in items:
+            _index.add(type, **item)
+
+
+def on_preferences_added(preferences):
+    items = [(pref.type, pref.spotify_id, pref.name) for pref in preferences]
+
+    def apply():
+        if _index is not None:
+            for item in items:
+                _index.add(*item)
+
+    transaction.on_commit(apply)
+
+
+def on_preference_removed(preference):
+    """Quitar el item del índice si ya no lo guarda ningún usuario"""
+    type, spotify_id = preference.type, preference.spotify_id
+
+    def apply():
+        if _index is not None and not MusicPreference.objects.filter(type=type, spotify_id=spotify_id).exists():
+            _index.remove(type, spotify_id)
+
+    transaction.on_commit(apply)
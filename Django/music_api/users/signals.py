@@ -0,0 +1,34 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import counters, recommendations, search_index
+from .cache import invalidate_on_commit
+from .models import Usuario, MusicPreference
+
+# Invalidar la caché de respuestas cuando cambian los datos, al confirmar la transacción (ver cache.py)
+# bulk_create no envía señales, por eso bulk.py hace lo mismo a mano para cada lote
+
+
+@receiver([post_save, post_delete], sender=Usuario)
+def usuario_changed(sender, instance, **kwargs):
+    invalidate_on_commit('users', 'preferences', f'user:{instance.pk}')
+
+
+@receiver([post_save, post_delete], sender=MusicPreference)
+def preference_changed(sender, instance, **kwargs):
+    invalidate_on_commit('preferences', f'user:{instance.user_id}')
+
+
+@receiver(post_save, sender=MusicPreference)
+def preference_created(sender, instance, created, **kwargs):
+    if created:
+        counters.increment([instance])
+        recommendations.on_preferences_added([instance])
+        search_index.on_preferences_added([instance])
+
+
+@receiver(post_delete, sender=MusicPreference)
+def preference_deleted(sender, instance, **kwargs):
+    counters.decrement(instance)
+    recommendations.on_preference_removed(instance)
+    search_index.on_preference_removed(instance)
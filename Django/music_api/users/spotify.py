@@ -0,0 +1,138 @@
+import asyncio
+import base64
+import time
+import weakref
+
+from django.conf import settings
+
+from .spotify_cache import get_cache, search_key
+
+# Cliente asíncrono de Spotify para las views de búsqueda
+# Se reutiliza un httpx.AsyncClient (pool de conexiones keep-alive) por event loop
+# y el token se guarda en caché hasta poco antes de caducar, compartido por todas
+# las peticiones del proceso. Así una búsqueda es una sola llamada HTTP y no dos.
+# httpx se importa en la primera búsqueda y no al arrancar (ver bench_startup).
+
+# Rutas de Spotify; los hosts salen de settings (SPOTIFY_ACCOUNTS_URL y SPOTIFY_API_URL)
+TOKEN_PATH = "/api/token"
+SEARCH_PATH = "/v1/search"
+
+# Margen para renovar el token antes de que Spotify lo dé por caducado
+TOKEN_EXPIRY_MARGIN = 60
+
+_token = {"access_token": None, "expires_at": 0.0}
+
+# Bajo ASGI hay un único event loop; bajo WSGI Django crea uno por petición
+# para las views async, por eso cliente y lock se guardan por loop
+_clients = weakref.WeakKeyDictionary()
+_locks = weakref.WeakKeyDictionary()
+
+
+def _credentials_header():
+    client_id = settings.SPOTIFY_CLIENT_ID
+    client_secret = settings.SPOTIFY_CLIENT_SECRET
+    if not client_id or not client_secret:
+        return None
+    client_credentials = f"{client_id}:{client_secret}"
+    return "Basic " + base64.b64encode(client_credentials.encode()).decode()
+
+
+def cached_token():
+    if _token["access_token"] and time.monotonic() < _token["expires_at"]:
+        return _token["access_token"]
+    return None
+
+
+def store_token(token_data):
+    _token["access_token"] = token_data["access_token"]
+    _token["expires_at"] = time.monotonic() + token_data.get("expires_in", 3600) - TOKEN_EXPIRY_MARGIN
+    return _token["access_token"]
+
+
+def get_client():
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = httpx.AsyncClient(
+            timeout=getattr(settings, "SPOTIFY_TIMEOUT", 10),
+            limits=httpx.Limits(
+                max_connections=getattr(settings, "SPOTIFY_MAX_CONNECTIONS", 100),
+                max_keepalive_connections=20,
+            ),
+        )
+        _clients[loop] = client
+    return client
+
+
+def _get_lock():
+    loop = asyncio.get_running_loop()
+    lock = _locks.get(loop)
+    if lock is None:
+        lock = asyncio.Lock()
+        _locks[loop] = lock
+    return lock
+
+
+async def get_token_async():
+    """Obtener token de Spotify, pidiéndolo solo si no hay uno válido en caché"""
+    token = cached_token()
+    if token:
+        return token
+
+    authorization = _credentials_header()
+    if not authorization:
+        return None
+    import httpx
+
+    # Si llegan muchas búsquedas a la vez con el token caducado, solo una lo renueva
+    async with _get_lock():
+        token = cached_token()
+        if token:
+            return token
+        try:
+            response = await get_client().post(
+                settings.SPOTIFY_ACCOUNTS_URL + TOKEN_PATH,
+                headers={"Authorization": authorization},
+                data={"grant_type": "client_credentials"},
+            )
+        except httpx.HTTPError:
+            return None
+        if response.status_code != 200:
+            return None
+        return store_token(response.json())
+
+
+async def search_async(query, search_type="track", limit=10):
+    """Buscar en Spotify sin bloquear el event loop. Devuelve None si hay error"""
+    cache = get_cache()
+    key = search_key(query, search_type, limit)
+    if cache is not None:
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not None:
+            return cached
+
+    token = await get_token_async()
+    if not token:
+        return None
+    import httpx
+
+    try:
+        response = await get_client().get(
+            settings.SPOTIFY_API_URL + SEARCH_PATH,
+            headers={"Authorization": f"Bearer {token}"},
+            params={"q": query, "type": search_type, "limit": limit},
+        )
+    except httpx.HTTPError:
+        return None
+
+    if response.status_code == 401:
+        # Token revocado antes de tiempo: se descarta para que la siguiente búsqueda pida otro
+        _token["access_token"] = None
+    if response.status_code != 200:
+        return None
+    results = response.json()
+    if cache is not None:
+        await asyncio.to_thread(cache.set, key, results)
+    return results
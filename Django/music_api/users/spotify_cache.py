@@ -0,0 +1,155 @@
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+from django.conf import settings
+
+# Caché en disco de las respuestas de Spotify, compartida entre procesos
+# Mismo formato que en la API de FastAPI (API-REST/music_api/spotify_cache.py):
+# si las dos apuntan al mismo fichero, lo que busca una lo aprovecha la otra.
+# Es un fichero SQLite en modo WAL: varios workers de gunicorn/uvicorn leen y
+# escriben a la vez y lo guardado sobrevive a los reinicios. Cada respuesta se
+# guarda como JSON compacto comprimido con zlib, con fecha de caducidad (TTL).
+# El tamaño total lo mantienen unos triggers, y al pasar de max_bytes se borran
+# las entradas usadas hace más tiempo.
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_entries_accessed ON entries(accessed_at);
+
+CREATE TABLE IF NOT EXISTS stats (id INTEGER PRIMARY KEY CHECK (id = 1), total_size INTEGER NOT NULL);
+INSERT OR IGNORE INTO stats (id, total_size) VALUES (1, 0);
+
+CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+    UPDATE stats SET total_size = total_size + NEW.size WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+    UPDATE stats SET total_size = total_size - OLD.size WHERE id = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries BEGIN
+    UPDATE stats SET total_size = total_size - OLD.size + NEW.size WHERE id = 1;
+END;
+"""
+
+# Leer no escribe la fecha de uso en cada acierto, solo si ha pasado este tiempo
+ACCESS_RESOLUTION = 60
+# Al pasar del límite se libera hasta quedar en este porcentaje
+EVICTION_TARGET = 0.9
+
+
+def encode(value) -> bytes:
+    return zlib.compress(json.dumps(value, separators=(",", ":")).encode(), 6)
+
+
+def decode(data: bytes):
+    return json.loads(zlib.decompress(data))
+
+
+class DiskCache:
+    def __init__(self, path: str, max_bytes: int = 100 * 1024 * 1024, default_ttl: int = 86400):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.local = threading.local()
+        self._connection().executescript(SCHEMA)
+
+    def _connection(self):
+        # Una conexión por hilo, sqlite3 no permite compartirlas entre hilos a la vez
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def get(self, key: str):
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, expires_at, accessed_at FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        value, expires_at, accessed_at = row
+        if expires_at <= now:
+            conn.execute("DELETE FROM entries WHERE key = ? AND expires_at <= ?", (key, now))
+            return None
+        if now - accessed_at > ACCESS_RESOLUTION:
+            conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        return decode(value)
+
+    def set(self, key: str, value, ttl: int = None):
+        data = encode(value)
+        now = time.time()
+        expires_at = now + (self.default_ttl if ttl is None else ttl)
+        conn = self._connection()
+        conn.execute(
+            "INSERT INTO entries (key, value, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+            "expires_at = excluded.expires_at, accessed_at = excluded.accessed_at",
+            (key, data, len(data), expires_at, now),
+        )
+        if self.total_size() > self.max_bytes:
+            self.evict()
+
+    def total_size(self) -> int:
+        return self._connection().execute("SELECT total_size FROM stats WHERE id = 1").fetchone()[0]
+
+    def evict(self):
+        """Borrar las entradas caducadas y después las menos usadas hasta bajar del límite"""
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+            excess = self.total_size() - int(self.max_bytes * EVICTION_TARGET)
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM entries WHERE key IN ("
+                    "  SELECT key FROM ("
+                    "    SELECT key, size, SUM(size) OVER (ORDER BY accessed_at, key) AS freed FROM entries"
+                    "  ) WHERE freed - size < ?"
+                    ")",
+                    (excess,),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def clear(self):
+        self._connection().execute("DELETE FROM entries")
+
+
+def search_key(query: str, search_type: str, limit: int) -> str:
+    return f"search:{search_type}:{limit}:{' '.join(query.lower().split())}"
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Caché configurada en settings.SPOTIFY_CACHE_PATH, None si está vacía"""
+    global _cache
+    path = str(getattr(settings, "SPOTIFY_CACHE_PATH", "") or "")
+    if not path:
+        return None
+    if _cache is None or _cache.path != path:
+        with _cache_lock:
+            if _cache is None or _cache.path != path:
+                _cache = DiskCache(
+                    path,
+                    max_bytes=settings.SPOTIFY_CACHE_MAX_MB * 1024 * 1024,
+                    default_ttl=settings.SPOTIFY_CACHE_TTL,
+                )
+    return _cache
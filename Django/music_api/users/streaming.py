@@ -0,0 +1,85 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .pagination import parse_fields
+
+# Exportación completa de un listado sin cargarlo en memoria (?stream=json o ?stream=ndjson)
+# El queryset se recorre con iterator() sobre tuplas de values_list, así el ORM
+# va pidiendo filas a la base de datos por bloques y nunca crea instancias del modelo.
+# La respuesta se escribe a trozos, de modo que la memoria usada no depende del tamaño de la tabla.
+# Bajo ASGI Django consume un generador síncrono con sync_to_async(list), es decir, entero
+# antes de enviar nada; por eso allí se entrega un iterador async que avanza trozo a trozo.
+
+STREAM_CHUNK_SIZE = 2000
+STREAM_CONTENT_TYPES = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Mismo encoder que usa DRF, para que fechas y decimales salgan igual que en Response
+encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+
+def iter_encoded(rows, fields, fmt):
+    separator = ',' if fmt == 'json' else '\n'
+    if fmt == 'json':
+        yield '['
+
+    first = True
+    buffer = []
+    for row in rows:
+        buffer.append(encoder.encode(dict(zip(fields, row))))
+        if len(buffer) >= STREAM_CHUNK_SIZE:
+            yield ('' if first else separator) + separator.join(buffer)
+            first = False
+            buffer = []
+    if buffer:
+        yield ('' if first else separator) + separator.join(buffer)
+        first = False
+
+    if fmt == 'json':
+        yield ']'
+    elif not first:
+        yield '\n'
+
+
+async def aiter_chunks(chunks):
+    """Versión async de un generador síncrono: cada trozo se pide en el hilo de la base
+    de datos (thread_sensitive), donde vive la conexión que usa iterator()"""
+    end = object()
+    step = sync_to_async(next, thread_sensitive=True)
+    while True:
+        chunk = await step(chunks, end)
+        if chunk is end:
+            return
+        yield chunk
+
+
+def stream_response(request, queryset, field_map):
+    """Devolver todo el queryset (desde ?cursor=) en streaming, ordenado por id"""
+    fmt = request.GET.get('stream')
+    if fmt not in STREAM_CONTENT_TYPES:
+        return Response({"error": f"stream debe ser uno de: {', '.join(STREAM_CONTENT_TYPES)}"}, status=400)
+
+    try:
+        cursor = int(request.GET.get('cursor', 0))
+        fields = parse_fields(request, field_map)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    lookups = [field_map[field] for field in fields]
+    rows = (
+        queryset.filter(id__gt=cursor)
+        .order_by('id')
+        .values_list(*lookups)
+        .iterator(chunk_size=STREAM_CHUNK_SIZE)
+    )
+    chunks = iter_encoded(rows, fields, fmt)
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        chunks = aiter_chunks(chunks)
+    return StreamingHttpResponse(chunks, content_type=STREAM_CONTENT_TYPES[fmt])
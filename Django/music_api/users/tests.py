@@ -1,3 +1,591 @@
-from django.test import TestCase
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from decimal import Decimal
+from unittest.mock import patch
 
-# Create your tests here.
+import httpx
+from django.conf import settings
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.module_loading import import_string
+from rest_framework.renderers import JSONRenderer
+
+from . import recommendations, renderers, search_index, spotify, spotify_cache, urls
+from .cache import get_cache
+from .models import Usuario, MusicPreference, PreferenceCounter, IdempotencyKey
+
+
+def crear_datos(num_usuarios, prefs_por_usuario=2, inicio=0):
+    for i in range(inicio, inicio + num_usuarios):
+        usuario = Usuario.objects.create(name=f"user{i}", email=f"user{i}@example.com", age=20 + i % 50)
+        for j in range(prefs_por_usuario):
+            MusicPreference.objects.create(user=usuario, spotify_id=f"sp{i}-{j}", name=f"Track {i}-{j}", type="song")
+
+
+class UsersTestCase(TestCase):
+    """La caché de respuestas vive fuera de la base de datos, se vacía entre tests"""
+
+    def setUp(self):
+        get_cache().clear()
+        recommendations.reset_index()
+        search_index.reset_index()
+        super().setUp()
+
+
+class PaginacionTests(UsersTestCase):
+    def setUp(self):
+        super().setUp()
+        crear_datos(5, prefs_por_usuario=1)
+
+    def test_users_list_pagina_por_cursor(self):
+        response = self.client.get('/api/users/', {'limit': 2})
+        self.assertEqual([u['name'] for u in response.json()], ['user0', 'user1'])
+
+        cursor = response['X-Next-Cursor']
+        response = self.client.get('/api/users/', {'limit': 2, 'cursor': cursor})
+        self.assertEqual([u['name'] for u in response.json()], ['user2', 'user3'])
+
+    def test_ultima_pagina_sin_cursor_siguiente(self):
+        response = self.client.get('/api/users/', {'limit': 10})
+        self.assertEqual(len(response.json()), 5)
+        self.assertNotIn('X-Next-Cursor', response)
+
+    def test_fields_proyecta_columnas(self):
+        response = self.client.get('/api/preferences/', {'fields': 'user_name,spotify_id'})
+        self.assertEqual(set(response.json()[0]), {'id', 'user_name', 'spotify_id'})
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.client.get('/api/users/', {'fields': 'password'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/users/', {'limit': 0}).status_code, 400)
+        self.assertEqual(self.client.get('/api/users/', {'cursor': 'abc'}).status_code, 400)
+
+
+class NumeroConsultasTests(UsersTestCase):
+    """Cada view GET de users debe hacer las mismas consultas con 3 filas que con 30
+
+    Recorre users.urls, así que las views nuevas quedan cubiertas sin tocar el test.
+    Las de Spotify se saltan porque llaman a la API externa. Cada URL se pide una
+    vez antes de medir, para no contar cargas únicas por proceso (como el índice
+    de recomendaciones).
+    """
+
+    def contar_consultas(self, url):
+        # Se mide la view, no la caché de respuestas
+        self.client.get(url)
+        get_cache().clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        return response.status_code, len(ctx.captured_queries)
+
+    def urls_get(self):
+        usuario = Usuario.objects.order_by('id').first()
+        for pattern in urls.urlpatterns:
+            if pattern.name.startswith('spotify_'):
+                continue
+            kwargs = {name: usuario.id for name in pattern.pattern.converters}
+            yield reverse(pattern.name, kwargs=kwargs)
+
+    def test_consultas_constantes(self):
+        crear_datos(3)
+        antes = {}
+        for url in self.urls_get():
+            status, consultas = self.contar_consultas(url)
+            if status != 405:
+                antes[url] = consultas
+        self.assertIn('/api/preferences/', antes)
+
+        crear_datos(27, prefs_por_usuario=3, inicio=3)
+        for url, consultas in antes.items():
+            with self.subTest(url=url):
+                self.assertEqual(self.contar_consultas(url)[1], consultas)
+
+    def test_preferencias_de_usuario_una_consulta(self):
+        crear_datos(3)
+        usuario = Usuario.objects.first()
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/users/{usuario.id}/preferences/')
+        self.assertEqual(len(response.json()), 2)
+
+    def test_preferencias_de_usuario_inexistente(self):
+        response = self.client.get('/api/users/999/preferences/')
+        self.assertEqual(response.status_code, 404)
+
+
+class IndicesTests(UsersTestCase):
+    """Comprobar con EXPLAIN que las consultas habituales usan índices y no recorren la tabla"""
+
+    def setUp(self):
+        super().setUp()
+        crear_datos(5)
+
+    def assertUsaIndice(self, queryset, uso):
+        plan = queryset.explain()
+        self.assertIn(uso, plan)
+        self.assertNotRegex(plan, r'(?m)SCAN users_(usuario|musicpreference)$')
+
+    def test_busqueda_por_email(self):
+        self.assertUsaIndice(Usuario.objects.filter(email='user1@example.com'), 'USING INDEX')
+
+    def test_preferencia_por_usuario_y_spotify_id(self):
+        # SQLite guarda la restricción única como un índice automático sobre ambas columnas
+        queryset = MusicPreference.objects.filter(user_id=1, spotify_id='sp1-0')
+        self.assertUsaIndice(queryset, '(user_id=? AND spotify_id=?)')
+
+    def test_ultimas_preferencias(self):
+        self.assertUsaIndice(MusicPreference.objects.order_by('-added_at')[:10], 'pref_added_at_idx')
+
+    def test_email_duplicado(self):
+        response = self.client.post('/api/users/create/', {'name': 'otro', 'email': 'user1@example.com', 'age': 30})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Usuario.objects.filter(email='user1@example.com').count(), 1)
+
+
+class AltaMasivaTests(UsersTestCase):
+    def test_usuarios_json_con_errores_por_fila(self):
+        Usuario.objects.create(name="existente", email="dup@example.com", age=30)
+        filas = [
+            {'name': 'a', 'email': 'a@example.com', 'age': 20},
+            {'name': 'b', 'email': 'dup@example.com', 'age': 21},
+            {'name': 'c', 'email': 'no-es-email', 'age': 22},
+            {'name': 'd', 'email': 'a@example.com', 'age': 23},
+            {'name': 'e', 'email': 'e@example.com'},
+            {'name': 'f', 'email': 'f@example.com', 'age': 25},
+        ]
+        response = self.client.post('/api/users/bulk/?chunk_size=2', filas, content_type='application/json')
+        data = response.json()
+
+        self.assertEqual(data['created'], 2)
+        self.assertEqual([error['row'] for error in data['errors']], [1, 2, 3, 4])
+        self.assertEqual(Usuario.objects.count(), 3)
+
+    def test_preferencias_ndjson(self):
+        usuario = Usuario.objects.create(name="a", email="a@example.com", age=30)
+        cuerpo = "\n".join([
+            f'{{"user_id": {usuario.id}, "spotify_id": "s1", "name": "Uno", "type": "song"}}',
+            f'{{"user_id": {usuario.id}, "spotify_id": "s2", "name": "Dos", "type": "artist"}}',
+            '{"user_id": 999, "spotify_id": "s3", "name": "Tres", "type": "song"}',
+            f'{{"user_id": {usuario.id}, "spotify_id": "s4", "name": "Cuatro", "type": "album"}}',
+            'esto no es json',
+        ])
+        response = self.client.post('/api/preferences/bulk/', cuerpo, content_type='application/x-ndjson')
+        data = response.json()
+
+        self.assertEqual(data['created'], 2)
+        self.assertEqual([error['row'] for error in data['errors']], [2, 3, 4])
+        self.assertEqual(MusicPreference.objects.filter(user=usuario).count(), 2)
+
+    def test_cuerpo_no_valido(self):
+        response = self.client.post('/api/users/bulk/', {'name': 'a'}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post('/api/users/bulk/?chunk_size=0', [], content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class StreamingTests(UsersTestCase):
+    def setUp(self):
+        super().setUp()
+        crear_datos(5)
+
+    def contenido(self, response):
+        return b''.join(response.streaming_content).decode()
+
+    def test_stream_json_igual_que_listado(self):
+        response = self.client.get('/api/preferences/', {'stream': 'json'})
+        self.assertTrue(response.streaming)
+        listado = self.client.get('/api/preferences/').json()
+        self.assertEqual(json.loads(self.contenido(response)), listado)
+
+    def test_stream_ndjson_con_cursor_y_fields(self):
+        ids = list(Usuario.objects.order_by('id').values_list('id', flat=True))
+        response = self.client.get('/api/users/', {'stream': 'ndjson', 'cursor': ids[1], 'fields': 'email'})
+        lineas = self.contenido(response).splitlines()
+        self.assertEqual(json.loads(lineas[0]), {'id': ids[2], 'email': 'user2@example.com'})
+        self.assertEqual(len(lineas), 3)
+
+    def test_stream_vacio(self):
+        MusicPreference.objects.all().delete()
+        response = self.client.get('/api/preferences/', {'stream': 'json'})
+        self.assertEqual(json.loads(self.contenido(response)), [])
+
+    def test_formato_desconocido(self):
+        self.assertEqual(self.client.get('/api/users/', {'stream': 'xml'}).status_code, 400)
+
+    @patch('users.streaming.STREAM_CHUNK_SIZE', 2)
+    async def test_stream_asgi_por_trozos(self):
+        response = await self.async_client.get('/api/users/', {'stream': 'ndjson'})
+        self.assertTrue(response.is_async)
+        trozos = [trozo async for trozo in response.streaming_content]
+        # 5 usuarios de 2 en 2 más el salto de línea final: no llega todo de una vez
+        self.assertEqual(len(trozos), 4)
+        lineas = b''.join(trozos).decode().splitlines()
+        self.assertEqual([json.loads(linea)['name'] for linea in lineas], [f'user{i}' for i in range(5)])
+
+
+@override_settings(SPOTIFY_CLIENT_ID="id", SPOTIFY_CLIENT_SECRET="secret")
+class SpotifyFalsoTestCase(UsersTestCase):
+    """Spotify responde desde un MockTransport y se cuentan las llamadas"""
+
+    def setUp(self):
+        super().setUp()
+        self.llamadas = []
+        spotify._token["access_token"] = None
+
+        def responder(request):
+            self.llamadas.append(request.url.path)
+            if request.url.path == "/api/token":
+                return httpx.Response(200, json={"access_token": "token", "expires_in": 3600})
+            return httpx.Response(200, json={"artists": {"items": [{
+                "id": "a1", "name": "Artista", "genres": ["rock"],
+                "followers": {"total": 10}, "external_urls": {"spotify": "https://x"},
+            }]}})
+
+        self.transport = httpx.MockTransport(responder)
+
+    def get_client(self):
+        return httpx.AsyncClient(transport=self.transport)
+
+
+@override_settings(SPOTIFY_CACHE_PATH="")
+class SpotifyAsyncTests(SpotifyFalsoTestCase):
+    async def test_busqueda_reutiliza_token(self):
+        with patch.object(spotify, "get_client", self.get_client):
+            for _ in range(3):
+                response = await self.async_client.get('/api/spotify/search/artists/', {'q': 'rock'})
+                self.assertEqual(response.json()['artists'][0]['spotify_id'], 'a1')
+        self.assertEqual(self.llamadas.count("/api/token"), 1)
+        self.assertEqual(self.llamadas.count("/v1/search"), 3)
+
+    async def test_busqueda_local_antes_que_spotify(self):
+        usuario = await Usuario.objects.acreate(name="a", email="a@example.com", age=30)
+        await MusicPreference.objects.acreate(user=usuario, spotify_id="s1", name="Bohemian Rhapsody", type="song")
+
+        with patch.object(spotify, "get_client", self.get_client):
+            local = await self.async_client.get('/api/search/', {'q': 'bohem'})
+            self.assertEqual(local.json()['source'], 'local')
+            self.assertEqual(local.json()['results'][0]['spotify_id'], 's1')
+
+            remoto = await self.async_client.get('/api/search/', {'q': 'artis', 'type': 'artist'})
+            self.assertEqual(remoto.json()['source'], 'spotify')
+            # Lo que devuelve Spotify queda en el índice para la siguiente búsqueda
+            cache = await self.async_client.get('/api/search/', {'q': 'artista', 'type': 'artist'})
+            self.assertEqual(cache.json()['source'], 'local')
+        self.assertEqual(self.llamadas.count("/v1/search"), 1)
+
+    async def test_falta_query(self):
+        response = await self.async_client.get('/api/spotify/search/tracks/')
+        self.assertEqual(response.status_code, 400)
+
+    async def test_prueba_de_conexion_usa_el_mismo_token(self):
+        with patch.object(spotify, "get_client", self.get_client):
+            prueba = await self.async_client.get('/api/spotify/test/')
+            await self.async_client.get('/api/spotify/search/artists/', {'q': 'rock'})
+        self.assertEqual(prueba.json()['status'], 'success')
+        self.assertEqual(self.llamadas, ["/api/token", "/v1/search"])
+
+
+class CacheSpotifyDiscoTests(SpotifyFalsoTestCase):
+    """Las búsquedas a Spotify se guardan en un fichero SQLite compartido entre procesos"""
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = f"{tmp.name}/spotify_cache.sqlite3"
+        settings = override_settings(SPOTIFY_CACHE_PATH=self.path)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    async def test_busqueda_repetida_no_llama_a_spotify(self):
+        with patch.object(spotify, "get_client", self.get_client):
+            for _ in range(3):
+                response = await self.async_client.get('/api/spotify/search/artists/', {'q': 'Rock'})
+                self.assertEqual(response.json()['artists'][0]['spotify_id'], 'a1')
+            # Otra forma de escribir la misma búsqueda usa la misma entrada
+            await self.async_client.get('/api/spotify/search/artists/', {'q': ' rock '})
+        self.assertEqual(self.llamadas.count("/v1/search"), 1)
+
+    def test_compartida_entre_instancias(self):
+        # Otro proceso abre el mismo fichero con su propia instancia
+        otra = spotify_cache.DiskCache(self.path)
+        otra.set(spotify_cache.search_key("rock", "artist", 10), {"artists": {"items": []}})
+        self.assertEqual(
+            spotify_cache.get_cache().get(spotify_cache.search_key("rock", "artist", 10)),
+            {"artists": {"items": []}},
+        )
+
+    def test_caducidad_y_limite_de_tamano(self):
+        cache = spotify_cache.DiskCache(self.path, max_bytes=20_000)
+        cache.set("caducada", {"a": 1}, ttl=0)
+        self.assertIsNone(cache.get("caducada"))
+
+        for i in range(500):
+            cache.set(f"k{i}", {"n": i, "texto": os.urandom(100).hex()})
+        self.assertLessEqual(cache.total_size(), 20_000)
+        # Se borran primero las más antiguas, las últimas siguen
+        self.assertIsNone(cache.get("k0"))
+        self.assertEqual(cache.get("k499")["n"], 499)
+
+
+class CacheRespuestasTests(UsersTestCase):
+    def setUp(self):
+        super().setUp()
+        crear_datos(2)
+        self.usuario_a, self.usuario_b = Usuario.objects.order_by('id')
+
+    def test_segunda_peticion_sin_consultas(self):
+        primera = self.client.get('/api/users/')
+        with self.assertNumQueries(0):
+            segunda = self.client.get('/api/users/')
+        self.assertEqual(primera.content, segunda.content)
+        self.assertEqual(primera['ETag'], segunda['ETag'])
+
+    def test_if_none_match(self):
+        etag = self.client.get('/api/preferences/')['ETag']
+        response = self.client.get('/api/preferences/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+    def test_invalidacion_por_usuario(self):
+        url_a = f'/api/users/{self.usuario_a.id}/preferences/'
+        url_b = f'/api/users/{self.usuario_b.id}/preferences/'
+        self.client.get(url_a)
+        self.client.get(url_b)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            MusicPreference.objects.create(user=self.usuario_a, spotify_id="nuevo", name="Nuevo", type="song")
+
+        self.assertEqual(len(self.client.get(url_a).json()), 3)
+        with self.assertNumQueries(0):
+            self.client.get(url_b)
+
+    def test_alta_masiva_invalida(self):
+        self.assertEqual(len(self.client.get('/api/users/').json()), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/users/bulk/', [{'name': 'c', 'email': 'c@example.com', 'age': 3}],
+                             content_type='application/json')
+        self.assertEqual(len(self.client.get('/api/users/').json()), 3)
+
+    def test_invalidacion_al_confirmar(self):
+        self.client.get('/api/users/')
+        with self.captureOnCommitCallbacks() as callbacks:
+            Usuario.objects.create(name='c', email='c@example.com', age=3)
+            # Hasta el commit otra petición podría leer las filas viejas: no se invalida aún
+            with self.assertNumQueries(0):
+                self.client.get('/api/users/')
+        self.assertEqual(len(callbacks), 1)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(len(self.client.get('/api/users/').json()), 3)
+
+
+class RankingTests(UsersTestCase):
+    def setUp(self):
+        super().setUp()
+        crear_datos(3, prefs_por_usuario=0)
+        self.usuarios = list(Usuario.objects.order_by('id'))
+        for n, usuario in enumerate(self.usuarios):
+            for j in range(n + 1):
+                MusicPreference.objects.create(user=usuario, spotify_id=f"top{j}", name=f"Top {j}", type="song")
+
+    def ranking(self, **params):
+        return [(item['spotify_id'], item['count']) for item in self.client.get('/api/leaderboard/', params).json()['items']]
+
+    def test_ranking_desde_contadores(self):
+        self.assertEqual(self.ranking(limit=2), [('top0', 3), ('top1', 2)])
+        with self.assertNumQueries(1):
+            self.client.get('/api/leaderboard/')
+
+    def test_bajas_restan(self):
+        MusicPreference.objects.filter(spotify_id='top0').first().delete()
+        self.usuarios[2].delete()
+        self.assertEqual(self.ranking(), [('top0', 1), ('top1', 1)])
+        self.assertEqual(PreferenceCounter.objects.count(), 2)
+
+    def test_alta_masiva_suma(self):
+        filas = [{'user_id': self.usuarios[0].id, 'spotify_id': 'art', 'name': 'Artista', 'type': 'artist'}]
+        self.client.post('/api/preferences/bulk/', filas, content_type='application/json')
+        self.assertEqual(self.ranking(type='artist'), [('art', 1)])
+
+
+class RecomendacionesTests(UsersTestCase):
+    def setUp(self):
+        super().setUp()
+        crear_datos(4, prefs_por_usuario=0)
+        self.u1, self.u2, self.u3, self.u4 = Usuario.objects.order_by('id')
+        for usuario, items in ((self.u1, "abc"), (self.u2, "abd"), (self.u3, "ae"), (self.u4, "z")):
+            for item in items:
+                MusicPreference.objects.create(user=usuario, spotify_id=item, name=item.upper(), type="song")
+
+    def test_usuarios_parecidos(self):
+        data = self.client.get(f'/api/users/{self.u1.id}/similar/').json()
+        self.assertEqual([u['user_id'] for u in data['similar_users']], [self.u2.id, self.u3.id])
+
+    def test_recomendaciones_y_actualizacion_incremental(self):
+        url = f'/api/users/{self.u1.id}/recommendations/'
+        self.assertEqual([r['spotify_id'] for r in self.client.get(url).json()['recommendations']], ['d', 'e'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            MusicPreference.objects.create(user=self.u3, spotify_id="f", name="F", type="song")
+            MusicPreference.objects.filter(user=self.u2, spotify_id="d").delete()
+        self.assertEqual([r['spotify_id'] for r in self.client.get(url).json()['recommendations']], ['e', 'f'])
+
+    def test_usuario_inexistente(self):
+        self.assertEqual(self.client.get('/api/users/999/recommendations/').status_code, 404)
+
+    def test_busqueda_local_al_borrar(self):
+        def buscables():
+            return [item['spotify_id'] for item, _ in search_index.get_index().search('bohemian', 'song')]
+
+        self.assertEqual(buscables(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            for usuario in (self.u1, self.u2):
+                MusicPreference.objects.create(user=usuario, spotify_id="bo", name="Bohemian Rhapsody", type="song")
+        self.assertEqual(buscables(), ['bo'])
+        # Mientras otro usuario la siga guardando sigue en el índice
+        with self.captureOnCommitCallbacks(execute=True):
+            MusicPreference.objects.filter(user=self.u1, spotify_id="bo").delete()
+        self.assertEqual(buscables(), ['bo'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.u2.delete()
+        self.assertEqual(buscables(), [])
+
+
+class RendererJSONTests(UsersTestCase):
+    def setUp(self):
+        super().setUp()
+        if renderers.orjson is None:
+            self.skipTest("orjson no está instalado")
+        crear_datos(3)
+
+    def test_misma_salida_que_el_renderer_de_drf(self):
+        data = {
+            'results': list(MusicPreference.objects.values('id', 'user__name', 'added_at')),
+            'total': Decimal('1.5'),
+        }
+        rapido = renderers.ORJSONRenderer().render(data)
+        drf = JSONRenderer().render(data)
+        self.assertEqual(json.loads(rapido), json.loads(drf))
+
+    def test_renderer_por_defecto(self):
+        # orjson salvo que se fuerce el de DRF con DJANGO_JSON_RENDERER=json
+        response = self.client.get('/api/hello/')
+        self.assertIsInstance(response.accepted_renderer, import_string(settings.JSON_RENDERER))
+
+        # Los listados cacheados guardan el cuerpo ya renderizado con orjson
+        response = self.client.get('/api/preferences/')
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertTrue(response.json()[0]['added_at'].endswith('Z'))
+
+
+class IdempotenciaTests(UsersTestCase):
+    datos = {'name': 'ana', 'email': 'ana@example.com', 'age': 30}
+
+    def alta(self, datos=None, clave='clave-1'):
+        return self.client.post('/api/users/create/', datos or self.datos, HTTP_IDEMPOTENCY_KEY=clave)
+
+    def test_reintento_devuelve_la_respuesta_original(self):
+        primera = self.alta()
+        segunda = self.alta()
+        self.assertEqual(primera.status_code, 200)
+        self.assertEqual(segunda.json(), primera.json())
+        self.assertEqual(segunda['Idempotent-Replayed'], 'true')
+        self.assertEqual(Usuario.objects.filter(email='ana@example.com').count(), 1)
+
+    def test_errores_tambien_se_repiten(self):
+        self.assertEqual(self.alta({'name': 'ana'}).status_code, 400)
+        Usuario.objects.create(name='ana', email='ana@example.com', age=30)
+        repetida = self.alta({'name': 'ana'})
+        self.assertEqual(repetida.status_code, 400)
+        self.assertEqual(repetida['Idempotent-Replayed'], 'true')
+
+    def test_misma_clave_con_otro_cuerpo(self):
+        self.alta()
+        response = self.alta({'name': 'otra', 'email': 'otra@example.com', 'age': 40})
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(Usuario.objects.filter(email='otra@example.com').exists())
+
+    def test_sin_clave_no_cambia_nada(self):
+        self.client.post('/api/users/create/', self.datos)
+        self.assertEqual(self.client.post('/api/users/create/', self.datos).status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    @override_settings(IDEMPOTENCY_WAIT=0)
+    def test_original_abandonada_se_vuelve_a_ejecutar(self):
+        # Una entrada sin respuesta de un proceso que murió a medias
+        IdempotencyKey.objects.create(endpoint='users_create', key='clave-1', fingerprint='x')
+        response = self.alta()
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(IdempotencyKey.objects.get().status_code, 200)
+
+    def test_caducidad_y_limite(self):
+        self.alta()
+        with override_settings(IDEMPOTENCY_TTL=0):
+            response = self.alta({'name': 'ana', 'email': 'ana2@example.com', 'age': 30})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['email'], 'ana2@example.com')
+
+        with override_settings(IDEMPOTENCY_MAX_KEYS=2):
+            for i in range(5):
+                self.alta({'name': f'u{i}', 'email': f'u{i}@example.com', 'age': 20}, clave=f'k{i}')
+        self.assertEqual(
+            list(IdempotencyKey.objects.order_by('id').values_list('key', flat=True)), ['k3', 'k4']
+        )
+
+
+def ocupado(parar):
+    while not parar.is_set():
+        sum(range(1000))
+
+
+class PerfilTests(UsersTestCase):
+    def test_sin_token_configurado_no_existe(self):
+        with override_settings(ADMIN_TOKEN=''):
+            self.assertEqual(self.client.get('/api/debug/profile/?seconds=0.01').status_code, 404)
+
+    @override_settings(ADMIN_TOKEN='secreto')
+    def test_token_incorrecto(self):
+        self.assertEqual(self.client.get('/api/debug/profile/?seconds=0.01').status_code, 403)
+        response = self.client.get('/api/debug/profile/?seconds=0.01', HTTP_X_ADMIN_TOKEN='otro')
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(ADMIN_TOKEN='secreto')
+    def test_pilas_colapsadas(self):
+        self.assertEqual(
+            self.client.get('/api/debug/profile/?seconds=120', HTTP_X_ADMIN_TOKEN='secreto').status_code, 400
+        )
+        parar = threading.Event()
+        hilo = threading.Thread(target=ocupado, args=(parar,))
+        hilo.start()
+        try:
+            response = self.client.get('/api/debug/profile/?seconds=0.2', HTTP_X_ADMIN_TOKEN='secreto')
+        finally:
+            parar.set()
+            hilo.join()
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(int(response['X-Profile-Samples']), 0)
+        lineas = response.content.decode().splitlines()
+        # "fichero.py:función;...;fichero.py:función muestras", de más a menos muestras
+        _, muestras = lineas[0].rsplit(' ', 1)
+        self.assertTrue(muestras.isdigit())
+        self.assertTrue(any('tests.py:ocupado' in linea for linea in lineas))
+
+
+class ArranqueTests(TestCase):
+    def test_perfil_api_sin_admin_ni_httpx(self):
+        # En un proceso nuevo: en este ya está importado httpx
+        codigo = (
+            'import sys, django; django.setup(); import music_api.urls; '
+            'print("httpx" in sys.modules, [str(p.pattern) for p in music_api.urls.urlpatterns])'
+        )
+        entorno = dict(os.environ, DJANGO_SETTINGS_MODULE='music_api.settings_api')
+        salida = subprocess.run(
+            [sys.executable, '-c', codigo], cwd=settings.BASE_DIR, env=entorno, capture_output=True, text=True, check=True
+        )
+        self.assertEqual(salida.stdout.strip(), "False ['api/']")
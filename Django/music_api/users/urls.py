@@ -6,11 +6,20 @@ urlpatterns = [
     path('health/', views.health, name='health'),
     path('users/', views.users_list, name='users_list'),
     path('users/create/', views.users_create, name='users_create'),
+    path('users/bulk/', views.users_bulk_create, name='users_bulk_create'),
     path('preferences/', views.preferences_list, name='preferences_list'),
+    path('preferences/bulk/', views.preferences_bulk_create, name='preferences_bulk_create'),
     path('users/<int:user_id>/preferences/', views.user_preferences, name='user_preferences'),
+    path('users/<int:user_id>/similar/', views.similar_users, name='similar_users'),
+    path('users/<int:user_id>/recommendations/', views.user_recommendations, name='user_recommendations'),
+    path('leaderboard/', views.leaderboard, name='leaderboard'),
     
     # Endpoints de Spotify
     path('spotify/test/', views.spotify_test, name='spotify_test'),
     path('spotify/search/tracks/', views.spotify_search_tracks, name='spotify_search_tracks'),
     path('spotify/search/artists/', views.spotify_search_artists, name='spotify_search_artists'),
+    path('search/', views.local_search, name='local_search'),
+
+    # Diagnóstico, protegido con DJANGO_ADMIN_TOKEN
+    path('debug/profile/', views.debug_profile, name='debug_profile'),
 ]
\ No newline at end of file
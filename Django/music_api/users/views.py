@@ -1,65 +1,47 @@
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, JsonResponse
 from django.shortcuts import render
+from django.views.decorators.http import require_GET
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from .models import Usuario, MusicPreference
+from .pagination import keyset_page, keyset_rows
+from .streaming import stream_response
+from .cache import cached_response
+from .idempotency import idempotent
+from .profiler import MAX_SECONDS, SamplingProfiler, check_token, collapsed
+from . import bulk, counters, recommendations, search_index, spotify
 from django.conf import settings
-import requests
-import base64
+from django.db import IntegrityError, transaction
+import asyncio
 
-# ============== FUNCIONES DE SPOTIFY ==============
+# ============== VIEWS EXISTENTES ==============
 
-def get_spotify_token():
-    """Obtener token de Spotify - igual que en FastAPI"""
-    client_id = settings.SPOTIFY_CLIENT_ID
-    client_secret = settings.SPOTIFY_CLIENT_SECRET
-    
-    if not client_id or not client_secret:
-        return None
-    
-    client_credentials = f"{client_id}:{client_secret}"
-    client_credentials_b64 = base64.b64encode(client_credentials.encode()).decode()
-    
-    headers = {
-        "Authorization": f"Basic {client_credentials_b64}",
-        "Content-Type": "application/x-www-form-urlencoded"
-    }
-    
-    data = {"grant_type": "client_credentials"}
-    
-    try:
-        response = requests.post(
-            "https://accounts.spotify.com/api/token",
-            headers=headers,
-            data=data
-        )
-        if response.status_code == 200:
-            return response.json()["access_token"]
-    except:
-        pass
-    return None
-
-def search_spotify(query, search_type="track", limit=10):
-    """Buscar en Spotify - igual que en FastAPI"""
-    token = get_spotify_token()
-    if not token:
-        return None
-    
-    headers = {"Authorization": f"Bearer {token}"}
-    params = {"q": query, "type": search_type, "limit": limit}
-    
-    try:
-        response = requests.get(
-            "https://api.spotify.com/v1/search",
-            headers=headers,
-            params=params
-        )
-        if response.status_code == 200:
-            return response.json()
-    except:
-        pass
-    return None
+# Campos que se pueden pedir en cada listado y su lookup en el ORM
+USER_FIELDS = {
+    'id': 'id',
+    'name': 'name',
+    'email': 'email',
+    'age': 'age',
+}
 
-# ============== VIEWS EXISTENTES ==============
+PREFERENCE_FIELDS = {
+    'id': 'id',
+    'user_id': 'user_id',
+    'user_name': 'user__name',
+    'spotify_id': 'spotify_id',
+    'name': 'name',
+    'type': 'type',
+    'added_at': 'added_at',
+}
+
+USER_PREFERENCE_FIELDS = {
+    'id': 'id',
+    'spotify_id': 'spotify_id',
+    'name': 'name',
+    'type': 'type',
+    'added_at': 'added_at',
+}
 
 @api_view(['GET'])
 def hello(request):
@@ -69,21 +51,16 @@ def hello(request):
 def health(request):
     return Response({"status": "OK", "framework": "Django"})
 
+@cached_response(lambda: 'users')
 @api_view(['GET'])
 def users_list(request):
-    """Listar todos los usuarios"""
-    usuarios = Usuario.objects.all()
-    data = []
-    for usuario in usuarios:
-        data.append({
-            'id': usuario.id,
-            'name': usuario.name,
-            'email': usuario.email,
-            'age': usuario.age
-        })
-    return Response(data)
+    """Listar los usuarios, paginados por cursor o en streaming con ?stream=json|ndjson"""
+    if 'stream' in request.GET:
+        return stream_response(request, Usuario.objects.all(), USER_FIELDS)
+    return keyset_page(request, Usuario.objects.all(), USER_FIELDS)
 
 @api_view(['POST'])
+@idempotent
 def users_create(request):
     """Crear un usuario nuevo"""
     name = request.data.get('name')
@@ -93,11 +70,16 @@ def users_create(request):
     if not all([name, email, age]):
         return Response({"error": "Faltan datos"}, status=400)
     
-    usuario = Usuario.objects.create(
-        name=name,
-        email=email,
-        age=age
-    )
+    # El email es único en la base de datos, no hace falta buscarlo antes
+    try:
+        with transaction.atomic():
+            usuario = Usuario.objects.create(
+                name=name,
+                email=email,
+                age=age
+            )
+    except IntegrityError:
+        return Response({"error": "El email ya existe"}, status=400)
     
     return Response({
         'id': usuario.id,
@@ -106,72 +88,138 @@ def users_create(request):
         'age': usuario.age
     })
 
+@api_view(['POST'])
+def users_bulk_create(request):
+    """Crear usuarios en bloque a partir de un array JSON o NDJSON"""
+    try:
+        chunk_size = bulk.get_chunk_size(request)
+        rows = bulk.iter_rows(request)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    
+    return Response(bulk.bulk_insert(Usuario, rows, bulk.validate_users_chunk, chunk_size))
+
+@cached_response(lambda: 'preferences')
 @api_view(['GET'])
 def preferences_list(request):
-    """Listar todas las preferencias musicales"""
-    preferences = MusicPreference.objects.all()
-    data = []
-    for pref in preferences:
-        data.append({
-            'id': pref.id,
-            'user_id': pref.user.id,
-            'user_name': pref.user.name,
-            'spotify_id': pref.spotify_id,
-            'name': pref.name,
-            'type': pref.type,
-            'added_at': pref.added_at
-        })
-    return Response(data)
+    """Listar las preferencias musicales, paginadas por cursor o en streaming con ?stream=json|ndjson"""
+    if 'stream' in request.GET:
+        return stream_response(request, MusicPreference.objects.all(), PREFERENCE_FIELDS)
+    return keyset_page(request, MusicPreference.objects.all(), PREFERENCE_FIELDS)
 
+@cached_response(lambda user_id: f'user:{user_id}')
 @api_view(['GET'])
 def user_preferences(request, user_id):
     """Obtener preferencias de un usuario específico"""
+    preferences = MusicPreference.objects.filter(user_id=user_id)
     try:
-        usuario = Usuario.objects.get(id=user_id)
-        preferences = MusicPreference.objects.filter(user=usuario)
-        data = []
-        for pref in preferences:
-            data.append({
-                'id': pref.id,
-                'spotify_id': pref.spotify_id,
-                'name': pref.name,
-                'type': pref.type,
-                'added_at': pref.added_at
-            })
-        return Response(data)
-    except Usuario.DoesNotExist:
+        data, headers = keyset_rows(request, preferences, USER_PREFERENCE_FIELDS)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+
+    # Solo si la página sale vacía hace falta comprobar que el usuario existe
+    if not data and not Usuario.objects.filter(id=user_id).exists():
         return Response({"error": "Usuario no encontrado"}, status=404)
+    return Response(data, headers=headers)
 
-# ============== NUEVAS VIEWS DE SPOTIFY ==============
+@api_view(['POST'])
+def preferences_bulk_create(request):
+    """Crear preferencias en bloque a partir de un array JSON o NDJSON"""
+    try:
+        chunk_size = bulk.get_chunk_size(request)
+        rows = bulk.iter_rows(request)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    
+    return Response(bulk.bulk_insert(MusicPreference, rows, bulk.validate_preferences_chunk, chunk_size))
+
+def parse_limit(request, default=10, maximum=100):
+    """Leer ?limit=, lanza ValueError si no es válido"""
+    try:
+        limit = int(request.GET.get('limit', default))
+    except ValueError:
+        raise ValueError("limit debe ser un número entero")
+    if limit < 1 or limit > maximum:
+        raise ValueError(f"limit debe estar entre 1 y {maximum}")
+    return limit
+
+@api_view(['GET'])
+def similar_users(request, user_id):
+    """Usuarios con gustos parecidos"""
+    try:
+        limit = parse_limit(request)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    if not Usuario.objects.filter(id=user_id).exists():
+        return Response({"error": "Usuario no encontrado"}, status=404)
+    
+    similares = recommendations.get_index().similar_users(user_id, limit)
+    return Response({
+        "user_id": user_id,
+        "similar_users": [
+            {"user_id": other_id, "similarity": round(similarity, 4)}
+            for other_id, similarity in similares
+        ]
+    })
 
 @api_view(['GET'])
-def spotify_test(request):
+def user_recommendations(request, user_id):
+    """Canciones y artistas que podrían gustar al usuario"""
+    try:
+        limit = parse_limit(request)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    if not Usuario.objects.filter(id=user_id).exists():
+        return Response({"error": "Usuario no encontrado"}, status=404)
+    
+    recomendaciones = recommendations.get_index().recommend(user_id, limit)
+    return Response({
+        "user_id": user_id,
+        "recommendations": [
+            {"spotify_id": spotify_id, "name": name, "type": type, "score": round(score, 4)}
+            for type, spotify_id, name, score in recomendaciones
+        ]
+    })
+
+@api_view(['GET'])
+def leaderboard(request):
+    """Canciones o artistas guardados por más usuarios (?type=song|artist&limit=10)"""
+    type = request.GET.get('type', 'song')
+    if type not in ('song', 'artist'):
+        return Response({"error": "type debe ser 'song' o 'artist'"}, status=400)
+    try:
+        limit = parse_limit(request)
+    except ValueError as e:
+        return Response({"error": str(e)}, status=400)
+    
+    return Response({"type": type, "items": counters.top(type, limit)})
+
+# ============== NUEVAS VIEWS DE SPOTIFY ==============
+
+# Todas las llamadas a Spotify pasan por spotify.py (token y caché en disco incluidos)
+
+@require_GET
+async def spotify_test(request):
     """Probar conexión con Spotify"""
-    token = get_spotify_token()
+    token = await spotify.get_token_async()
     if token:
-        return Response({
+        return JsonResponse({
             "status": "success",
             "message": "Conexión con Spotify OK",
             "token_preview": token[:20] + "..."
         })
     else:
-        return Response({
+        return JsonResponse({
             "status": "error",
             "message": "No se pudo conectar con Spotify"
         }, status=400)
 
-@api_view(['GET'])
-def spotify_search_tracks(request):
-    """Buscar canciones en Spotify"""
-    query = request.GET.get('q')
-    if not query:
-        return Response({"error": "Falta parámetro 'q'"}, status=400)
-    
-    results = search_spotify(query, "track", 10)
+async def search_tracks(query, limit=10):
+    """Buscar canciones en Spotify y simplificar la respuesta como en FastAPI"""
+    results = await spotify.search_async(query, "track", limit)
     if not results:
-        return Response({"error": "Error conectando con Spotify"}, status=500)
+        return None
     
-    # Simplificar respuesta como en FastAPI
     simplified_tracks = []
     for track in results.get("tracks", {}).get("items", []):
         simplified_track = {
@@ -183,24 +231,15 @@ def spotify_search_tracks(request):
         }
         simplified_tracks.append(simplified_track)
     
-    return Response({
-        "query": query,
-        "total": len(simplified_tracks),
-        "tracks": simplified_tracks
-    })
+    search_index.add_results("song", simplified_tracks)
+    return simplified_tracks
 
-@api_view(['GET'])
-def spotify_search_artists(request):
-    """Buscar artistas en Spotify"""
-    query = request.GET.get('q')
-    if not query:
-        return Response({"error": "Falta parámetro 'q'"}, status=400)
-    
-    results = search_spotify(query, "artist", 10)
+async def search_artists(query, limit=10):
+    """Buscar artistas en Spotify y simplificar la respuesta como en FastAPI"""
+    results = await spotify.search_async(query, "artist", limit)
     if not results:
-        return Response({"error": "Error conectando con Spotify"}, status=500)
+        return None
     
-    # Simplificar respuesta como en FastAPI
     simplified_artists = []
     for artist in results.get("artists", {}).get("items", []):
         simplified_artist = {
@@ -212,8 +251,93 @@ def spotify_search_artists(request):
         }
         simplified_artists.append(simplified_artist)
     
-    return Response({
+    search_index.add_results("artist", simplified_artists)
+    return simplified_artists
+
+# Las búsquedas son views async: servidas con ASGI (uvicorn music_api.asgi:application)
+# no ocupan un hilo mientras esperan a Spotify
+@require_GET
+async def spotify_search_tracks(request):
+    """Buscar canciones en Spotify"""
+    query = request.GET.get('q')
+    if not query:
+        return JsonResponse({"error": "Falta parámetro 'q'"}, status=400)
+    
+    simplified_tracks = await search_tracks(query)
+    if simplified_tracks is None:
+        return JsonResponse({"error": "Error conectando con Spotify"}, status=500)
+    
+    return JsonResponse({
+        "query": query,
+        "total": len(simplified_tracks),
+        "tracks": simplified_tracks
+    })
+
+@require_GET
+async def spotify_search_artists(request):
+    """Buscar artistas en Spotify"""
+    query = request.GET.get('q')
+    if not query:
+        return JsonResponse({"error": "Falta parámetro 'q'"}, status=400)
+    
+    simplified_artists = await search_artists(query)
+    if simplified_artists is None:
+        return JsonResponse({"error": "Error conectando con Spotify"}, status=500)
+    
+    return JsonResponse({
         "query": query,
         "total": len(simplified_artists),
         "artists": simplified_artists
-    })
\ No newline at end of file
+    })
+
+@require_GET
+async def local_search(request):
+    """Buscar primero en el índice local y solo si no hay resultados en Spotify"""
+    query = request.GET.get('q')
+    if not query or len(query.strip()) < 2:
+        return JsonResponse({"error": "La búsqueda debe tener al menos 2 caracteres"}, status=400)
+    type = request.GET.get('type', 'song')
+    if type not in ('song', 'artist'):
+        return JsonResponse({"error": "type debe ser 'song' o 'artist'"}, status=400)
+    try:
+        limit = parse_limit(request, maximum=50)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    
+    index = await sync_to_async(search_index.get_index)()
+    results = [item for item, score in index.search(query, type, limit)]
+    if results:
+        return JsonResponse({"query": query, "source": "local", "total": len(results), "results": results})
+    
+    results = await (search_tracks if type == 'song' else search_artists)(query, limit)
+    if results is None:
+        return JsonResponse({"error": "Error conectando con Spotify"}, status=500)
+    return JsonResponse({"query": query, "source": "spotify", "total": len(results), "results": results})
+
+
+# Perfil por muestreo del worker (ver profiler.py). Solo existe con DJANGO_ADMIN_TOKEN
+# configurado, y hay que mandarlo en la cabecera X-Admin-Token
+profiler = SamplingProfiler()
+
+@require_GET
+async def debug_profile(request):
+    """Muestrear ?seconds= segundos y devolver las pilas colapsadas en texto"""
+    if not settings.ADMIN_TOKEN:
+        return JsonResponse({"error": "No encontrado"}, status=404)
+    if not check_token(settings.ADMIN_TOKEN, request.headers.get('X-Admin-Token')):
+        return JsonResponse({"error": "Token de administración incorrecto"}, status=403)
+    try:
+        seconds = float(request.GET.get('seconds', 5))
+        interval = float(request.GET.get('interval', 0.005))
+    except ValueError:
+        return JsonResponse({"error": "seconds e interval deben ser números"}, status=400)
+    if not 0 < seconds <= MAX_SECONDS or not 0.001 <= interval <= 1:
+        return JsonResponse({"error": f"seconds debe estar entre 0 y {MAX_SECONDS}, interval entre 0.001 y 1"}, status=400)
+    idle = request.GET.get('idle') in ('1', 'true')
+    try:
+        stacks, samples = await asyncio.to_thread(profiler.sample, seconds, interval, idle)
+    except RuntimeError as e:
+        return JsonResponse({"error": str(e)}, status=409)
+    response = HttpResponse(collapsed(stacks), content_type='text/plain; charset=utf-8')
+    response['X-Profile-Samples'] = str(samples)
+    return response
@@ -0,0 +1,283 @@
+import asyncio
+import functools
+import json
+import os
+import time
+
+from estructuras import Almacen
+
+
+# Modo escalado: varios workers de uvicorn con el mismo estado
+# Un único proceso escritor (python almacen.py) tiene el Almacen de verdad. Los workers
+# le mandan las escrituras por IPC (multiprocessing.managers) y el escritor las aplica
+# de una en una y las añade como una línea JSON al log (PEDIDOS_LOG).
+# Cada worker tiene una réplica en memoria que va leyendo el log y aplicando los eventos,
+# así las lecturas no salen del proceso y se reparten entre todos los núcleos.
+# Al reiniciar, el escritor y las réplicas reconstruyen el estado con la última
+# instantánea (PEDIDOS_LOG + ".estado") y los eventos del log posteriores a ella.
+#
+# Compactación: cada PEDIDOS_LOG_COMPACTAR eventos el escritor guarda el estado entero
+# en la instantánea y empieza un log vacío (lo cambia por el anterior con os.replace).
+# Las réplicas tienen el log abierto: terminan de leer el anterior y pasan al nuevo.
+# Una réplica que se queda atrás más de una compactación entera carga la instantánea.
+#
+# Arranque: primero el escritor (ver al final del fichero) y después los workers con
+# `uvicorn main:app --workers N`, o N procesos uvicorn detrás de un balanceador, con
+# las mismas variables de entorno.
+#
+# Variables de entorno:
+#   PEDIDOS_ALMACEN        dirección del escritor, "host:puerto" (activa el modo escalado)
+#   PEDIDOS_ALMACEN_CLAVE  clave compartida para la conexión (obligatoria), por ejemplo
+#                          python -c "import secrets; print(secrets.token_hex(32))"
+#   PEDIDOS_LOG            fichero de eventos (por defecto pedidos.log)
+#   PEDIDOS_LOG_COMPACTAR  eventos en el log antes de compactarlo (por defecto 10000, 0 nunca)
+
+ESCRITURAS = (
+    "crear_producto", "actualizar_producto", "actualizar_productos", "eliminar_producto",
+    "crear_pedido", "actualizar_pedido", "eliminar_pedido"
+)
+# Lo único que los workers pueden llamar en el escritor por la conexión
+METODOS_ESCRITOR = ("escribir",)
+
+ESPERA_MAXIMA = 5.0  # segundos que espera un worker a ver su escritura en el log
+
+
+def leer_eventos(ruta_log: str, desde: int = 0):
+    """Eventos completos del log a partir del byte `desde`, y hasta qué byte se ha leído"""
+    if not os.path.exists(ruta_log):
+        return [], desde
+    with open(ruta_log, "rb") as log:
+        log.seek(desde)
+        datos = log.read()
+    # Una línea a medio escribir se deja para la siguiente lectura
+    completos = datos[:datos.rfind(b"\n") + 1]
+    eventos = [json.loads(linea) for linea in completos.splitlines()]
+    return eventos, desde + len(completos)
+
+
+def leer_instantanea(ruta_log: str):
+    try:
+        with open(ruta_log + ".estado", encoding="utf-8") as fichero:
+            return json.load(fichero)
+    except FileNotFoundError:
+        return None
+
+
+class LectorLog:
+    """Lee el log por partes con el fichero abierto, y sigue al escritor cuando lo compacta"""
+
+    def __init__(self, ruta_log: str):
+        self.ruta_log = ruta_log
+        self.fichero = None
+        self.resto = b""  # línea a medio escribir
+
+    def leer(self):
+        """Eventos completos escritos desde la última lectura"""
+        if self.fichero is None:
+            try:
+                self.fichero = open(self.ruta_log, "rb")
+            except FileNotFoundError:
+                return []
+        datos = self.resto + self.fichero.read()
+        if self._compactado():
+            # El escritor ya no toca el anterior: lo que queda en él es lo último
+            datos += self.fichero.read()
+            self.fichero.close()
+            self.fichero = open(self.ruta_log, "rb")
+            datos += self.fichero.read()
+        completos = datos.rfind(b"\n") + 1
+        self.resto = datos[completos:]
+        return [json.loads(linea) for linea in datos[:completos].splitlines()]
+
+    def cerrar(self):
+        if self.fichero is not None:
+            self.fichero.close()
+            self.fichero = None
+
+    def _compactado(self):
+        try:
+            return os.stat(self.ruta_log).st_ino != os.fstat(self.fichero.fileno()).st_ino
+        except FileNotFoundError:
+            return False
+
+
+class Escritor:
+    """Lado del proceso escritor: aplica las escrituras en orden y las guarda en el log"""
+
+    def __init__(self, ruta_log: str, compactar_cada: int = 10000):
+        self.ruta_log = ruta_log
+        self.compactar_cada = compactar_cada
+        self.almacen = Almacen()
+        instantanea = leer_instantanea(ruta_log)
+        if instantanea is not None:
+            self.almacen.restaurar(instantanea)
+        eventos, _ = leer_eventos(ruta_log)
+        for evento in eventos:
+            # Si se paró a mitad de una compactación el log aún tiene eventos de la instantánea
+            if evento["secuencia"] > self.almacen.secuencia:
+                self.almacen.aplicar(evento)
+        self.en_log = len(eventos)
+        self.log = open(ruta_log, "a", encoding="utf-8")
+        self.almacen.suscriptores.append(self.guardar)
+
+    def guardar(self, evento: dict):
+        self.log.write(json.dumps(evento, separators=(",", ":")) + "\n")
+        self.log.flush()
+        self.en_log += 1
+        if self.compactar_cada and self.en_log >= self.compactar_cada:
+            self.compactar()
+
+    def compactar(self):
+        """Guardar el estado entero en la instantánea y empezar un log vacío. Se llama
+        con el lock del Almacen (desde guardar), así no se cuela ninguna escritura"""
+        try:
+            temporal = self.ruta_log + ".estado.tmp"
+            with open(temporal, "w", encoding="utf-8") as fichero:
+                json.dump(self.almacen.exportar(), fichero, separators=(",", ":"))
+            os.replace(temporal, self.ruta_log + ".estado")
+            open(self.ruta_log + ".tmp", "w").close()
+            os.replace(self.ruta_log + ".tmp", self.ruta_log)
+        except OSError:
+            # Windows no deja reemplazar un fichero que otro proceso tiene abierto;
+            # el log sigue creciendo y se vuelve a intentar en la siguiente compactación
+            self.en_log = 0
+            return
+        self.log.close()
+        self.log = open(self.ruta_log, "a", encoding="utf-8")
+        self.en_log = 0
+
+    def escribir(self, metodo: str, *args):
+        """Devuelve (resultado, secuencia); los errores llegan al worker como la misma excepción"""
+        if metodo not in ESCRITURAS:
+            raise ValueError(f"Escritura desconocida: {metodo}")
+        # El lock del Almacen hace que cada escritura y su secuencia vayan juntas
+        with self.almacen.lock:
+            resultado = getattr(self.almacen, metodo)(*args)
+            return resultado, self.almacen.secuencia
+
+
+@functools.cache
+def conexion_almacen():
+    """Clase BaseManager para hablar con el escritor. multiprocessing.managers solo se
+    importa en modo escalado, en modo local ahorra ~15 ms al arrancar (bench_arranque.py)"""
+    from multiprocessing.managers import BaseManager
+    
+    class ConexionAlmacen(BaseManager):
+        pass
+    
+    return ConexionAlmacen
+
+
+def configuracion():
+    host, puerto = os.environ["PEDIDOS_ALMACEN"].rsplit(":", 1)
+    clave = os.getenv("PEDIDOS_ALMACEN_CLAVE")
+    if not clave:
+        # Con la clave se puede escribir en el almacén (y multiprocessing usa pickle)
+        raise RuntimeError("Falta PEDIDOS_ALMACEN_CLAVE, la clave compartida con el escritor")
+    return (host, int(puerto)), clave.encode(), os.getenv("PEDIDOS_LOG", "pedidos.log")
+
+
+class AlmacenCompartido:
+    """Lado de cada worker: lecturas desde la réplica local, escrituras al escritor"""
+
+    def __init__(self, direccion, clave: bytes, ruta_log: str):
+        self.replica = Almacen()
+        self.ruta_log = ruta_log
+        self.lector = LectorLog(ruta_log)
+        ConexionAlmacen = conexion_almacen()
+        ConexionAlmacen.register("escritor", exposed=METODOS_ESCRITOR)
+        conexion = ConexionAlmacen(address=direccion, authkey=clave)
+        conexion.connect()
+        self.escritor = conexion.escritor()
+        self.restaurar()
+        self.sincronizar()
+
+    def restaurar(self):
+        instantanea = leer_instantanea(self.ruta_log)
+        if instantanea is not None and instantanea["secuencia"] > self.replica.secuencia:
+            self.replica.restaurar(instantanea)
+
+    def sincronizar(self):
+        """Aplicar los eventos nuevos del log"""
+        for evento in self.lector.leer():
+            if evento["secuencia"] > self.replica.secuencia + 1:
+                # Ha habido más de una compactación desde la última lectura
+                self.restaurar()
+            if evento["secuencia"] > self.replica.secuencia + 1:
+                raise RuntimeError(f"Faltan eventos en {self.ruta_log} antes del {evento['secuencia']}")
+            if evento["secuencia"] > self.replica.secuencia:
+                self.replica.aplicar(evento)
+
+    async def esperar(self, secuencia: int, espera_maxima: float = ESPERA_MAXIMA):
+        """Sincronizar hasta que la réplica llegue a `secuencia`. El escritor ya la ha
+        guardado en el log, normalmente está a la primera"""
+        limite = time.monotonic() + espera_maxima
+        pausa = 0.001
+        while True:
+            self.sincronizar()
+            if self.replica.secuencia >= secuencia:
+                return
+            if time.monotonic() >= limite:
+                raise TimeoutError(
+                    f"La réplica sigue en la secuencia {self.replica.secuencia} y la escritura es la {secuencia}"
+                )
+            await asyncio.sleep(pausa)
+            pausa = min(pausa * 2, 0.1)
+
+    async def escribir(self, metodo: str, *args):
+        # La llamada al escritor bloquea, se hace en un hilo; la réplica solo se toca
+        # desde el event loop, así nunca cambia mientras otra petición la recorre
+        resultado, secuencia = await asyncio.to_thread(self.escritor.escribir, metodo, *args)
+        await self.esperar(secuencia)
+        return resultado
+
+    async def seguir(self, intervalo: float = 0.2):
+        """Leer el log periódicamente, para que el feed de cambios (GET /cambios) avance
+        aunque a este worker no le lleguen peticiones"""
+        while True:
+            self.sincronizar()
+            await asyncio.sleep(intervalo)
+
+    def resumen(self):
+        self.sincronizar()
+        return self.replica.resumen()
+
+    def obtener_producto(self, producto_id: int):
+        self.sincronizar()
+        return self.replica.obtener_producto(producto_id)
+
+    def listar_productos(self):
+        self.sincronizar()
+        return self.replica.listar_productos()
+
+    def obtener_pedido(self, pedido_id: int):
+        self.sincronizar()
+        return self.replica.obtener_pedido(pedido_id)
+
+    def listar_pedidos(self):
+        self.sincronizar()
+        return self.replica.listar_pedidos()
+
+
+def crear_almacen():
+    """Almacen local, o AlmacenCompartido si PEDIDOS_ALMACEN está definida"""
+    if not os.getenv("PEDIDOS_ALMACEN"):
+        return Almacen()
+    direccion, clave, ruta_log = configuracion()
+    return AlmacenCompartido(direccion, clave, ruta_log)
+
+
+def servir():
+    direccion, clave, ruta_log = configuracion()
+    escritor = Escritor(ruta_log, int(os.getenv("PEDIDOS_LOG_COMPACTAR", "10000")))
+    ConexionAlmacen = conexion_almacen()
+    ConexionAlmacen.register("escritor", callable=lambda: escritor, exposed=METODOS_ESCRITOR)
+    servidor = ConexionAlmacen(address=direccion, authkey=clave).get_server()
+    print(f"Escritor de pedidos en {direccion[0]}:{direccion[1]}, log {ruta_log} "
+          f"({escritor.almacen.secuencia} eventos)", flush=True)
+    servidor.serve_forever()
+
+
+# Para ejecutar con: PEDIDOS_ALMACEN=127.0.0.1:50500 PEDIDOS_ALMACEN_CLAVE=... python almacen.py
+if __name__ == "__main__":
+    servir()
@@ -0,0 +1,119 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+# Arranque en frío: cuánto tarda un proceso nuevo en importar main, arrancar la app y
+# responder la primera petición (importa con autoescalado, cada pod nuevo pasa por aquí)
+# Uso: python bench_arranque.py [repeticiones] [ruta ...]
+# Cada repetición es un proceso nuevo en modo local (sin PEDIDOS_ALMACEN). Las peticiones
+# (GET / y GET /productos por defecto) van por el transporte ASGI de httpx, sin red, y
+# cada ruta se pide dos veces para ver lo que cuesta solo la primera.
+# Al final se listan los módulos que más tarda en importar main (python -X importtime,
+# en un proceso más que no cuenta para los tiempos).
+
+HIJO = """
+import time
+inicio = time.perf_counter()
+import main
+importado = time.perf_counter()
+
+import asyncio, httpx, json, sys
+
+async def lifespan(app, entrada, salida, mensaje):
+    await entrada.put({"type": mensaje})
+    return await salida.get()
+
+async def medir():
+    entrada, salida = asyncio.Queue(), asyncio.Queue()
+    scope = {"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}}
+    tarea = asyncio.create_task(main.app(scope, entrada.get, salida.put))
+    t = time.perf_counter()
+    await lifespan(main.app, entrada, salida, "lifespan.startup")
+    resultado = {"import": importado - inicio, "startup": time.perf_counter() - t, "peticiones": []}
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as cliente:
+        for ruta in sys.argv[1:]:
+            tiempos = []
+            for _ in range(2):
+                t = time.perf_counter()
+                respuesta = await cliente.get(ruta)
+                tiempos.append(time.perf_counter() - t)
+            resultado["peticiones"].append([ruta, respuesta.status_code, tiempos[0], tiempos[1]])
+
+    await lifespan(main.app, entrada, salida, "lifespan.shutdown")
+    await tarea
+    print(json.dumps(resultado))
+
+asyncio.run(medir())
+"""
+
+
+def arbol_imports(stderr: str, modulo: str = "main"):
+    """Imports directos de `modulo` con su tiempo acumulado, de la salida de -X importtime"""
+    hijos = []
+    for linea in stderr.splitlines():
+        if not linea.startswith("import time:") or "|" not in linea[13:]:
+            continue
+        _, acumulado, nombre = linea[12:].split("|")
+        if not acumulado.strip().isdigit():
+            continue
+        nivel = (len(nombre) - len(nombre.lstrip()) - 1) // 2
+        nombre = nombre.strip()
+        if nivel == 0:
+            if nombre == modulo:
+                return int(acumulado) / 1e6, hijos
+            hijos = []
+        elif nivel == 1:
+            hijos.append((int(acumulado) / 1e6, nombre))
+    return None, []
+
+
+def medir_proceso(rutas, importtime: bool = False):
+    entorno = dict(os.environ)
+    entorno.pop("PEDIDOS_ALMACEN", None)
+    aqui = os.path.dirname(os.path.abspath(__file__))
+    t = time.perf_counter()
+    opciones = ["-X", "importtime"] if importtime else []
+    proceso = subprocess.run(
+        [sys.executable, *opciones, "-c", HIJO, *rutas],
+        cwd=aqui, env=entorno, capture_output=True, text=True, check=True,
+    )
+    resultado = json.loads(proceso.stdout.strip().splitlines()[-1])
+    resultado["proceso"] = time.perf_counter() - t
+    resultado["arbol"] = arbol_imports(proceso.stderr)
+    return resultado
+
+
+def main(repeticiones: int, rutas):
+    resultados = [medir_proceso(rutas) for _ in range(repeticiones)]
+    # -X importtime hace más lento el import, el árbol se saca de un proceso aparte
+    _, hijos = medir_proceso(rutas, importtime=True)["arbol"]
+
+    def mediana_ms(valores):
+        return statistics.median(valores) * 1000
+
+    print(f"Mediana de {repeticiones} procesos")
+    print(f"  proceso completo    {mediana_ms([r['proceso'] for r in resultados]):8.1f} ms")
+    print(f"  import main         {mediana_ms([r['import'] for r in resultados]):8.1f} ms")
+    print(f"  startup             {mediana_ms([r['startup'] for r in resultados]):8.1f} ms")
+    for i, (ruta, status, _, _) in enumerate(resultados[0]["peticiones"]):
+        primera = mediana_ms([r["peticiones"][i][2] for r in resultados])
+        segunda = mediana_ms([r["peticiones"][i][3] for r in resultados])
+        print(f"  GET {ruta:<16} {primera:8.1f} ms la primera, {segunda:.1f} ms la segunda ({status})")
+
+    print("Imports de main que más tardan (acumulado):")
+    for segundos, nombre in sorted(hijos, reverse=True)[:10]:
+        print(f"  {nombre:<28} {segundos * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    argumentos = sys.argv[1:]
+    main(
+        int(argumentos[0]) if argumentos else 5,
+        argumentos[1:] or ["/", "/productos"],
+    )
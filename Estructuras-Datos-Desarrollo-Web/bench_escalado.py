@@ -0,0 +1,121 @@
+import http.client
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+from almacen import METODOS_ESCRITOR, conexion_almacen
+
+
+# Benchmark del modo escalado: lecturas por segundo según el número de workers
+# Uso: python bench_escalado.py [num_pedidos] [segundos] [workers...]
+# Arranca el escritor (almacen.py), carga los datos a través de él y, para cada número
+# de workers, levanta ese número de procesos uvicorn y los carga con varios procesos
+# cliente pidiendo GET /pedidos/{id} con conexiones keep-alive. Con un solo núcleo no
+# puede escalar.
+# Cada worker es un uvicorn con su propio puerto y los clientes se reparten entre ellos,
+# como detrás de un balanceador: con `uvicorn --workers N` el socket compartido no lleva
+# TCP_NODELAY y cada respuesta espera ~40 ms al ACK retardado, lo que tapa la medida.
+
+CLAVE = "bench"
+
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def esperar(puerto, ruta="/", intentos=100):
+    for _ in range(intentos):
+        try:
+            conexion = http.client.HTTPConnection("127.0.0.1", puerto, timeout=1)
+            conexion.request("GET", ruta)
+            if conexion.getresponse().status == 200:
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"El servidor no responde en el puerto {puerto}")
+
+
+def cliente(puerto, num_pedidos, segundos, resultados):
+    rng = random.Random(os.getpid())
+    conexion = http.client.HTTPConnection("127.0.0.1", puerto)
+    peticiones = 0
+    fin = time.perf_counter() + segundos
+    while time.perf_counter() < fin:
+        conexion.request("GET", f"/pedidos/{rng.randint(1, num_pedidos)}")
+        conexion.getresponse().read()
+        peticiones += 1
+    resultados.put(peticiones)
+
+
+def main(num_pedidos: int, segundos: float, lista_workers):
+    tmp = tempfile.mkdtemp()
+    puerto_almacen = puerto_libre()
+    entorno = dict(
+        os.environ,
+        PEDIDOS_ALMACEN=f"127.0.0.1:{puerto_almacen}",
+        PEDIDOS_ALMACEN_CLAVE=CLAVE,
+        PEDIDOS_LOG=os.path.join(tmp, "pedidos.log"),
+    )
+    escritor = subprocess.Popen([sys.executable, "almacen.py"], env=entorno, stdout=subprocess.DEVNULL)
+    try:
+        time.sleep(1)
+        ConexionAlmacen = conexion_almacen()
+        ConexionAlmacen.register("escritor", exposed=METODOS_ESCRITOR)
+        conexion = ConexionAlmacen(address=("127.0.0.1", puerto_almacen), authkey=CLAVE.encode())
+        conexion.connect()
+        proxy = conexion.escritor()
+        for producto_id in range(1, 101):
+            proxy.escribir("crear_producto", producto_id, f"Producto {producto_id}", 1.5 * producto_id, 10**9)
+        for pedido_id in range(1, num_pedidos + 1):
+            proxy.escribir("crear_pedido", pedido_id, f"Cliente {pedido_id}", [(pedido_id % 100 + 1, 2)])
+
+        print(f"{os.cpu_count()} núcleos, {num_pedidos} pedidos, {segundos:.0f} s por prueba")
+        for workers in lista_workers:
+            puertos = [puerto_libre() for _ in range(workers)]
+            servidores = [
+                subprocess.Popen(
+                    [sys.executable, "-m", "uvicorn", "main:app", "--port", str(puerto), "--log-level", "warning"],
+                    env=entorno,
+                )
+                for puerto in puertos
+            ]
+            try:
+                for puerto in puertos:
+                    esperar(puerto)
+                num_clientes = max(4, 2 * workers)
+                resultados = multiprocessing.Queue()
+                procesos = [
+                    multiprocessing.Process(
+                        target=cliente, args=(puertos[n % workers], num_pedidos, segundos, resultados)
+                    )
+                    for n in range(num_clientes)
+                ]
+                for proceso in procesos:
+                    proceso.start()
+                total = sum(resultados.get() for _ in procesos)
+                for proceso in procesos:
+                    proceso.join()
+                print(f"  {workers} workers  {total / segundos:8.0f} lecturas/s  ({num_clientes} clientes)")
+            finally:
+                for servidor in servidores:
+                    servidor.terminate()
+                    servidor.wait()
+    finally:
+        escritor.terminate()
+        escritor.wait()
+
+
+if __name__ == "__main__":
+    argumentos = sys.argv[1:]
+    main(
+        int(argumentos[0]) if len(argumentos) > 0 else 2000,
+        float(argumentos[1]) if len(argumentos) > 1 else 5,
+        [int(w) for w in argumentos[2:]] or [1, 2, 4],
+    )
@@ -0,0 +1,40 @@
+import sys
+import time
+
+from fastapi.testclient import TestClient
+
+import main
+
+
+# Benchmark de GET /pedidos
+# Uso: python bench_pedidos.py [num_pedidos]
+# Carga los productos y pedidos directamente en el almacén (sin pasar por la API)
+# y mide cuánto tarda el listado completo, que es lo que más cuesta serializar.
+
+
+def main_bench(num_pedidos: int, repeat: int = 5):
+    for producto_id in range(1, 101):
+        main.almacen.crear_producto(producto_id, f"Producto {producto_id}", 1.5 * producto_id, 10**9)
+
+    start = time.perf_counter()
+    for pedido_id in range(1, num_pedidos + 1):
+        items = [
+            (producto_id, 1 + pedido_id % 3)
+            for producto_id in (pedido_id % 100 + 1, (pedido_id * 7) % 100 + 1, (pedido_id * 13) % 100 + 1)
+        ]
+        main.almacen.crear_pedido(pedido_id, f"Cliente {pedido_id}", items)
+    print(f"{num_pedidos} pedidos cargados en {time.perf_counter() - start:.2f} s")
+
+    client = TestClient(main.app)
+    for url in ("/pedidos", f"/pedidos/{num_pedidos}", "/productos"):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = client.get(url)
+            timings.append(time.perf_counter() - start)
+            assert response.status_code == 200
+        print(f"GET {url:<16} {min(timings) * 1000:8.1f} ms  ({len(response.content) / 1e6:.1f} MB)")
+
+
+if __name__ == "__main__":
+    main_bench(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import threading
+from collections import deque
+
+
+# Feed de cambios de productos y pedidos (GET /cambios, Server-Sent Events)
+# Cada evento que aplica el Almacen (producto_creado, pedido_actualizado, ..., ver
+# Almacen._aplicar) se codifica una sola vez como mensaje SSE con su número de
+# secuencia en "id:" y se guarda en un buffer circular con los últimos `capacidad`.
+# Un cliente que se reconecta con Last-Event-ID (o ?desde=) recibe lo que se perdió
+# desde el buffer; si ya no está, recibe un 410 y tiene que volver a leer los listados.
+# Cada suscriptor tiene una cola acotada: si no lee al ritmo al que llegan los eventos
+# y la cola se llena, se le manda "desbordado" y se cierra su conexión. La memoria
+# nunca crece con los clientes lentos, y pueden reanudar desde el último id recibido.
+
+LATIDO = 15  # segundos sin eventos antes de mandar un comentario para mantener la conexión
+
+
+def formatear(evento: dict) -> bytes:
+    datos = json.dumps(evento, ensure_ascii=False, separators=(",", ":"))
+    return f"id: {evento['secuencia']}\nevent: {evento['tipo']}\ndata: {datos}\n\n".encode()
+
+
+class Suscripcion:
+    def __init__(self, cola_maxima: int):
+        self.loop = asyncio.get_running_loop()
+        self.cola = asyncio.Queue(cola_maxima)
+        self.desbordada = False
+
+    def entregar(self, secuencia: int, mensaje: bytes):
+        # publicar() puede llegar desde otro hilo, la cola solo se toca desde su event loop
+        self.loop.call_soon_threadsafe(self._poner, (secuencia, mensaje))
+
+    def _poner(self, item):
+        if self.desbordada:
+            return
+        try:
+            self.cola.put_nowait(item)
+        except asyncio.QueueFull:
+            self.desbordada = True
+            while not self.cola.empty():
+                self.cola.get_nowait()
+            self.cola.put_nowait(None)
+
+
+class FeedCambios:
+    def __init__(self, secuencia_inicial: int = 0, capacidad: int = 10000, cola_maxima: int = 1000):
+        self.buffer = deque(maxlen=capacidad)  # (secuencia, mensaje)
+        self.ultima = secuencia_inicial
+        self.cola_maxima = cola_maxima
+        self.suscripciones = set()
+        self.lock = threading.Lock()
+
+    def publicar(self, evento: dict):
+        """Suscriptor del Almacen: se llama con cada evento ya aplicado"""
+        mensaje = formatear(evento)
+        with self.lock:
+            if evento["tipo"] == "estado_restaurado":
+                # Los eventos anteriores ya no se pueden reanudar: quien venga de antes recibe 410
+                self.buffer.clear()
+            self.buffer.append((evento["secuencia"], mensaje))
+            self.ultima = evento["secuencia"]
+            suscripciones = list(self.suscripciones)
+        for suscripcion in suscripciones:
+            suscripcion.entregar(evento["secuencia"], mensaje)
+
+    def disponible(self, desde: int) -> bool:
+        """Si se pueden dar todos los eventos posteriores a `desde`"""
+        with self.lock:
+            if desde > self.ultima:
+                # Una secuencia que este feed no ha dado (por ejemplo de antes de restaurar
+                # el estado): el cliente tiene que volver a leerlo todo
+                return False
+            if desde == self.ultima:
+                return True
+            return bool(self.buffer) and self.buffer[0][0] <= desde + 1
+
+    async def escuchar(self, desde: int = None):
+        """Mensajes SSE a partir de la secuencia `desde` (None: solo los nuevos)"""
+        suscripcion = Suscripcion(self.cola_maxima)
+        with self.lock:
+            # Se registra antes de copiar el buffer para no perder nada entre medias
+            self.suscripciones.add(suscripcion)
+            ultimo = self.ultima if desde is None else desde
+            pendientes = [item for item in self.buffer if item[0] > ultimo]
+        try:
+            yield b"retry: 1000\n\n"
+            for secuencia, mensaje in pendientes:
+                yield mensaje
+                ultimo = secuencia
+
+            while True:
+                try:
+                    item = await asyncio.wait_for(suscripcion.cola.get(), LATIDO)
+                except asyncio.TimeoutError:
+                    yield b": latido\n\n"
+                    continue
+                if item is None:
+                    datos = json.dumps({"ultima_recibida": ultimo})
+                    yield f"event: desbordado\ndata: {datos}\n\n".encode()
+                    return
+                secuencia, mensaje = item
+                if secuencia > ultimo:
+                    yield mensaje
+                    ultimo = secuencia
+        finally:
+            with self.lock:
+                self.suscripciones.discard(suscripcion)
@@ -0,0 +1,572 @@
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+
+
+# Estructuras de datos de la tienda: productos en un árbol binario de búsqueda (AVL) y
+# pedidos en una lista enlazada. Almacen junta las dos con las reglas de la API.
+# Las dos son persistentes (copia de camino): una escritura nunca cambia nodos ya
+# publicados, crea los que necesita y publica la nueva raíz/cabeza con una sola
+# asignación. Un listado largo recorre la versión que había al empezar, sin locks,
+# mientras las escrituras siguen en otros hilos.
+
+
+class NodoProducto:
+    def __init__(self, producto_id: int, nombre: str, precio: float, stock: int, izquierda=None, derecha=None):
+        self.producto_id = producto_id
+        self.nombre = nombre
+        self.precio = precio
+        self.stock = stock
+        self.izquierda = izquierda
+        self.derecha = derecha
+        self.altura = 1 + max(altura(izquierda), altura(derecha))
+    
+    def copiar(self, **cambios):
+        return NodoProducto(
+            self.producto_id,
+            cambios.get("nombre", self.nombre),
+            cambios.get("precio", self.precio),
+            cambios.get("stock", self.stock),
+            cambios.get("izquierda", self.izquierda),
+            cambios.get("derecha", self.derecha)
+        )
+    
+    def como_dict(self):
+        return {
+            "producto_id": self.producto_id,
+            "nombre": self.nombre,
+            "precio": self.precio,
+            "stock": self.stock
+        }
+
+def altura(nodo):
+    return nodo.altura if nodo is not None else 0
+
+class ArbolProductos:
+    """Árbol AVL persistente: un nodo publicado no se modifica nunca. Insertar, eliminar
+    o actualizar copia solo los nodos del camino (rotaciones incluidas) y publica la
+    nueva raíz de una vez, así quien esté recorriendo la versión anterior la sigue
+    viendo entera. Al estar equilibrado todas las operaciones son O(log n), también
+    si los productos llegan ordenados por ID."""
+
+    def __init__(self, estado=(None, 0)):
+        self.estado = estado  # (raiz, contador), se reemplaza entero en cada escritura
+    
+    @property
+    def raiz(self):
+        return self.estado[0]
+    
+    @property
+    def contador(self):
+        return self.estado[1]
+    
+    def insertar(self, producto_id: int, nombre: str, precio: float, stock: int):
+        raiz, contador = self.estado
+        if self._buscar_recursivo(raiz, producto_id) is not None:
+            raise ValueError(f"El producto con ID {producto_id} ya existe")
+        
+        nueva_raiz = self._insertar_recursivo(raiz, producto_id, nombre, precio, stock)
+        self.estado = (nueva_raiz, contador + 1)
+    
+    def _insertar_recursivo(self, nodo, producto_id, nombre, precio, stock):
+        if nodo is None:
+            return NodoProducto(producto_id, nombre, precio, stock)
+        if producto_id < nodo.producto_id:
+            nodo = nodo.copiar(izquierda=self._insertar_recursivo(nodo.izquierda, producto_id, nombre, precio, stock))
+        else:
+            nodo = nodo.copiar(derecha=self._insertar_recursivo(nodo.derecha, producto_id, nombre, precio, stock))
+        return self._equilibrar(nodo)
+    
+    def eliminar(self, producto_id: int):
+        raiz, contador = self.estado
+        if self._buscar_recursivo(raiz, producto_id) is None:
+            return False
+        
+        self.estado = (self._eliminar_recursivo(raiz, producto_id), contador - 1)
+        return True
+    
+    def _eliminar_recursivo(self, nodo, producto_id):
+        if producto_id < nodo.producto_id:
+            return self._equilibrar(nodo.copiar(izquierda=self._eliminar_recursivo(nodo.izquierda, producto_id)))
+        if producto_id > nodo.producto_id:
+            return self._equilibrar(nodo.copiar(derecha=self._eliminar_recursivo(nodo.derecha, producto_id)))
+        
+        if nodo.izquierda is None:
+            return nodo.derecha
+        if nodo.derecha is None:
+            return nodo.izquierda
+        # Con dos hijos ocupa su lugar el sucesor (el menor del subárbol derecho)
+        sucesor = nodo.derecha
+        while sucesor.izquierda is not None:
+            sucesor = sucesor.izquierda
+        derecha = self._eliminar_recursivo(nodo.derecha, sucesor.producto_id)
+        return self._equilibrar(sucesor.copiar(izquierda=nodo.izquierda, derecha=derecha))
+    
+    def actualizar(self, producto_id: int, **campos):
+        """Cambiar nombre, precio o stock; la forma del árbol no cambia"""
+        raiz, contador = self.estado
+        if self._buscar_recursivo(raiz, producto_id) is None:
+            return False
+        
+        self.estado = (self._actualizar_recursivo(raiz, producto_id, campos), contador)
+        return True
+    
+    def _actualizar_recursivo(self, nodo, producto_id, campos):
+        if producto_id < nodo.producto_id:
+            return nodo.copiar(izquierda=self._actualizar_recursivo(nodo.izquierda, producto_id, campos))
+        if producto_id > nodo.producto_id:
+            return nodo.copiar(derecha=self._actualizar_recursivo(nodo.derecha, producto_id, campos))
+        return nodo.copiar(**campos)
+    
+    def actualizar_varios(self, cambios: dict):
+        """cambios: {producto_id: campos}. Una sola bajada por el árbol para todos,
+        así los nodos de arriba se copian una vez y no una por producto"""
+        raiz, contador = self.estado
+        ids = sorted(cambios)
+        self.estado = (self._actualizar_varios(raiz, ids, 0, len(ids), cambios), contador)
+    
+    def _actualizar_varios(self, nodo, ids, inicio, fin, cambios):
+        # ids[inicio:fin] son los IDs a cambiar que caen dentro de este subárbol
+        if inicio == fin:
+            return nodo
+        if nodo is None:
+            raise LookupError(f"Producto con ID {ids[inicio]} no existe")
+        corte = bisect_left(ids, nodo.producto_id, inicio, fin)
+        encontrado = corte < fin and ids[corte] == nodo.producto_id
+        campos = cambios[nodo.producto_id] if encontrado else {}
+        return nodo.copiar(
+            izquierda=self._actualizar_varios(nodo.izquierda, ids, inicio, corte, cambios),
+            derecha=self._actualizar_varios(nodo.derecha, ids, corte + encontrado, fin, cambios),
+            **campos
+        )
+    
+    @staticmethod
+    def _rotar_derecha(nodo):
+        izquierda = nodo.izquierda
+        return izquierda.copiar(derecha=nodo.copiar(izquierda=izquierda.derecha))
+    
+    @staticmethod
+    def _rotar_izquierda(nodo):
+        derecha = nodo.derecha
+        return derecha.copiar(izquierda=nodo.copiar(derecha=derecha.izquierda))
+    
+    def _equilibrar(self, nodo):
+        """Rotaciones AVL sobre un nodo recién copiado cuyos hijos ya están equilibrados"""
+        balance = altura(nodo.izquierda) - altura(nodo.derecha)
+        if balance > 1:
+            if altura(nodo.izquierda.izquierda) < altura(nodo.izquierda.derecha):
+                nodo = nodo.copiar(izquierda=self._rotar_izquierda(nodo.izquierda))
+            return self._rotar_derecha(nodo)
+        if balance < -1:
+            if altura(nodo.derecha.derecha) < altura(nodo.derecha.izquierda):
+                nodo = nodo.copiar(derecha=self._rotar_derecha(nodo.derecha))
+            return self._rotar_izquierda(nodo)
+        return nodo
+    
+    def buscar(self, producto_id: int):
+        return self._buscar_recursivo(self.raiz, producto_id)
+    
+    def _buscar_recursivo(self, nodo, producto_id):
+        if nodo is None:
+            return None
+        if producto_id == nodo.producto_id:
+            return nodo
+        elif producto_id < nodo.producto_id:
+            return self._buscar_recursivo(nodo.izquierda, producto_id)
+        else:
+            return self._buscar_recursivo(nodo.derecha, producto_id)
+    
+    def listar_todos(self):
+        productos = []
+        self._recorrer_inorden(self.raiz, productos)
+        return productos
+    
+    def _recorrer_inorden(self, nodo, productos):
+        if nodo is not None:
+            self._recorrer_inorden(nodo.izquierda, productos)
+            productos.append(nodo.como_dict())
+            self._recorrer_inorden(nodo.derecha, productos)
+
+
+MAX_LINEAS_CACHE = 50  # pedidos con más líneas no guardan su dict, ver NodoPedido.como_dict
+# Rango de los enteros de ItemsPedido (array "q", 64 bits con signo)
+MIN_ENTERO, MAX_ENTERO = -2**63, 2**63 - 1
+
+
+class ItemsPedido:
+    """Líneas de un pedido guardadas en tres arrays compactos (producto, cantidad y
+    precio unitario) en vez de un objeto por línea. El total se calcula una vez."""
+    __slots__ = ("productos", "cantidades", "precios", "total")
+    
+    def __init__(self, items):
+        self.productos = array("q", [item["producto_id"] for item in items])
+        self.cantidades = array("q", [item["cantidad"] for item in items])
+        self.precios = array("d", [item["precio_unitario"] for item in items])
+        self.total = sum((cantidad * precio for cantidad, precio in zip(self.cantidades, self.precios)), 0.0)
+    
+    def __len__(self):
+        return len(self.productos)
+    
+    def como_lista(self):
+        return [
+            {
+                "producto_id": producto_id,
+                "cantidad": cantidad,
+                "precio_unitario": precio,
+                "subtotal": cantidad * precio
+            }
+            for producto_id, cantidad, precio in zip(self.productos, self.cantidades, self.precios)
+        ]
+
+class NodoPedido:
+    def __init__(self, pedido_id: int, cliente: str, items: ItemsPedido, fecha_creacion: datetime = None, siguiente=None):
+        self.pedido_id = pedido_id
+        self.cliente = cliente
+        self.items = items
+        self.fecha_creacion = fecha_creacion or datetime.now()
+        self.total = items.total
+        self.siguiente = siguiente
+        self._dict = None
+    
+    def copiar(self, cliente: str = None, items: ItemsPedido = None, siguiente=None):
+        copia = NodoPedido(self.pedido_id, cliente or self.cliente, items or self.items, self.fecha_creacion, siguiente)
+        if not cliente and not items:
+            copia._dict = self._dict
+        return copia
+    
+    def como_dict(self):
+        # El nodo no cambia nunca (ver ListaPedidos): se convierte a dict una sola vez.
+        # Los pedidos grandes no se guardan así, sus líneas como dicts ocuparían unas
+        # diez veces más que en los arrays; se vuelven a convertir en cada lectura.
+        if self._dict is not None:
+            return self._dict
+        datos = {
+            "pedido_id": self.pedido_id,
+            "cliente": self.cliente,
+            "fecha_creacion": self.fecha_creacion.isoformat(),
+            "total": self.total,
+            "items": self.items.como_lista()
+        }
+        if len(self.items) <= MAX_LINEAS_CACHE:
+            self._dict = datos
+        return datos
+
+class ListaPedidos:
+    """Lista enlazada persistente: la cabeza es el último pedido añadido, así añadir
+    es O(1) sin tocar ningún nodo existente. Actualizar o eliminar copia solo los
+    nodos anteriores al afectado y publica la nueva cabeza de una vez."""
+
+    def __init__(self, estado=(None, 0)):
+        self.estado = estado  # (cabeza, contador), se reemplaza entero en cada escritura
+    
+    @property
+    def cabeza(self):
+        return self.estado[0]
+    
+    @property
+    def contador(self):
+        return self.estado[1]
+    
+    def agregar_pedido(self, pedido_id: int, cliente: str, items: ItemsPedido, fecha_creacion: datetime = None):
+        cabeza, contador = self.estado
+        if self._buscar(cabeza, pedido_id) is not None:
+            raise ValueError(f"Ya existe un pedido con ID {pedido_id}")
+        
+        nuevo_nodo = NodoPedido(pedido_id, cliente, items, fecha_creacion, siguiente=cabeza)
+        self.estado = (nuevo_nodo, contador + 1)
+        return nuevo_nodo
+    
+    def buscar_pedido(self, pedido_id: int):
+        return self._buscar(self.cabeza, pedido_id)
+    
+    @staticmethod
+    def _buscar(actual, pedido_id):
+        while actual is not None:
+            if actual.pedido_id == pedido_id:
+                return actual
+            actual = actual.siguiente
+        return None
+    
+    def _reemplazar(self, pedido_id, cambiar):
+        """Publicar una versión en la que el nodo del pedido pasa a ser cambiar(nodo)"""
+        cabeza, contador = self.estado
+        anteriores = []
+        actual = cabeza
+        while actual is not None and actual.pedido_id != pedido_id:
+            anteriores.append(actual)
+            actual = actual.siguiente
+        if actual is None:
+            return None
+        
+        nuevo = cambiar(actual)
+        resto = nuevo if nuevo is not None else actual.siguiente
+        for nodo in reversed(anteriores):
+            resto = nodo.copiar(siguiente=resto)
+        self.estado = (resto, contador if nuevo is not None else contador - 1)
+        return actual
+    
+    def eliminar_pedido(self, pedido_id: int):
+        return self._reemplazar(pedido_id, lambda nodo: None) is not None
+    
+    def listar_todos_pedidos(self):
+        # Del más antiguo al más reciente, como se fueron añadiendo
+        pedidos = []
+        actual = self.cabeza
+        
+        while actual is not None:
+            pedidos.append(actual.como_dict())
+            actual = actual.siguiente
+        pedidos.reverse()
+        return pedidos
+    
+    def actualizar_pedido(self, pedido_id: int, nuevo_cliente: str = None, nuevos_items: ItemsPedido = None):
+        cambiar = lambda nodo: nodo.copiar(nuevo_cliente, nuevos_items, nodo.siguiente)
+        return self._reemplazar(pedido_id, cambiar) is not None
+
+
+class Almacen:
+    """Productos y pedidos con las comprobaciones que hace la API.
+    Cada escritura se convierte en un evento (dict) que se aplica con aplicar();
+    una réplica que recibe los mismos eventos en el mismo orden queda igual.
+    Los errores se señalan con LookupError (no existe, 404) o ValueError (400)."""
+
+    def __init__(self):
+        self.arbol_productos = ArbolProductos()
+        self.lista_pedidos = ListaPedidos()
+        self.secuencia = 0
+        # Las escrituras van de una en una; las lecturas no esperan nunca
+        self.lock = threading.RLock()
+        # Estado de las dos estructuras con su secuencia, se publica al final de aplicar()
+        self.version = (self.arbol_productos.estado, self.lista_pedidos.estado, 0)
+        # Funciones a las que se pasa cada evento ya aplicado, con su número de secuencia
+        self.suscriptores = []
+    
+    # Lecturas
+    
+    def instantanea(self):
+        """Almacen de solo lectura con productos y pedidos de la misma versión, en O(1).
+        Las escrituras posteriores no lo cambian (ver exportar)"""
+        arbol, lista, secuencia = self.version
+        copia = Almacen()
+        copia.arbol_productos = ArbolProductos(arbol)
+        copia.lista_pedidos = ListaPedidos(lista)
+        copia.secuencia = secuencia
+        copia.version = (arbol, lista, secuencia)
+        return copia
+    
+    def exportar(self):
+        """Estado completo de una misma versión, serializable en JSON (ver restaurar)"""
+        copia = self.instantanea()
+        return {
+            "secuencia": copia.secuencia,
+            "productos": copia.listar_productos(),
+            "pedidos": copia.listar_pedidos()
+        }
+    
+    def restaurar(self, estado: dict):
+        """Sustituir todo por un estado de exportar(). Los suscriptores reciben un evento
+        "estado_restaurado" en vez de los que hubo entre medias"""
+        arbol = ArbolProductos()
+        for producto in estado["productos"]:
+            arbol.insertar(producto["producto_id"], producto["nombre"], producto["precio"], producto["stock"])
+        lista = ListaPedidos()
+        for pedido in estado["pedidos"]:
+            lista.agregar_pedido(
+                pedido["pedido_id"],
+                pedido["cliente"],
+                ItemsPedido(pedido["items"]),
+                datetime.fromisoformat(pedido["fecha_creacion"])
+            )
+        with self.lock:
+            self.arbol_productos = arbol
+            self.lista_pedidos = lista
+            self.secuencia = estado["secuencia"]
+            self.version = (arbol.estado, lista.estado, self.secuencia)
+            evento = {"tipo": "estado_restaurado", "secuencia": self.secuencia}
+            for suscriptor in self.suscriptores:
+                suscriptor(evento)
+    
+    def resumen(self):
+        (_, productos), (_, pedidos), _ = self.version
+        return {
+            "productos_en_arbol": productos,
+            "pedidos_en_lista": pedidos
+        }
+    
+    def obtener_producto(self, producto_id: int):
+        nodo = self.arbol_productos.buscar(producto_id)
+        return nodo.como_dict() if nodo is not None else None
+    
+    def listar_productos(self):
+        return self.arbol_productos.listar_todos()
+    
+    def obtener_pedido(self, pedido_id: int):
+        nodo = self.lista_pedidos.buscar_pedido(pedido_id)
+        return nodo.como_dict() if nodo is not None else None
+    
+    def listar_pedidos(self):
+        return self.lista_pedidos.listar_todos_pedidos()
+    
+    # Escrituras
+    
+    # Los duplicados los detectan insertar/agregar_pedido dentro de aplicar(), antes de
+    # cambiar nada, así que un evento que falla no se numera ni se publica
+    
+    def crear_producto(self, producto_id: int, nombre: str, precio: float, stock: int):
+        # Si no, nunca podría ir en un pedido (las líneas son enteros de 64 bits)
+        if not MIN_ENTERO <= producto_id <= MAX_ENTERO:
+            raise ValueError(f"ID de producto fuera de rango: {producto_id}")
+        producto = {"producto_id": producto_id, "nombre": nombre, "precio": precio, "stock": stock}
+        with self.lock:
+            return self.aplicar({"tipo": "producto_creado", "producto": producto})
+    
+    def actualizar_producto(self, producto_id: int, nombre: str = None, precio: float = None, stock: int = None):
+        """Cambiar los campos que no sean None"""
+        campos = {"nombre": nombre, "precio": precio, "stock": stock}
+        campos = {campo: valor for campo, valor in campos.items() if valor is not None}
+        with self.lock:
+            if self.arbol_productos.buscar(producto_id) is None:
+                raise LookupError("Producto no encontrado")
+            if not campos:
+                return self.obtener_producto(producto_id)
+            return self.aplicar({"tipo": "producto_actualizado", "producto": {"producto_id": producto_id, **campos}})
+    
+    def actualizar_productos(self, cambios):
+        """cambios: lista de dicts con producto_id y los campos a cambiar. Se aplican
+        todos o ninguno, como un único evento"""
+        productos = [
+            {campo: valor for campo, valor in cambio.items() if valor is not None}
+            for cambio in cambios
+        ]
+        if not productos:
+            # Sin cambios no hay evento: la secuencia no avanza
+            return {"actualizados": 0}
+        with self.lock:
+            ids = [producto["producto_id"] for producto in productos]
+            if len(set(ids)) != len(ids):
+                raise ValueError("Hay productos repetidos en la lista")
+            no_existen = [producto_id for producto_id in ids if self.arbol_productos.buscar(producto_id) is None]
+            if no_existen:
+                raise LookupError(f"Productos no encontrados: {no_existen[:10]}")
+            return self.aplicar({"tipo": "productos_actualizados", "productos": productos})
+    
+    def eliminar_producto(self, producto_id: int):
+        # Los pedidos guardan su precio_unitario, no se ven afectados
+        with self.lock:
+            if self.arbol_productos.buscar(producto_id) is None:
+                raise LookupError("Producto no encontrado")
+            return self.aplicar({"tipo": "producto_eliminado", "producto": {"producto_id": producto_id}})
+    
+    def _items(self, items, comprobar_stock: bool):
+        # Las líneas repetidas del mismo producto se juntan en una, y el stock se
+        # comprueba con la cantidad total
+        cantidades = {}
+        for producto_id, cantidad in items:
+            cantidades[producto_id] = cantidades.get(producto_id, 0) + cantidad
+        
+        resultado = []
+        for producto_id, cantidad in cantidades.items():
+            # Las líneas se guardan en arrays de enteros de 64 bits (ver ItemsPedido)
+            if not MIN_ENTERO <= producto_id <= MAX_ENTERO:
+                raise ValueError(f"ID de producto fuera de rango: {producto_id}")
+            if not MIN_ENTERO <= cantidad <= MAX_ENTERO:
+                raise ValueError(f"Cantidad fuera de rango para producto {producto_id}")
+            nodo_producto = self.arbol_productos.buscar(producto_id)
+            if nodo_producto is None:
+                raise LookupError(f"Producto con ID {producto_id} no existe")
+            if comprobar_stock and nodo_producto.stock < cantidad:
+                raise ValueError(f"Stock insuficiente para producto {producto_id}")
+            resultado.append({
+                "producto_id": producto_id,
+                "cantidad": cantidad,
+                "precio_unitario": nodo_producto.precio
+            })
+        return resultado
+    
+    def crear_pedido(self, pedido_id: int, cliente: str, items):
+        """items: lista de (producto_id, cantidad)"""
+        with self.lock:
+            items_pedido = self._items(items, comprobar_stock=True)
+            pedido = {
+                "pedido_id": pedido_id,
+                "cliente": cliente,
+                "fecha_creacion": datetime.now().isoformat(),
+                "items": items_pedido
+            }
+            return self.aplicar({"tipo": "pedido_creado", "pedido": pedido})
+    
+    def actualizar_pedido(self, pedido_id: int, cliente: str = None, items=None):
+        with self.lock:
+            if self.lista_pedidos.buscar_pedido(pedido_id) is None:
+                raise LookupError("Pedido no encontrado")
+            items_pedido = self._items(items, comprobar_stock=False) if items else None
+            return self.aplicar({
+                "tipo": "pedido_actualizado",
+                "pedido": {"pedido_id": pedido_id, "cliente": cliente, "items": items_pedido}
+            })
+    
+    def eliminar_pedido(self, pedido_id: int):
+        with self.lock:
+            if self.lista_pedidos.buscar_pedido(pedido_id) is None:
+                raise LookupError("Pedido no encontrado")
+            return self.aplicar({"tipo": "pedido_eliminado", "pedido": {"pedido_id": pedido_id}})
+    
+    def aplicar(self, evento: dict):
+        """Aplicar un evento ya validado y devolver cómo queda el producto o pedido"""
+        with self.lock:
+            return self._aplicar(evento)
+    
+    def _aplicar(self, evento: dict):
+        tipo = evento["tipo"]
+        if tipo == "producto_creado":
+            producto = evento["producto"]
+            self.arbol_productos.insertar(
+                producto["producto_id"], producto["nombre"], producto["precio"], producto["stock"]
+            )
+            resultado = self.obtener_producto(producto["producto_id"])
+        elif tipo == "producto_actualizado":
+            campos = dict(evento["producto"])
+            producto_id = campos.pop("producto_id")
+            self.arbol_productos.actualizar(producto_id, **campos)
+            resultado = self.obtener_producto(producto_id)
+        elif tipo == "productos_actualizados":
+            cambios = {}
+            for producto in evento["productos"]:
+                campos = dict(producto)
+                cambios[campos.pop("producto_id")] = campos
+            self.arbol_productos.actualizar_varios(cambios)
+            resultado = {"actualizados": len(cambios)}
+        elif tipo == "producto_eliminado":
+            self.arbol_productos.eliminar(evento["producto"]["producto_id"])
+            resultado = None
+        elif tipo == "pedido_creado":
+            pedido = evento["pedido"]
+            nodo = self.lista_pedidos.agregar_pedido(
+                pedido["pedido_id"],
+                pedido["cliente"],
+                ItemsPedido(pedido["items"]),
+                datetime.fromisoformat(pedido["fecha_creacion"])
+            )
+            resultado = nodo.como_dict()
+        elif tipo == "pedido_actualizado":
+            pedido = evento["pedido"]
+            items = pedido["items"]
+            self.lista_pedidos.actualizar_pedido(
+                pedido["pedido_id"],
+                pedido["cliente"],
+                ItemsPedido(items) if items else None
+            )
+            resultado = self.obtener_pedido(pedido["pedido_id"])
+        elif tipo == "pedido_eliminado":
+            self.lista_pedidos.eliminar_pedido(evento["pedido"]["pedido_id"])
+            resultado = None
+        else:
+            raise ValueError(f"Evento desconocido: {tipo}")
+        
+        self.secuencia += 1
+        evento["secuencia"] = self.secuencia
+        self.version = (self.arbol_productos.estado, self.lista_pedidos.estado, self.secuencia)
+        for suscriptor in self.suscriptores:
+            suscriptor(evento)
+        return resultado
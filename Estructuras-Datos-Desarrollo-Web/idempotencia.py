@@ -0,0 +1,143 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+
+
+# Cabecera Idempotency-Key para las altas de pedidos (POST /pedidos)
+# Un cliente que reintenta una petición (por ejemplo tras un timeout) manda la misma
+# Idempotency-Key y recibe la respuesta original sin que el endpoint se ejecute otra
+# vez. Si la original todavía está en curso, el reintento espera a que termine y
+# recibe esa misma respuesta, así dos peticiones iguales a la vez solo ejecutan una.
+#
+# - Las respuestas se guardan en memoria (por proceso) durante `ttl` segundos y como
+#   mucho `max_entradas`; al pasarse se descartan las más antiguas que ya han
+#   terminado. En modo escalado cada worker tiene las suyas, un reintento que llega
+#   a otro worker recibe el 400 de pedido duplicado.
+# - Las respuestas 5xx no se guardan, así un reintento puede salir bien.
+# - La misma clave con otro cuerpo da 422; las respuestas repetidas llevan la cabecera
+#   Idempotent-Replayed: true.
+# Es un middleware ASGI: las peticiones sin la cabecera o a otras rutas pasan sin coste.
+
+MAX_LONGITUD_CLAVE = 255
+
+
+class Entrada:
+    def __init__(self, caduca: float, huella: str):
+        self.caduca = caduca
+        self.huella = huella
+        # (status, headers, body) cuando termina, o None si no se ha guardado
+        self.respuesta = asyncio.get_running_loop().create_future()
+
+
+async def leer_cuerpo(receive) -> bytes:
+    trozos = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            raise asyncio.CancelledError()
+        trozos.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(trozos)
+
+
+async def enviar_respuesta(send, status: int, headers, body: bytes):
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def enviar_error(send, status: int, detail: str):
+    body = json.dumps({"detail": detail}).encode()
+    headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    await enviar_respuesta(send, status, headers, body)
+
+
+class MiddlewareIdempotencia:
+    def __init__(self, app, rutas, ttl: float = 86400, max_entradas: int = 10000):
+        self.app = app
+        self.rutas = set(rutas)  # {("POST", "/pedidos"), ...}
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.entradas = OrderedDict()  # (método, ruta, clave) -> Entrada, de la más antigua a la más nueva
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (scope["method"], scope["path"]) not in self.rutas:
+            return await self.app(scope, receive, send)
+        clave = next((valor for nombre, valor in scope["headers"] if nombre == b"idempotency-key"), None)
+        if clave is None:
+            return await self.app(scope, receive, send)
+        if not clave or len(clave) > MAX_LONGITUD_CLAVE:
+            return await enviar_error(send, 400, f"Idempotency-Key debe tener entre 1 y {MAX_LONGITUD_CLAVE} caracteres")
+
+        body = await leer_cuerpo(receive)
+        huella = hashlib.sha256(body).hexdigest()
+        clave_entrada = (scope["method"], scope["path"], clave)
+
+        while True:
+            self.descartar()
+            entrada = self.entradas.get(clave_entrada)
+            if entrada is None:
+                break
+            if entrada.huella != huella:
+                return await enviar_error(send, 422, "Idempotency-Key ya usada con otro cuerpo")
+            guardada = await asyncio.shield(entrada.respuesta)
+            if guardada is not None:
+                status, headers, cuerpo = guardada
+                return await enviar_respuesta(send, status, headers + [(b"idempotent-replayed", b"true")], cuerpo)
+            # La original no se guardó (5xx o error): se vuelve a intentar
+
+        entrada = Entrada(time.monotonic() + self.ttl, huella)
+        self.entradas[clave_entrada] = entrada
+        guardada = None
+        try:
+            guardada = await self.ejecutar(scope, receive, send, body)
+        finally:
+            if guardada is None and self.entradas.get(clave_entrada) is entrada:
+                del self.entradas[clave_entrada]
+            entrada.respuesta.set_result(guardada)
+
+    async def ejecutar(self, scope, receive, send, body: bytes):
+        """Ejecutar la petición y devolver la respuesta para guardarla, o None si es 5xx"""
+        pendiente = [{"type": "http.request", "body": body, "more_body": False}]
+        respuesta = {"status": 500, "headers": [], "body": []}
+
+        async def receive_repetido():
+            if pendiente:
+                return pendiente.pop()
+            return await receive()
+
+        async def send_guardando(mensaje):
+            if mensaje["type"] == "http.response.start":
+                respuesta["status"] = mensaje["status"]
+                respuesta["headers"] = list(mensaje.get("headers", []))
+            elif mensaje["type"] == "http.response.body":
+                respuesta["body"].append(mensaje.get("body", b""))
+            await send(mensaje)
+
+        await self.app(scope, receive_repetido, send_guardando)
+        if respuesta["status"] >= 500:
+            return None
+        return respuesta["status"], respuesta["headers"], b"".join(respuesta["body"])
+
+    def descartar(self):
+        ahora = time.monotonic()
+        for _ in range(len(self.entradas)):
+            clave_entrada, mas_antigua = next(iter(self.entradas.items()))
+            if mas_antigua.caduca > ahora and len(self.entradas) <= self.max_entradas:
+                return
+            if mas_antigua.respuesta.done():
+                del self.entradas[clave_entrada]
+            else:
+                # En curso: sus reintentos tienen que esperarla. Pasa al final y se
+                # descarta cuando toque después de terminar
+                self.entradas.move_to_end(clave_entrada)
+
+
+def configuracion_idempotencia():
+    """ttl y max_entradas desde PEDIDOS_IDEMPOTENCIA_TTL y PEDIDOS_IDEMPOTENCIA_MAX_CLAVES"""
+    return {
+        "ttl": float(os.getenv("PEDIDOS_IDEMPOTENCIA_TTL", "86400")),
+        "max_entradas": int(os.getenv("PEDIDOS_IDEMPOTENCIA_MAX_CLAVES", "10000")),
+    }
@@ -1,179 +1,43 @@
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Header, Query
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List
-from datetime import datetime
-
-
-class NodoProducto:
-    def __init__(self, producto_id: int, nombre: str, precio: float, stock: int):
-        self.producto_id = producto_id
-        self.nombre = nombre
-        self.precio = precio
-        self.stock = stock
-        self.izquierda = None
-        self.derecha = None
-
-class ArbolProductos:
-    def __init__(self):
-        self.raiz = None
-        self.contador = 0
-    
-    def insertar(self, producto_id: int, nombre: str, precio: float, stock: int):
-        if self.buscar(producto_id) is not None:
-            raise ValueError(f"El producto con ID {producto_id} ya existe")
-        
-        if self.raiz is None:
-            self.raiz = NodoProducto(producto_id, nombre, precio, stock)
-        else:
-            self._insertar_recursivo(self.raiz, producto_id, nombre, precio, stock)
-        self.contador += 1
-    
-    def _insertar_recursivo(self, nodo, producto_id, nombre, precio, stock):
-        if producto_id < nodo.producto_id:
-            if nodo.izquierda is None:
-                nodo.izquierda = NodoProducto(producto_id, nombre, precio, stock)
-            else:
-                self._insertar_recursivo(nodo.izquierda, producto_id, nombre, precio, stock)
-        elif producto_id > nodo.producto_id:
-            if nodo.derecha is None:
-                nodo.derecha = NodoProducto(producto_id, nombre, precio, stock)
-            else:
-                self._insertar_recursivo(nodo.derecha, producto_id, nombre, precio, stock)
-    
-    def buscar(self, producto_id: int):
-        return self._buscar_recursivo(self.raiz, producto_id)
-    
-    def _buscar_recursivo(self, nodo, producto_id):
-        if nodo is None:
-            return None
-        if producto_id == nodo.producto_id:
-            return nodo
-        elif producto_id < nodo.producto_id:
-            return self._buscar_recursivo(nodo.izquierda, producto_id)
-        else:
-            return self._buscar_recursivo(nodo.derecha, producto_id)
-    
-    def listar_todos(self):
-        productos = []
-        self._recorrer_inorden(self.raiz, productos)
-        return productos
-    
-    def _recorrer_inorden(self, nodo, productos):
-        if nodo is not None:
-            self._recorrer_inorden(nodo.izquierda, productos)
-            producto_dict = {
-                "producto_id": nodo.producto_id,
-                "nombre": nodo.nombre,
-                "precio": nodo.precio,
-                "stock": nodo.stock
-            }
-            productos.append(producto_dict)
-            self._recorrer_inorden(nodo.derecha, productos)
-
-
-class ItemPedido:
-    def __init__(self, producto_id: int, cantidad: int, precio_unitario: float):
-        self.producto_id = producto_id
-        self.cantidad = cantidad
-        self.precio_unitario = precio_unitario
-        self.subtotal = cantidad * precio_unitario
-
-class NodoPedido:
-    def __init__(self, pedido_id: int, cliente: str, items: List[ItemPedido]):
-        self.pedido_id = pedido_id
-        self.cliente = cliente
-        self.items = items
-        self.fecha_creacion = datetime.now()
-        self.total = sum(item.subtotal for item in items)
-        self.siguiente = None
-
-class ListaPedidos:
-    def __init__(self):
-        self.cabeza = None
-        self.contador = 0
-    
-    def agregar_pedido(self, pedido_id: int, cliente: str, items: List[ItemPedido]):
-        if self.buscar_pedido(pedido_id) is not None:
-            raise ValueError(f"Ya existe un pedido con ID {pedido_id}")
-        
-        nuevo_nodo = NodoPedido(pedido_id, cliente, items)
-        
-        if self.cabeza is None:
-            self.cabeza = nuevo_nodo
-        else:
-            actual = self.cabeza
-            while actual.siguiente is not None:
-                actual = actual.siguiente
-            actual.siguiente = nuevo_nodo
-        
-        self.contador += 1
-        return nuevo_nodo
-    
-    def buscar_pedido(self, pedido_id: int):
-        actual = self.cabeza
-        while actual is not None:
-            if actual.pedido_id == pedido_id:
-                return actual
-            actual = actual.siguiente
-        return None
-    
-    def eliminar_pedido(self, pedido_id: int):
-        if self.cabeza is None:
-            return False
-        
-        if self.cabeza.pedido_id == pedido_id:
-            self.cabeza = self.cabeza.siguiente
-            self.contador -= 1
-            return True
-        
-        actual = self.cabeza
-        while actual.siguiente is not None:
-            if actual.siguiente.pedido_id == pedido_id:
-                actual.siguiente = actual.siguiente.siguiente
-                self.contador -= 1
-                return True
-            actual = actual.siguiente
-        return False
-    
-    def listar_todos_pedidos(self):
-        pedidos = []
-        actual = self.cabeza
-        
-        while actual is not None:
-            pedido_dict = {
-                "pedido_id": actual.pedido_id,
-                "cliente": actual.cliente,
-                "fecha_creacion": actual.fecha_creacion.isoformat(),
-                "total": actual.total,
-                "items": [
-                    {
-                        "producto_id": item.producto_id,
-                        "cantidad": item.cantidad,
-                        "precio_unitario": item.precio_unitario,
-                        "subtotal": item.subtotal
-                    }
-                    for item in actual.items
-                ]
-            }
-            pedidos.append(pedido_dict)
-            actual = actual.siguiente
-        return pedidos
-    
-    def actualizar_pedido(self, pedido_id: int, nuevo_cliente: str = None, nuevos_items: List[ItemPedido] = None):
-        nodo = self.buscar_pedido(pedido_id)
-        if nodo is None:
-            return False
-        
-        if nuevo_cliente:
-            nodo.cliente = nuevo_cliente
-        if nuevos_items:
-            nodo.items = nuevos_items
-            nodo.total = sum(item.subtotal for item in nuevos_items)
-        return True
-
-arbol_productos = ArbolProductos()
-lista_pedidos = ListaPedidos()
+import asyncio
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from estructuras import Almacen
+from almacen import crear_almacen
+from cambios import FeedCambios
+from idempotencia import MiddlewareIdempotencia, configuracion_idempotencia
+from perfilador import MAX_SEGUNDOS, Perfilador, colapsadas, token_valido
+
+
+# Productos (árbol binario de búsqueda) y pedidos (lista enlazada), ver estructuras.py.
+# Con PEDIDOS_ALMACEN definida se usa el modo escalado con varios workers, ver almacen.py.
+almacen = crear_almacen()
+
+# Feed de cambios (GET /cambios), ver cambios.py. En modo escalado se alimenta de la
+# réplica, que aplica los mismos eventos con la misma secuencia en todos los workers.
+replica = almacen if isinstance(almacen, Almacen) else almacen.replica
+feed = FeedCambios(
+    replica.secuencia,
+    capacidad=int(os.getenv("PEDIDOS_CAMBIOS_BUFFER", "10000")),
+    cola_maxima=int(os.getenv("PEDIDOS_CAMBIOS_COLA", "1000"))
+)
+replica.suscriptores.append(feed.publicar)
+
+
+async def escribir(metodo: str, *args):
+    if isinstance(almacen, Almacen):
+        return getattr(almacen, metodo)(*args)
+    return await almacen.escribir(metodo, *args)
+
 
 
 class ProductoCreate(BaseModel):
@@ -198,6 +62,27 @@ class Producto(BaseModel):
     precio: float
     stock: int
 
+class ProductoUpdate(BaseModel):
+    nombre: str
+    precio: float
+    stock: int
+
+class ProductoPatch(BaseModel):
+    nombre: Optional[str] = None
+    precio: Optional[float] = None
+    stock: Optional[int] = None
+
+class ProductoCambio(ProductoPatch):
+    producto_id: int
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "producto_id": 101,
+                "precio": 549.99
+            }
+        }
+
 class ItemPedidoCreate(BaseModel):
     producto_id: int
     cantidad: int
@@ -245,207 +130,220 @@ class PedidoUpdate(BaseModel):
     items: Optional[List[ItemPedidoCreate]] = None
 
 
+# Respuestas JSON con orjson si está instalado (mucho más rápido al listar muchos pedidos),
+# si no con el json estándar. PEDIDOS_JSON=json fuerza el estándar.
+# orjson no serializa enteros de más de 64 bits (por ejemplo un stock enorme): con
+# esos la respuesta se genera con el json estándar.
+class ORJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        try:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:  # orjson.JSONEncodeError
+            return super().render(content)
+
+if orjson is not None and os.getenv("PEDIDOS_JSON", "orjson") == "orjson":
+    DefaultResponse = ORJSONResponse
+else:
+    DefaultResponse = JSONResponse
+
+
+# Las respuestas se construyen directamente desde los nodos (como_dict) y se devuelven
+# como DefaultResponse: FastAPI no vuelve a validar contra response_model, que se
+# mantiene solo para la documentación de /docs.
+
+
 app = FastAPI(
     title="Sistema de Gestión de Pedidos",
     description="API con Árbol Binario de Búsqueda y Lista Enlazada",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=DefaultResponse
+)
+
+# Reintentos de POST /pedidos con Idempotency-Key, ver idempotencia.py
+app.add_middleware(
+    MiddlewareIdempotencia,
+    rutas=[("POST", "/pedidos")],
+    **configuracion_idempotencia()
 )
 
 
+@app.on_event("startup")
+async def startup():
+    if not isinstance(almacen, Almacen):
+        app.state.seguir_log = asyncio.create_task(almacen.seguir())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    if not isinstance(almacen, Almacen):
+        app.state.seguir_log.cancel()
+
+
 @app.get("/")
 async def root():
     return {
         "message": "Sistema de Gestión de Pedidos",
-        "productos_en_arbol": arbol_productos.contador,
-        "pedidos_en_lista": lista_pedidos.contador
+        **almacen.resumen()
     }
 
 
 @app.post("/productos", response_model=Producto)
 async def crear_producto(producto: ProductoCreate):
     try:
-        arbol_productos.insertar(
+        nuevo = await escribir(
+            "crear_producto",
             producto.producto_id,
             producto.nombre,
             producto.precio,
             producto.stock
         )
-        return Producto(**producto.dict())
+        return DefaultResponse(content=nuevo)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/productos/{producto_id}", response_model=Producto)
 async def obtener_producto(producto_id: int):
-    nodo = arbol_productos.buscar(producto_id)
-    if nodo is None:
+    producto = almacen.obtener_producto(producto_id)
+    if producto is None:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     
-    return Producto(
-        producto_id=nodo.producto_id,
-        nombre=nodo.nombre,
-        precio=nodo.precio,
-        stock=nodo.stock
-    )
+    return DefaultResponse(content=producto)
 
 @app.get("/productos", response_model=List[Producto])
 async def listar_productos():
-    productos = arbol_productos.listar_todos()
-    return [Producto(**producto) for producto in productos]
+    return DefaultResponse(content=almacen.listar_productos())
+
+@app.put("/productos/{producto_id}", response_model=Producto)
+async def reemplazar_producto(producto_id: int, producto: ProductoUpdate):
+    try:
+        actualizado = await escribir(
+            "actualizar_producto", producto_id, producto.nombre, producto.precio, producto.stock
+        )
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return DefaultResponse(content=actualizado)
+
+@app.patch("/productos/{producto_id}", response_model=Producto)
+async def actualizar_producto(producto_id: int, producto: ProductoPatch):
+    try:
+        actualizado = await escribir(
+            "actualizar_producto", producto_id, producto.nombre, producto.precio, producto.stock
+        )
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return DefaultResponse(content=actualizado)
+
+@app.patch("/productos")
+async def actualizar_productos(cambios: List[ProductoCambio]):
+    """Cambiar muchos productos de una vez (por ejemplo, precios): todos o ninguno"""
+    try:
+        return await escribir("actualizar_productos", [cambio.model_dump() for cambio in cambios])
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.delete("/productos/{producto_id}")
+async def eliminar_producto(producto_id: int):
+    try:
+        await escribir("eliminar_producto", producto_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return {"mensaje": f"Producto {producto_id} eliminado correctamente"}
 
 
 @app.post("/pedidos", response_model=PedidoResponse)
 async def crear_pedido(pedido: PedidoCreate):
     try:
-        items_pedido = []
-        for item_create in pedido.items:
-            nodo_producto = arbol_productos.buscar(item_create.producto_id)
-            if nodo_producto is None:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"Producto con ID {item_create.producto_id} no existe"
-                )
-            
-            if nodo_producto.stock < item_create.cantidad:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Stock insuficiente para producto {item_create.producto_id}"
-                )
-            
-            item_pedido = ItemPedido(
-                producto_id=item_create.producto_id,
-                cantidad=item_create.cantidad,
-                precio_unitario=nodo_producto.precio
-            )
-            items_pedido.append(item_pedido)
-        
-        nodo_pedido = lista_pedidos.agregar_pedido(
+        nuevo = await escribir(
+            "crear_pedido",
             pedido.pedido_id,
             pedido.cliente,
-            items_pedido
-        )
-        
-        items_response = [
-            ItemPedidoResponse(
-                producto_id=item.producto_id,
-                cantidad=item.cantidad,
-                precio_unitario=item.precio_unitario,
-                subtotal=item.subtotal
-            )
-            for item in nodo_pedido.items
-        ]
-        
-        return PedidoResponse(
-            pedido_id=nodo_pedido.pedido_id,
-            cliente=nodo_pedido.cliente,
-            fecha_creacion=nodo_pedido.fecha_creacion.isoformat(),
-            total=nodo_pedido.total,
-            items=items_response
+            [(item.producto_id, item.cantidad) for item in pedido.items]
         )
-    
+        return DefaultResponse(content=nuevo)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/pedidos/{pedido_id}", response_model=PedidoResponse)
 async def obtener_pedido(pedido_id: int):
-    nodo = lista_pedidos.buscar_pedido(pedido_id)
-    if nodo is None:
+    pedido = almacen.obtener_pedido(pedido_id)
+    if pedido is None:
         raise HTTPException(status_code=404, detail="Pedido no encontrado")
     
-    items_response = [
-        ItemPedidoResponse(
-            producto_id=item.producto_id,
-            cantidad=item.cantidad,
-            precio_unitario=item.precio_unitario,
-            subtotal=item.subtotal
-        )
-        for item in nodo.items
-    ]
-    
-    return PedidoResponse(
-        pedido_id=nodo.pedido_id,
-        cliente=nodo.cliente,
-        fecha_creacion=nodo.fecha_creacion.isoformat(),
-        total=nodo.total,
-        items=items_response
-    )
+    return DefaultResponse(content=pedido)
 
 @app.put("/pedidos/{pedido_id}", response_model=PedidoResponse)
 async def actualizar_pedido(pedido_id: int, pedido_update: PedidoUpdate):
-    nodo = lista_pedidos.buscar_pedido(pedido_id)
-    if nodo is None:
-        raise HTTPException(status_code=404, detail="Pedido no encontrado")
-    
     nuevos_items = None
     if pedido_update.items:
-        nuevos_items = []
-        for item_create in pedido_update.items:
-            nodo_producto = arbol_productos.buscar(item_create.producto_id)
-            if nodo_producto is None:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"Producto con ID {item_create.producto_id} no existe"
-                )
-            
-            item_pedido = ItemPedido(
-                producto_id=item_create.producto_id,
-                cantidad=item_create.cantidad,
-                precio_unitario=nodo_producto.precio
-            )
-            nuevos_items.append(item_pedido)
-    
-    lista_pedidos.actualizar_pedido(
-        pedido_id,
-        pedido_update.cliente,
-        nuevos_items
-    )
-    
-    nodo_actualizado = lista_pedidos.buscar_pedido(pedido_id)
+        nuevos_items = [(item.producto_id, item.cantidad) for item in pedido_update.items]
     
-    items_response = [
-        ItemPedidoResponse(
-            producto_id=item.producto_id,
-            cantidad=item.cantidad,
-            precio_unitario=item.precio_unitario,
-            subtotal=item.subtotal
-        )
-        for item in nodo_actualizado.items
-    ]
-    
-    return PedidoResponse(
-        pedido_id=nodo_actualizado.pedido_id,
-        cliente=nodo_actualizado.cliente,
-        fecha_creacion=nodo_actualizado.fecha_creacion.isoformat(),
-        total=nodo_actualizado.total,
-        items=items_response
-    )
+    try:
+        pedido = await escribir("actualizar_pedido", pedido_id, pedido_update.cliente, nuevos_items)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return DefaultResponse(content=pedido)
 
 @app.delete("/pedidos/{pedido_id}")
 async def eliminar_pedido(pedido_id: int):
-    eliminado = lista_pedidos.eliminar_pedido(pedido_id)
-    if not eliminado:
-        raise HTTPException(status_code=404, detail="Pedido no encontrado")
+    try:
+        await escribir("eliminar_pedido", pedido_id)
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     return {"mensaje": f"Pedido {pedido_id} eliminado correctamente"}
 
 @app.get("/pedidos", response_model=List[PedidoResponse])
 async def listar_pedidos():
-    pedidos_dict = lista_pedidos.listar_todos_pedidos()
-    
-    pedidos_response = []
-    for pedido_dict in pedidos_dict:
-        items_response = [
-            ItemPedidoResponse(**item) for item in pedido_dict["items"]
-        ]
-        
-        pedido_response = PedidoResponse(
-            pedido_id=pedido_dict["pedido_id"],
-            cliente=pedido_dict["cliente"],
-            fecha_creacion=pedido_dict["fecha_creacion"],
-            total=pedido_dict["total"],
-            items=items_response
+    return DefaultResponse(content=almacen.listar_pedidos())
+
+@app.get("/cambios")
+async def cambios(
+    desde: Optional[int] = Query(None, ge=0),
+    last_event_id: Optional[int] = Header(None, ge=0)
+):
+    """Eventos de productos y pedidos en orden (Server-Sent Events). Con `desde` o la
+    cabecera Last-Event-ID se reciben también los posteriores a esa secuencia."""
+    if last_event_id is not None:
+        desde = last_event_id
+    if desde is not None and not feed.disponible(desde):
+        raise HTTPException(
+            status_code=410,
+            detail=f"Los eventos posteriores a {desde} no están disponibles, vuelve a leer /productos y /pedidos"
         )
-        pedidos_response.append(pedido_response)
-    
-    return pedidos_response
+    return StreamingResponse(
+        feed.escuchar(desde),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# Perfil por muestreo del proceso, ver perfilador.py. Solo existe con PEDIDOS_ADMIN_TOKEN
+# y hay que mandarlo en la cabecera X-Admin-Token. En modo escalado se perfila el worker
+# que atiende la petición.
+perfilador = Perfilador()
+
+@app.get("/debug/perfil", include_in_schema=False)
+async def debug_perfil(
+    segundos: float = Query(5, gt=0, le=MAX_SEGUNDOS),
+    intervalo: float = Query(0.005, ge=0.001, le=1),
+    inactivos: bool = False,
+    x_admin_token: Optional[str] = Header(None)
+):
+    admin_token = os.getenv("PEDIDOS_ADMIN_TOKEN")
+    if not admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not token_valido(admin_token, x_admin_token):
+        raise HTTPException(status_code=403, detail="Token de administración incorrecto")
+    try:
+        # En otro hilo para que el event loop siga atendiendo peticiones mientras tanto
+        pilas, muestras = await asyncio.to_thread(perfilador.muestrear, segundos, intervalo, inactivos)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(colapsadas(pilas), headers={"X-Profile-Samples": str(muestras)})
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,530 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from typing import List
+from unittest.mock import patch
+
+# Siempre el Almacen de un solo proceso, aunque el entorno tenga el modo escalado
+os.environ.pop("PEDIDOS_ALMACEN", None)
+
+from fastapi.testclient import TestClient
+from pydantic import TypeAdapter
+
+import main
+from almacen import AlmacenCompartido, Escritor, LectorLog
+from cambios import FeedCambios
+from estructuras import Almacen, ArbolProductos, ItemsPedido, ListaPedidos, altura
+from idempotencia import MiddlewareIdempotencia
+
+# Pruebas: cd Estructuras-Datos-Desarrollo-Web && python -m unittest tests
+
+
+def comprobar_avl(test, nodo, minimo=None, maximo=None):
+    """Orden, altura guardada y equilibrio de cada nodo. Devuelve la altura"""
+    if nodo is None:
+        return 0
+    if minimo is not None:
+        test.assertGreater(nodo.producto_id, minimo)
+    if maximo is not None:
+        test.assertLess(nodo.producto_id, maximo)
+    izquierda = comprobar_avl(test, nodo.izquierda, minimo, nodo.producto_id)
+    derecha = comprobar_avl(test, nodo.derecha, nodo.producto_id, maximo)
+    test.assertLessEqual(abs(izquierda - derecha), 1, f"Nodo {nodo.producto_id} desequilibrado")
+    test.assertEqual(nodo.altura, 1 + max(izquierda, derecha))
+    return nodo.altura
+
+
+def ids(arbol):
+    return [producto["producto_id"] for producto in arbol.listar_todos()]
+
+
+class ArbolProductosTests(unittest.TestCase):
+    def setUp(self):
+        self.arbol = ArbolProductos()
+        for producto_id in range(1, 101):
+            self.arbol.insertar(producto_id, f"Producto {producto_id}", 10.0, 5)
+
+    def test_insertar_ordenados_queda_equilibrado(self):
+        comprobar_avl(self, self.arbol.raiz)
+        self.assertLessEqual(altura(self.arbol.raiz), 8)
+
+    def test_eliminar_reequilibra(self):
+        # Quitar toda una mitad obliga a rotar en la otra
+        for producto_id in range(1, 51):
+            self.assertTrue(self.arbol.eliminar(producto_id))
+            comprobar_avl(self, self.arbol.raiz)
+        self.assertEqual(ids(self.arbol), list(range(51, 101)))
+        self.assertEqual(self.arbol.contador, 50)
+        self.assertLessEqual(altura(self.arbol.raiz), 7)
+
+    def test_eliminar_con_dos_hijos(self):
+        raiz = self.arbol.raiz.producto_id
+        self.arbol.eliminar(raiz)
+        comprobar_avl(self, self.arbol.raiz)
+        self.assertNotIn(raiz, ids(self.arbol))
+        self.assertFalse(self.arbol.eliminar(raiz))
+
+    def test_version_anterior_no_cambia(self):
+        antes = ArbolProductos(self.arbol.estado)
+        self.arbol.eliminar(50)
+        self.arbol.actualizar(10, precio=1.0)
+        self.arbol.insertar(500, "Nuevo", 1.0, 1)
+        self.assertEqual(ids(antes), list(range(1, 101)))
+        self.assertEqual(antes.buscar(10).precio, 10.0)
+        self.assertEqual(antes.contador, 100)
+        comprobar_avl(self, antes.raiz)
+
+
+class ListaPedidosTests(unittest.TestCase):
+    def items(self, precio=2.0):
+        return ItemsPedido([{"producto_id": 1, "cantidad": 3, "precio_unitario": precio}])
+
+    def test_version_anterior_no_cambia(self):
+        lista = ListaPedidos()
+        for pedido_id in range(1, 6):
+            lista.agregar_pedido(pedido_id, f"Cliente {pedido_id}", self.items())
+        antes = ListaPedidos(lista.estado)
+        lista.eliminar_pedido(3)
+        lista.actualizar_pedido(1, "Otro", self.items(5.0))
+        lista.agregar_pedido(6, "Cliente 6", self.items())
+
+        pedidos = antes.listar_todos_pedidos()
+        self.assertEqual([pedido["pedido_id"] for pedido in pedidos], [1, 2, 3, 4, 5])
+        self.assertEqual((pedidos[0]["cliente"], pedidos[0]["total"]), ("Cliente 1", 6.0))
+        self.assertEqual([pedido["pedido_id"] for pedido in lista.listar_todos_pedidos()], [1, 2, 4, 5, 6])
+
+
+class AlmacenTests(unittest.TestCase):
+    def setUp(self):
+        self.almacen = Almacen()
+        for producto_id in range(1, 11):
+            self.almacen.crear_producto(producto_id, f"Producto {producto_id}", 10.0, 5)
+
+    def test_actualizar_varios_todos_o_ninguno(self):
+        antes = self.almacen.listar_productos()
+        secuencia = self.almacen.secuencia
+        with self.assertRaises(LookupError):
+            self.almacen.actualizar_productos([
+                {"producto_id": 1, "precio": 1.0},
+                {"producto_id": 99, "precio": 1.0}
+            ])
+        with self.assertRaises(ValueError):
+            self.almacen.actualizar_productos([
+                {"producto_id": 1, "precio": 1.0},
+                {"producto_id": 1, "stock": 0}
+            ])
+        self.assertEqual(self.almacen.listar_productos(), antes)
+        self.assertEqual(self.almacen.secuencia, secuencia)
+
+    def test_actualizar_varios(self):
+        resultado = self.almacen.actualizar_productos([
+            {"producto_id": producto_id, "precio": 1.0, "nombre": None} for producto_id in (2, 7, 9)
+        ])
+        self.assertEqual(resultado, {"actualizados": 3})
+        precios = {producto["producto_id"]: producto["precio"] for producto in self.almacen.listar_productos()}
+        self.assertEqual([precios[producto_id] for producto_id in (1, 2, 7, 9)], [10.0, 1.0, 1.0, 1.0])
+        self.assertEqual(self.almacen.obtener_producto(2)["nombre"], "Producto 2")
+
+    def test_instantanea_no_cambia(self):
+        self.almacen.crear_pedido(1, "Ana", [(1, 2)])
+        instantanea = self.almacen.instantanea()
+        antes = (instantanea.listar_productos(), instantanea.listar_pedidos(), instantanea.resumen())
+
+        self.almacen.actualizar_productos([{"producto_id": 1, "precio": 1.0}])
+        self.almacen.eliminar_producto(2)
+        self.almacen.actualizar_pedido(1, "Luis", [(3, 1)])
+        self.almacen.crear_pedido(2, "Eva", [(4, 1)])
+
+        self.assertEqual((instantanea.listar_productos(), instantanea.listar_pedidos(), instantanea.resumen()), antes)
+        self.assertEqual(instantanea.secuencia, 11)
+        self.assertEqual(self.almacen.exportar()["secuencia"], 15)
+
+    def test_exportar_y_restaurar(self):
+        self.almacen.crear_pedido(1, "Ana", [(1, 2), (3, 1)])
+        self.almacen.crear_pedido(2, "Luis", [(2, 1)])
+        eventos = []
+        copia = Almacen()
+        copia.suscriptores.append(eventos.append)
+        copia.restaurar(self.almacen.exportar())
+        self.assertEqual(copia.listar_productos(), self.almacen.listar_productos())
+        self.assertEqual(copia.listar_pedidos(), self.almacen.listar_pedidos())
+        self.assertEqual(eventos, [{"tipo": "estado_restaurado", "secuencia": 12}])
+        comprobar_avl(self, copia.arbol_productos.raiz)
+
+    def test_replica_con_los_mismos_eventos_queda_igual(self):
+        replica = Almacen()
+        nuevo = Almacen()
+        nuevo.suscriptores.append(replica.aplicar)
+        nuevo.crear_producto(1, "A", 2.5, 10)
+        nuevo.crear_pedido(1, "Ana", [(1, 2), (1, 1)])
+        nuevo.actualizar_pedido(1, "Ana María")
+        self.assertEqual(replica.listar_pedidos(), nuevo.listar_pedidos())
+        self.assertEqual(replica.listar_pedidos()[0]["items"][0]["cantidad"], 3)
+        self.assertEqual(replica.secuencia, nuevo.secuencia)
+
+
+class EscritorTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.ruta_log = os.path.join(tmp.name, "pedidos.log")
+
+    def escribir(self, escritor, desde, hasta):
+        for producto_id in range(desde, hasta):
+            escritor.escribir("crear_producto", producto_id, "P", 1.0, 5)
+
+    def test_compacta_el_log(self):
+        escritor = Escritor(self.ruta_log, compactar_cada=5)
+        lector = LectorLog(self.ruta_log)
+        self.addCleanup(lector.cerrar)
+        self.escribir(escritor, 1, 4)
+        self.assertEqual([evento["secuencia"] for evento in lector.leer()], [1, 2, 3])
+        self.escribir(escritor, 4, 8)
+        # El lector acaba el log anterior y sigue con el nuevo
+        self.assertEqual([evento["secuencia"] for evento in lector.leer()], [4, 5, 6, 7])
+        with open(self.ruta_log) as log:
+            self.assertEqual(len(log.readlines()), 2)
+        escritor.log.close()
+
+        reiniciado = Escritor(self.ruta_log)
+        self.assertEqual(reiniciado.almacen.listar_productos(), escritor.almacen.listar_productos())
+        self.assertEqual(reiniciado.almacen.secuencia, 7)
+        reiniciado.log.close()
+
+    def test_solo_escrituras_conocidas(self):
+        escritor = Escritor(self.ruta_log)
+        with self.assertRaises(ValueError):
+            escritor.escribir("restaurar", {})
+        escritor.log.close()
+
+
+class AlmacenCompartidoTests(unittest.TestCase):
+    """Escritor en otro proceso (python almacen.py) y réplicas en este"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        with socket.socket() as libre:
+            libre.bind(("127.0.0.1", 0))
+            self.direccion = libre.getsockname()
+        self.ruta_log = os.path.join(tmp.name, "pedidos.log")
+        entorno = dict(
+            os.environ,
+            PEDIDOS_ALMACEN="%s:%d" % self.direccion,
+            PEDIDOS_ALMACEN_CLAVE="clave",
+            PEDIDOS_LOG=self.ruta_log,
+            PEDIDOS_LOG_COMPACTAR="5",
+        )
+        escritor = subprocess.Popen([sys.executable, "almacen.py"], env=entorno, stdout=subprocess.DEVNULL)
+        self.addCleanup(escritor.wait)
+        self.addCleanup(escritor.terminate)
+
+    def conectar(self, clave=b"clave"):
+        for _ in range(100):
+            try:
+                replica = AlmacenCompartido(self.direccion, clave, self.ruta_log)
+                self.addCleanup(replica.lector.cerrar)
+                return replica
+            except ConnectionRefusedError:
+                time.sleep(0.05)
+        self.fail("El escritor no arranca")
+
+    def test_replica_parada_se_pone_al_dia(self):
+        activa = self.conectar()
+        parada = self.conectar()
+
+        async def escribir():
+            for producto_id in range(1, 14):
+                await activa.escribir("crear_producto", producto_id, "P", 1.0, 5)
+        asyncio.run(escribir())
+
+        # Se ha perdido dos compactaciones enteras: carga la instantánea
+        self.assertEqual(parada.listar_productos(), activa.listar_productos())
+        self.assertEqual(parada.replica.secuencia, 13)
+        self.assertEqual(self.conectar().replica.secuencia, 13)
+
+    def test_solo_se_puede_llamar_a_escribir(self):
+        replica = self.conectar()
+        with self.assertRaises(AttributeError):
+            replica.escritor.guardar({"tipo": "producto_eliminado"})
+
+    def test_clave_incorrecta(self):
+        self.conectar()
+        with self.assertRaises(Exception):
+            AlmacenCompartido(self.direccion, b"otra", self.ruta_log)
+
+
+class ApiTestCase(unittest.TestCase):
+    """Cliente con un Almacen y un feed de cambios nuevos en cada prueba"""
+
+    capacidad = 10000
+
+    def setUp(self):
+        main.almacen = main.replica = Almacen()
+        main.feed = FeedCambios(capacidad=self.capacidad)
+        main.almacen.suscriptores.append(main.feed.publicar)
+        self.client = TestClient(main.app)
+        self.client.__enter__()
+        self.addCleanup(self.client.__exit__, None, None, None)
+
+    def producto(self, producto_id, stock=5, precio=10.0):
+        respuesta = self.client.post("/productos", json={
+            "producto_id": producto_id, "nombre": f"Producto {producto_id}", "precio": precio, "stock": stock
+        })
+        self.assertEqual(respuesta.status_code, 200)
+
+
+class ModelosRespuestaTests(ApiTestCase):
+    """Las respuestas se construyen sin pydantic: tienen que seguir cumpliendo los modelos"""
+
+    def comprobar(self, ruta, modelo):
+        respuesta = self.client.get(ruta)
+        adaptador = TypeAdapter(modelo)
+        valor = adaptador.validate_json(respuesta.content, strict=True)
+        # Ni campos de más ni de menos
+        self.assertEqual(adaptador.dump_python(valor), respuesta.json())
+        return respuesta.json()
+
+    def test_productos_y_pedidos(self):
+        self.producto(1, precio=2.5)
+        self.producto(2)
+        self.client.post("/pedidos", json={"pedido_id": 1, "cliente": "Ana", "items": [{"producto_id": 1, "cantidad": 2}]})
+        self.client.put("/pedidos/1", json={"items": [{"producto_id": 2, "cantidad": 1}]})
+        self.comprobar("/productos", List[main.Producto])
+        self.comprobar("/productos/1", main.Producto)
+        self.comprobar("/pedidos", List[main.PedidoResponse])
+        pedido = self.comprobar("/pedidos/1", main.PedidoResponse)
+        # La versión guardada del pedido se rehace al actualizarlo
+        self.assertEqual((pedido["total"], pedido["items"][0]["producto_id"]), (10.0, 2))
+
+class RespuestasTests(ApiTestCase):
+    def test_enteros_de_mas_de_64_bits(self):
+        # orjson no los serializa, la respuesta sale con el json estándar
+        self.producto(1, stock=2 ** 64)
+        listado = self.client.get("/productos")
+        self.assertEqual(listado.status_code, 200)
+        self.assertEqual(listado.json()[0]["stock"], 2 ** 64)
+
+
+class PedidosApiTests(ApiTestCase):
+    def pedido(self, pedido_id, *items):
+        return self.client.post("/pedidos", json={
+            "pedido_id": pedido_id,
+            "cliente": "Ana",
+            "items": [{"producto_id": producto_id, "cantidad": cantidad} for producto_id, cantidad in items]
+        })
+
+    def test_enteros_fuera_de_rango(self):
+        respuesta = self.client.post("/productos", json={"producto_id": 2 ** 63, "nombre": "P", "precio": 1.0, "stock": 1})
+        self.assertEqual(respuesta.status_code, 400)
+        self.assertEqual(self.client.get("/productos").json(), [])
+        self.producto(1, stock=2 ** 70)
+        self.assertEqual(self.pedido(1, (2 ** 63, 1)).status_code, 400)
+        self.assertEqual(self.pedido(1, (1, 2 ** 63)).status_code, 400)
+        # Dos líneas del mismo producto se juntan: la suma también tiene que caber
+        self.assertEqual(self.pedido(1, (1, 2 ** 62), (1, 2 ** 62)).status_code, 400)
+        self.assertEqual(self.client.get("/pedidos").json(), [])
+        self.assertEqual(self.pedido(1, (1, 2 ** 63 - 1)).status_code, 200)
+
+    def test_actualizar_con_enteros_fuera_de_rango(self):
+        self.producto(1)
+        self.assertEqual(self.pedido(1, (1, 1)).status_code, 200)
+        for items in ([{"producto_id": 1, "cantidad": 2 ** 70}], [{"producto_id": 2 ** 70, "cantidad": 1}]):
+            self.assertEqual(self.client.put("/pedidos/1", json={"items": items}).status_code, 400)
+        self.assertEqual(self.client.get("/pedidos/1").json()["items"][0]["cantidad"], 1)
+
+    def test_pedido_sin_lineas(self):
+        respuesta = self.pedido(1)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()["total"], 0.0)
+        self.assertIsInstance(ItemsPedido([]).total, float)
+
+
+class ActualizarProductosApiTests(ApiTestCase):
+    def test_uno_que_no_existe_no_cambia_ninguno(self):
+        self.producto(1)
+        self.producto(2)
+        respuesta = self.client.patch("/productos", json=[
+            {"producto_id": 1, "precio": 1.0},
+            {"producto_id": 3, "precio": 1.0}
+        ])
+        self.assertEqual(respuesta.status_code, 404)
+        self.assertEqual([p["precio"] for p in self.client.get("/productos").json()], [10.0, 10.0])
+
+    def test_repetidos(self):
+        self.producto(1)
+        respuesta = self.client.patch("/productos", json=[{"producto_id": 1}, {"producto_id": 1}])
+        self.assertEqual(respuesta.status_code, 400)
+
+    def test_lista_vacia(self):
+        self.producto(1)
+        secuencia = main.almacen.secuencia
+        respuesta = self.client.patch("/productos", json=[])
+        self.assertEqual((respuesta.status_code, respuesta.json()), (200, {"actualizados": 0}))
+        self.assertEqual(main.almacen.secuencia, secuencia)
+
+
+class IdempotenciaTests(ApiTestCase):
+    def pedido(self, pedido_id, cantidad=1, clave=None):
+        # Las claves viven en el middleware de la app durante todo el proceso: una por test
+        return self.client.post(
+            "/pedidos",
+            json={"pedido_id": pedido_id, "cliente": "Ana", "items": [{"producto_id": 1, "cantidad": cantidad}]},
+            headers={"Idempotency-Key": clave or self.id()}
+        )
+
+    def test_reintento_devuelve_el_mismo_pedido(self):
+        self.producto(1)
+        primera = self.pedido(1)
+        segunda = self.pedido(1)
+        self.assertEqual(primera.status_code, 200)
+        self.assertEqual(segunda.json(), primera.json())
+        self.assertEqual(segunda.headers["idempotent-replayed"], "true")
+        self.assertEqual(len(self.client.get("/pedidos").json()), 1)
+
+    def test_misma_clave_con_otro_cuerpo(self):
+        self.producto(1)
+        self.pedido(1)
+        self.assertEqual(self.pedido(1, cantidad=2).status_code, 422)
+
+
+class PerfilTests(ApiTestCase):
+    def test_sin_token_configurado_no_existe(self):
+        with patch.dict(os.environ, {"PEDIDOS_ADMIN_TOKEN": ""}):
+            self.assertEqual(self.client.get("/debug/perfil", params={"segundos": 0.01}).status_code, 404)
+
+    @patch.dict(os.environ, {"PEDIDOS_ADMIN_TOKEN": "secreto"})
+    def test_token_incorrecto(self):
+        respuesta = self.client.get("/debug/perfil", params={"segundos": 0.01}, headers={"X-Admin-Token": "otro"})
+        self.assertEqual(respuesta.status_code, 403)
+
+    @patch.dict(os.environ, {"PEDIDOS_ADMIN_TOKEN": "secreto"})
+    def test_pilas_colapsadas(self):
+        cabeceras = {"X-Admin-Token": "secreto"}
+        self.assertEqual(self.client.get("/debug/perfil", params={"segundos": 120}, headers=cabeceras).status_code, 422)
+        parar = threading.Event()
+        hilo = threading.Thread(target=ocupado, args=(parar,))
+        hilo.start()
+        try:
+            respuesta = self.client.get("/debug/perfil", params={"segundos": 0.2}, headers=cabeceras)
+        finally:
+            parar.set()
+            hilo.join()
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertGreater(int(respuesta.headers["X-Profile-Samples"]), 0)
+        self.assertIn("tests.py:ocupado", respuesta.text)
+
+
+def ocupado(parar):
+    while not parar.is_set():
+        time.sleep(0)
+
+class IdempotenciaDescarteTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.ejecuciones = []
+        self.soltar = asyncio.Event()
+        self.middleware = MiddlewareIdempotencia(self.app, rutas=[("POST", "/pedidos")], max_entradas=1)
+
+    async def app(self, scope, receive, send):
+        body = (await receive())["body"]
+        self.ejecuciones.append(body)
+        if body == b"lento":
+            await self.soltar.wait()
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": body})
+
+    async def llamar(self, body, clave):
+        """POST /pedidos directo al middleware; devuelve las cabeceras de la respuesta"""
+        mensajes = []
+        scope = {"type": "http", "method": "POST", "path": "/pedidos", "headers": [(b"idempotency-key", clave)]}
+
+        async def receive():
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        async def send(mensaje):
+            mensajes.append(mensaje)
+
+        await self.middleware(scope, receive, send)
+        return dict(mensajes[0]["headers"])
+
+    async def test_no_descarta_los_que_estan_en_curso(self):
+        lento = asyncio.create_task(self.llamar(b"lento", b"a"))
+        await asyncio.sleep(0.01)
+        # Con max_entradas=1 este obliga a descartar, pero el primero sigue en curso
+        await self.llamar(b"otro", b"b")
+        reintento = asyncio.create_task(self.llamar(b"lento", b"a"))
+        await asyncio.sleep(0.01)
+        self.soltar.set()
+        await lento
+        self.assertIn(b"idempotent-replayed", await reintento)
+        self.assertEqual(self.ejecuciones, [b"lento", b"otro"])
+        self.assertEqual(len(self.middleware.entradas), 1)
+
+class CambiosTests(unittest.IsolatedAsyncioTestCase):
+    async def test_reanudar_desde_una_secuencia(self):
+        almacen = Almacen()
+        feed = FeedCambios()
+        almacen.suscriptores.append(feed.publicar)
+        for producto_id in range(1, 4):
+            almacen.crear_producto(producto_id, "P", 1.0, 1)
+
+        mensajes = feed.escuchar(desde=1)
+        self.assertEqual(await anext(mensajes), b"retry: 1000\n\n")
+        self.assertTrue((await anext(mensajes)).startswith(b"id: 2\nevent: producto_creado\n"))
+        self.assertTrue((await anext(mensajes)).startswith(b"id: 3\n"))
+        # Lo que llega después se entrega en directo
+        almacen.eliminar_producto(1)
+        self.assertTrue((await anext(mensajes)).startswith(b"id: 4\nevent: producto_eliminado\n"))
+        await mensajes.aclose()
+        self.assertEqual(feed.suscripciones, set())
+
+    async def test_cola_llena_cierra_la_suscripcion(self):
+        almacen = Almacen()
+        feed = FeedCambios(cola_maxima=2)
+        almacen.suscriptores.append(feed.publicar)
+        mensajes = feed.escuchar()
+        await anext(mensajes)
+        for producto_id in range(1, 5):
+            almacen.crear_producto(producto_id, "P", 1.0, 1)
+        self.assertTrue((await anext(mensajes)).startswith(b"event: desbordado\n"))
+        with self.assertRaises(StopAsyncIteration):
+            await anext(mensajes)
+
+
+class CambiosApiTests(ApiTestCase):
+    capacidad = 2
+
+    def test_eventos_que_ya_no_estan(self):
+        for producto_id in range(1, 6):
+            self.producto(producto_id)
+        self.assertTrue(main.feed.disponible(3))
+        self.assertEqual(self.client.get("/cambios", params={"desde": 1}).status_code, 410)
+        self.assertEqual(self.client.get("/cambios", headers={"Last-Event-ID": "2"}).status_code, 410)
+
+    def test_secuencia_futura(self):
+        self.producto(1)
+        self.assertTrue(main.feed.disponible(1))
+        self.assertEqual(self.client.get("/cambios", params={"desde": 2}).status_code, 410)
+        self.assertEqual(self.client.get("/cambios", headers={"Last-Event-ID": "99"}).status_code, 410)
+
+    def test_secuencia_negativa(self):
+        self.assertEqual(self.client.get("/cambios", params={"desde": -1}).status_code, 422)
+        self.assertEqual(self.client.get("/cambios", headers={"Last-Event-ID": "-1"}).status_code, 422)
+        self.assertEqual(self.client.get("/cambios", headers={"Last-Event-ID": "x"}).status_code, 422)
+
+
+class ArranqueTests(unittest.TestCase):
+    def test_modo_local_no_importa_multiprocessing_managers(self):
+        # En un proceso nuevo: en este ya lo importan las pruebas del modo escalado
+        codigo = "import sys, main; print('multiprocessing.managers' in sys.modules)"
+        salida = subprocess.run([sys.executable, "-c", codigo], capture_output=True, text=True, check=True)
+        self.assertEqual(salida.stdout.strip(), "False")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,187 @@
+import argparse
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+# Spotify falso para las pruebas de carga (ver load_test.py)
+# Responde a lo que usan las dos APIs: POST /api/token, GET /v1/search y
+# GET /v1/tracks/{id} y /v1/artists/{id} (el enriquecimiento en segundo plano de FastAPI).
+# Las respuestas son deterministas (la misma búsqueda da los mismos resultados) y tienen
+# los campos que leen las APIs. Se puede añadir latencia y una proporción de errores
+# 503 para ver cómo se comportan las APIs cuando Spotify va lento o falla.
+#
+# Uso suelto: python fake_spotify.py --port 9100 --latency 80 --jitter 20 --error-rate 0.02
+# y arrancar las APIs con SPOTIFY_ACCOUNTS_URL y SPOTIFY_API_URL=http://127.0.0.1:9100
+
+GENRES = ["rock", "pop", "jazz", "indie", "electronic", "flamenco", "hip hop", "metal"]
+
+
+def spotify_id(*parts):
+    return hashlib.sha1(":".join(map(str, parts)).encode()).hexdigest()[:22]
+
+
+def number_for(item_id):
+    """Número estable a partir de un id cualquiera, para inventar el resto de campos"""
+    return int(hashlib.sha1(item_id.encode()).hexdigest()[:8], 16)
+
+
+def fake_artist(artist_id, name):
+    number = number_for(artist_id)
+    return {
+        "id": artist_id,
+        "name": name,
+        "genres": [GENRES[number % len(GENRES)], GENRES[number // 7 % len(GENRES)]],
+        "followers": {"total": number % 1_000_000},
+        "popularity": number % 100,
+        "external_urls": {"spotify": f"https://open.spotify.com/artist/{artist_id}"},
+    }
+
+
+def fake_track(track_id, name):
+    number = number_for(track_id)
+    artist_name = f"Artist {number % 500}"
+    return {
+        "id": track_id,
+        "name": name,
+        "artists": [{"id": spotify_id("artist", artist_name), "name": artist_name}],
+        "album": {"id": spotify_id("album", number % 2000), "name": f"Album {number % 2000}"},
+        "popularity": number % 100,
+        "duration_ms": 120_000 + number % 240_000,
+        "external_urls": {"spotify": f"https://open.spotify.com/track/{track_id}"},
+    }
+
+
+def search(query, search_type, limit):
+    items = []
+    for i in range(limit):
+        name = f"{query.strip().title()} {i}"
+        if search_type == "artist":
+            items.append(fake_artist(spotify_id("artist", name), name))
+        else:
+            items.append(fake_track(spotify_id("track", query, i), name))
+    key = "artists" if search_type == "artist" else "tracks"
+    return {key: {"items": items, "total": limit, "limit": limit, "offset": 0}}
+
+
+class Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Las APIs cortan conexiones al pararse al final de la prueba, no es un error
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeSpotify:
+    """Servidor HTTP en un hilo. latency y jitter en segundos, error_rate entre 0 y 1"""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = Counter()  # "ruta status" -> número de peticiones
+        self.server = None
+        self.thread = None
+
+    def delay_and_fail(self):
+        """Dormir la latencia configurada. Devuelve True si esta petición debe fallar"""
+        with self.lock:
+            delay = max(0.0, self.random.gauss(self.latency, self.jitter)) if self.jitter else self.latency
+            fail = self.random.random() < self.error_rate
+        if delay:
+            time.sleep(delay)
+        return fail
+
+    def record(self, path, status):
+        with self.lock:
+            self.requests[f"{path} {status}"] += 1
+
+    def start(self, host="127.0.0.1", port=0):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, como el Spotify de verdad
+
+            def log_message(self, format, *args):
+                pass
+
+            def send_json(self, status, body, route):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                fake.record(route, status)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                self.rfile.read(length)
+                if urlparse(self.path).path != "/api/token":
+                    return self.send_json(404, {"error": "not found"}, "other")
+                if fake.delay_and_fail():
+                    return self.send_json(503, {"error": "service unavailable"}, "token")
+                if not self.headers.get("Authorization", "").startswith("Basic "):
+                    return self.send_json(400, {"error": "invalid_client"}, "token")
+                self.send_json(200, {
+                    "access_token": spotify_id("token", time.time()),
+                    "token_type": "Bearer",
+                    "expires_in": 3600,
+                }, "token")
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                parts = url.path.strip("/").split("/")
+                route = "search" if url.path == "/v1/search" else (parts[1] if len(parts) == 3 else "other")
+                if route == "other":
+                    return self.send_json(404, {"error": "not found"}, route)
+                if fake.delay_and_fail():
+                    return self.send_json(503, {"error": {"status": 503, "message": "Service unavailable"}}, route)
+                if not self.headers.get("Authorization", "").startswith("Bearer "):
+                    return self.send_json(401, {"error": {"status": 401, "message": "No token provided"}}, route)
+
+                if route == "search":
+                    params = parse_qs(url.query)
+                    query = params.get("q", [""])[0]
+                    limit = min(int(params.get("limit", ["10"])[0]), 50)
+                    return self.send_json(200, search(query, params.get("type", ["track"])[0], limit), route)
+                if route == "tracks":
+                    return self.send_json(200, fake_track(parts[2], f"Track {parts[2][:6]}"), route)
+                if route == "artists":
+                    return self.send_json(200, fake_artist(parts[2], f"Artist {parts[2][:6]}"), route)
+                self.send_json(404, {"error": "not found"}, route)
+
+        self.server = Server((host, port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return f"http://{host}:{self.server.server_address[1]}"
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Spotify falso para pruebas de carga")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0, help="ms de latencia media")
+    parser.add_argument("--jitter", type=float, default=0, help="desviación de la latencia en ms")
+    parser.add_argument("--error-rate", type=float, default=0, help="proporción de respuestas 503")
+    arguments = parser.parse_args()
+
+    fake = FakeSpotify(arguments.latency / 1000, arguments.jitter / 1000, arguments.error_rate)
+    print(f"Spotify falso en {fake.start(arguments.host, arguments.port)} (Ctrl+C para parar)")
+    try:
+        fake.thread.join()
+    except KeyboardInterrupt:
+        fake.stop()
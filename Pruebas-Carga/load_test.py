@@ -0,0 +1,461 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import httpx
+
+from fake_spotify import FakeSpotify
+
+
+# Prueba de carga de las dos APIs de música con la misma mezcla de peticiones
+# Arranca un Spotify falso (fake_spotify.py) y cada API en un proceso uvicorn con su base
+# de datos en un directorio temporal, crea unos usuarios con preferencias de partida y
+# lanza `--concurrency` usuarios virtuales durante `--duration` segundos. Cada usuario
+# virtual elige la siguiente operación al azar según los pesos de la mezcla y manda la
+# siguiente petición en cuanto llega la respuesta (carga cerrada).
+#
+# Para cada API y cada operación se informa de peticiones por segundo, latencias
+# p50/p95/p99 y proporción de errores (respuestas 4xx/5xx o fallos de conexión). Cada
+# ejecución se añade como una línea a `--output` (resultados.jsonl) y se compara con la
+# última ejecución guardada con la misma configuración, para ver regresiones.
+#
+# Uso: python load_test.py --mix mixed --concurrency 20 --duration 30
+#      python load_test.py --mix search --spotify-latency 150 --spotify-errors 0.05
+#      python load_test.py --mix create_user=1,local_search=4 --services django
+#      python load_test.py --url fastapi=http://10.0.0.5:8000   (API ya arrancada)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Pesos de cada operación en las mezclas predefinidas
+MIXES = {
+    "mixed": {
+        "create_user": 5, "add_preference": 15, "list_users": 20, "preferences": 20,
+        "recommendations": 10, "spotify_search": 15, "local_search": 15,
+    },
+    "read": {"list_users": 35, "preferences": 35, "recommendations": 15, "local_search": 15},
+    "write": {"create_user": 30, "add_preference": 70},
+    "search": {"spotify_search": 50, "local_search": 50},
+}
+
+# Búsquedas de la prueba y catálogo de canciones para las preferencias
+QUERIES = [
+    "rosalia", "bad bunny", "queen", "daft punk", "radiohead", "metallica", "nirvana",
+    "beyonce", "coldplay", "estopa", "vetusta morla", "miles davis", "bjork", "arctic monkeys",
+]
+CATALOG = [(f"track{n:04d}", f"Track {n}") for n in range(300)]
+PAGE_SIZE = 20
+
+
+class FastAPITarget:
+    name = "fastapi"
+    health = "/health"
+
+    def command(self, tmp, settings):
+        env = {
+            "MUSIC_API_DB_PATH": os.path.join(tmp, "music_api.sqlite3"),
+            "MUSIC_API_JOBS_PATH": os.path.join(tmp, "jobs.sqlite3"),
+        }
+        return ["main:app"], os.path.join(ROOT, "API-REST", "music_api"), env, []
+
+    def create_user(self, n):
+        return "POST", "/users", {"json": {"name": f"user{n}", "email": f"user{n}@load.test", "age": 18 + n % 60}}
+
+    def add_preference(self, user_id, spotify_id, name):
+        return "POST", f"/users/{user_id}/preferences", {"json": {"spotify_id": spotify_id, "name": name, "type": "song"}}
+
+    def list_users(self):
+        return "GET", "/users", {"params": {"limit": PAGE_SIZE}}
+
+    def preferences(self, user_id):
+        return "GET", f"/users/{user_id}/preferences", {"params": {"limit": PAGE_SIZE}}
+
+    def recommendations(self, user_id):
+        return "GET", f"/users/{user_id}/recommendations", {}
+
+    def spotify_search(self, query):
+        return "GET", "/spotify/search/tracks", {"params": {"q": query, "limit": 10}}
+
+    def local_search(self, query):
+        return "GET", "/search", {"params": {"q": query}}
+
+
+class DjangoTarget:
+    name = "django"
+    health = "/api/health/"
+
+    def command(self, tmp, settings):
+        cwd = os.path.join(ROOT, "Django", "music_api")
+        env = {"DJANGO_DB_PATH": os.path.join(tmp, "db.sqlite3"), "DJANGO_SETTINGS_MODULE": settings}
+        migrate = [sys.executable, "manage.py", "migrate", "--verbosity", "0"]
+        return ["music_api.asgi:application"], cwd, env, [migrate]
+
+    def create_user(self, n):
+        return "POST", "/api/users/create/", {"json": {"name": f"user{n}", "email": f"user{n}@load.test", "age": 18 + n % 60}}
+
+    def add_preference(self, user_id, spotify_id, name):
+        # Django no tiene alta de una sola preferencia, se usa la masiva con una fila
+        return "POST", "/api/preferences/bulk/", {"json": [
+            {"user_id": user_id, "spotify_id": spotify_id, "name": name, "type": "song"}
+        ]}
+
+    def list_users(self):
+        return "GET", "/api/users/", {"params": {"limit": PAGE_SIZE}}
+
+    def preferences(self, user_id):
+        return "GET", f"/api/users/{user_id}/preferences/", {"params": {"limit": PAGE_SIZE}}
+
+    def recommendations(self, user_id):
+        return "GET", f"/api/users/{user_id}/recommendations/", {}
+
+    def spotify_search(self, query):
+        return "GET", "/api/spotify/search/tracks/", {"params": {"q": query, "limit": 10}}
+
+    def local_search(self, query):
+        return "GET", "/api/search/", {"params": {"q": query}}
+
+
+TARGETS = {target.name: target for target in (FastAPITarget(), DjangoTarget())}
+
+
+def parse_mix(value):
+    """Nombre de una mezcla predefinida o pesos sueltos: create_user=1,local_search=4"""
+    if value in MIXES:
+        return dict(MIXES[value])
+    weights = {}
+    for part in value.split(","):
+        op, _, weight = part.partition("=")
+        if op not in MIXES["mixed"]:
+            raise argparse.ArgumentTypeError(f"Operación desconocida: {op}")
+        weights[op] = float(weight or 1)
+    return weights
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values, p):
+    """Percentil por rango más cercano de una lista ya ordenada"""
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, round(p / 100 * len(values) + 0.5) - 1))]
+
+
+class Workload:
+    """Estado compartido por los usuarios virtuales de una API: ids creados y preferencias"""
+
+    def __init__(self, target, seed):
+        self.target = target
+        self.random = random.Random(seed)
+        self.numbers = itertools.count()
+        self.user_ids = []
+        self.preferences = defaultdict(set)
+        self.records = []  # (operación, status, segundos, momento)
+        self.recording = False
+
+    def popular_track(self, rng):
+        # Unas pocas canciones mucho más populares que el resto, para que haya recomendaciones
+        index = int(rng.paretovariate(1.2)) - 1
+        return CATALOG[index] if index < len(CATALOG) else rng.choice(CATALOG)
+
+    def request(self, op, rng):
+        """(método, ruta, argumentos de httpx) de la operación, o None si aún no se puede"""
+        if op == "create_user":
+            return self.target.create_user(next(self.numbers))
+        if op in ("spotify_search", "local_search"):
+            return getattr(self.target, op)(rng.choice(QUERIES))
+        if op == "list_users":
+            return self.target.list_users()
+        if not self.user_ids:
+            return None
+        user_id = rng.choice(self.user_ids)
+        if op == "add_preference":
+            spotify_id, name = self.popular_track(rng)
+            if spotify_id in self.preferences[user_id]:
+                spotify_id, name = rng.choice(CATALOG)
+                if spotify_id in self.preferences[user_id]:
+                    return None
+            self.preferences[user_id].add(spotify_id)
+            return self.target.add_preference(user_id, spotify_id, name)
+        return getattr(self.target, op)(user_id)
+
+    async def call(self, client, op, rng):
+        request = self.request(op, rng)
+        if request is None:
+            return
+        method, path, kwargs = request
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, **kwargs)
+            status = response.status_code
+        except httpx.HTTPError:
+            response, status = None, 0
+        elapsed = time.perf_counter() - start
+        if op == "create_user" and status == 200:
+            self.user_ids.append(response.json()["id"])
+        if self.recording:
+            self.records.append((op, status, elapsed, time.perf_counter()))
+
+    async def virtual_user(self, client, weights, rng, stop_at):
+        ops, cumulative = list(weights), list(itertools.accumulate(weights.values()))
+        while time.perf_counter() < stop_at:
+            await self.call(client, rng.choices(ops, cum_weights=cumulative)[0], rng)
+
+    async def seed_data(self, client, users, preferences):
+        rng = random.Random(self.random.random())
+        for _ in range(users):
+            await self.call(client, "create_user", rng)
+        for _ in range(len(self.user_ids) * preferences):
+            await self.call(client, "add_preference", rng)
+
+    async def run(self, base_url, weights, concurrency, duration, warmup, seed_users, seed_preferences):
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+            await self.seed_data(client, seed_users, seed_preferences)
+            start = time.perf_counter()
+            measure_from = start + warmup
+            stop_at = measure_from + duration
+
+            async def start_recording():
+                await asyncio.sleep(warmup)
+                self.recording = True
+
+            rngs = [random.Random(self.random.random()) for _ in range(concurrency)]
+            await asyncio.gather(
+                start_recording(),
+                *(self.virtual_user(client, weights, rng, stop_at) for rng in rngs),
+            )
+        return time.perf_counter() - measure_from
+
+
+def summarize(records, elapsed):
+    def stats(rows):
+        latencies = sorted(row[2] for row in rows)
+        client_errors = sum(1 for row in rows if 400 <= row[1] < 500)
+        server_errors = sum(1 for row in rows if row[1] == 0 or row[1] >= 500)
+        return {
+            "requests": len(rows),
+            "throughput": len(rows) / elapsed if elapsed else 0,
+            "p50_ms": percentile(latencies, 50) * 1000 if latencies else None,
+            "p95_ms": percentile(latencies, 95) * 1000 if latencies else None,
+            "p99_ms": percentile(latencies, 99) * 1000 if latencies else None,
+            "max_ms": latencies[-1] * 1000 if latencies else None,
+            "errors_4xx": client_errors,
+            "errors_5xx": server_errors,
+            "error_rate": (client_errors + server_errors) / len(rows) if rows else 0,
+        }
+
+    by_op = defaultdict(list)
+    for row in records:
+        by_op[row[0]].append(row)
+    return {"total": stats(records), "ops": {op: stats(rows) for op, rows in sorted(by_op.items())}}
+
+
+def wait_until_ready(url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"El servidor ha terminado con código {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} no responde después de {timeout} s")
+
+
+def start_service(target, tmp, arguments, spotify_url):
+    """Arrancar la API con uvicorn en un puerto libre. Devuelve (url, proceso)"""
+    port = free_port()
+    app, cwd, extra_env, setup = target.command(tmp, arguments.django_settings)
+    env = dict(
+        os.environ,
+        SPOTIFY_CLIENT_ID="load-test",
+        SPOTIFY_CLIENT_SECRET="load-test",
+        SPOTIFY_ACCOUNTS_URL=spotify_url,
+        SPOTIFY_API_URL=spotify_url,
+        SPOTIFY_CACHE_PATH=os.path.join(tmp, "spotify_cache.sqlite3") if arguments.spotify_cache else "",
+        **extra_env,
+    )
+    for command in setup:
+        subprocess.run(command, cwd=cwd, env=env, check=True)
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", *app, "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(arguments.workers), "--log-level", "warning", "--no-access-log"],
+        cwd=cwd, env=env,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_ready(url + target.health, process)
+    except Exception:
+        stop_service(process)
+        raise
+    return url, process
+
+
+def stop_service(process):
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        # Trabajos en curso que no terminan al apagar: no hace falta esperarlos
+        process.kill()
+        process.wait()
+
+
+def run_service(target, arguments, weights, spotify_url):
+    workload = Workload(target, arguments.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        if target.name in arguments.urls:
+            url, process = arguments.urls[target.name], None
+        else:
+            url, process = start_service(target, tmp, arguments, spotify_url)
+        try:
+            elapsed = asyncio.run(workload.run(
+                url, weights, arguments.concurrency, arguments.duration, arguments.warmup,
+                arguments.seed_users, arguments.seed_preferences,
+            ))
+        finally:
+            if process is not None:
+                stop_service(process)
+    return {"service": target.name, "elapsed": elapsed, **summarize(workload.records, elapsed)}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_previous(path, config):
+    """Última ejecución guardada con la misma configuración"""
+    if not os.path.exists(path):
+        return None
+    previous = None
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                run = json.loads(line)
+                if run["config"] == config:
+                    previous = run
+    return previous
+
+
+def format_ms(value):
+    return f"{value:8.1f}" if value is not None else "       -"
+
+
+def print_results(results):
+    for result in results:
+        print(f"\n{result['service']} ({result['elapsed']:.1f} s medidos)")
+        print(f"  {'operación':<16} {'peticiones':>10} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errores':>8}")
+        for op, stats in [*result["ops"].items(), ("TOTAL", result["total"])]:
+            print(
+                f"  {op:<16} {stats['requests']:>10} {stats['throughput']:>8.1f} {format_ms(stats['p50_ms'])}"
+                f" {format_ms(stats['p95_ms'])} {format_ms(stats['p99_ms'])} {stats['error_rate']:>7.1%}"
+            )
+
+
+def print_comparison(results, previous):
+    """Cambio de throughput y p95 respecto a la ejecución anterior con la misma configuración"""
+    before = {result["service"]: result for result in previous["results"]}
+    print(f"\nFrente a la ejecución anterior ({previous['timestamp']}, commit {previous['commit']}):")
+    for result in results:
+        old = before.get(result["service"])
+        if old is None:
+            continue
+        for op, stats in [*result["ops"].items(), ("TOTAL", result["total"])]:
+            old_stats = old["total"] if op == "TOTAL" else old["ops"].get(op)
+            if not old_stats or not old_stats["p95_ms"] or not stats["p95_ms"] or not old_stats["throughput"]:
+                continue
+            throughput = stats["throughput"] / old_stats["throughput"] - 1
+            p95 = stats["p95_ms"] / old_stats["p95_ms"] - 1
+            print(f"  {result['service']:<8} {op:<16} req/s {throughput:+7.1%}   p95 {p95:+7.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de la API FastAPI y la API Django")
+    parser.add_argument("--services", nargs="+", choices=list(TARGETS), default=list(TARGETS))
+    parser.add_argument("--mix", type=parse_mix, default="mixed",
+                        help=f"{', '.join(MIXES)} o pesos sueltos (create_user=1,local_search=4)")
+    parser.add_argument("--concurrency", type=int, default=20, help="usuarios virtuales")
+    parser.add_argument("--duration", type=float, default=30, help="segundos medidos")
+    parser.add_argument("--warmup", type=float, default=3, help="segundos de calentamiento sin medir")
+    parser.add_argument("--seed-users", type=int, default=50)
+    parser.add_argument("--seed-preferences", type=int, default=3, help="preferencias por usuario de partida")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=1, help="workers de uvicorn por API")
+    parser.add_argument("--django-settings", default="music_api.settings_api")
+    parser.add_argument("--spotify-latency", type=float, default=50, help="ms de latencia media de Spotify")
+    parser.add_argument("--spotify-jitter", type=float, default=10, help="desviación de la latencia en ms")
+    parser.add_argument("--spotify-errors", type=float, default=0, help="proporción de errores 503 de Spotify")
+    parser.add_argument("--spotify-cache", action="store_true", help="activar la caché en disco de Spotify")
+    parser.add_argument("--url", action="append", default=[], metavar="SERVICIO=URL",
+                        help="usar una API ya arrancada en vez de lanzar una")
+    parser.add_argument("--output", default=os.path.join(HERE, "resultados.jsonl"))
+    parser.add_argument("--no-save", action="store_true")
+    arguments = parser.parse_args()
+    arguments.urls = dict(value.split("=", 1) for value in arguments.url)
+
+    fake = FakeSpotify(
+        arguments.spotify_latency / 1000, arguments.spotify_jitter / 1000, arguments.spotify_errors, arguments.seed,
+    )
+    spotify_url = fake.start()
+    try:
+        results = []
+        for name in arguments.services:
+            print(f"Probando {name}...", flush=True)
+            results.append(run_service(TARGETS[name], arguments, arguments.mix, spotify_url))
+    finally:
+        fake.stop()
+
+    config = {
+        "mix": arguments.mix,
+        "concurrency": arguments.concurrency,
+        "duration": arguments.duration,
+        "workers": arguments.workers,
+        "django_settings": arguments.django_settings,
+        "spotify_latency_ms": arguments.spotify_latency,
+        "spotify_jitter_ms": arguments.spotify_jitter,
+        "spotify_error_rate": arguments.spotify_errors,
+        "spotify_cache": arguments.spotify_cache,
+        "seed_users": arguments.seed_users,
+        "urls": arguments.urls,
+    }
+    print_results(results)
+    print(f"\nPeticiones a Spotify falso: {dict(sorted(fake.requests.items()))}")
+
+    previous = load_previous(arguments.output, config)
+    if previous is not None:
+        print_comparison(results, previous)
+    if not arguments.no_save:
+        run = {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "config": config,
+            "results": results,
+        }
+        with open(arguments.output, "a") as f:
+            f.write(json.dumps(run) + "\n")
+        print(f"\nGuardado en {arguments.output}")
+
+
+if __name__ == "__main__":
+    main()